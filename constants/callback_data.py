@@ -1,6 +1,12 @@
-# Callback Data Prefixes and Actions
+# Callback Data Schemas and Actions
 
-LANG_SELECT_PREFIX = "lang_select_"
-DIAGNOSTIC_SCORE_PREFIX = "diag_score_"
+from telegram_rest_mvc.codec import CallbackSchema
+
+
+# legacy_prefix: buttons sent before the compact format still route
+LANG_SELECT = CallbackSchema("ls", legacy_prefix="lang_select_", language_id=int)
+DIAGNOSTIC_SCORE = CallbackSchema(
+    "ds", legacy_prefix="diag_score_", question_id=int, score=int
+)
 ACTION_NEXT_QUESTION = "action_next_q"
 ACTION_DISCUSS_ANSWER = "action_discuss_ans"  # Used in views.py, keep for now
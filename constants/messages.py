@@ -21,6 +21,7 @@ MSG_LANGUAGE_SELECTED = "Отлично! Вы выбрали язык: {selected
 
 # diagnostics_command
 MSG_START_DIAGNOSTICS = "Начинаем диагностику! Ответьте на несколько вопросов."
+MSG_BUTTON_EXPIRED = "Эта кнопка устарела. Пожалуйста, начните заново с /start."
 MSG_DIAGNOSTIC_SCORE_PARSE_ERROR = "Ошибка: не удалось разобрать ваш ответ. Пожалуйста, выберите оценку с помощью кнопок."
 MSG_LANGUAGE_NOT_FOUND = (
     "Ошибка: Язык '{language_slug}' не найден. Пожалуйста, выберите из списка."
@@ -10,7 +10,12 @@ from sqlmodel import Session, SQLModel, select
 
 # Импортируем engine и get_session из db.py
 from src.db.db import engine, get_session
-from src.db.models import Category, ProgrammingLanguage, Question
+from src.db.models import (
+    Category,
+    ProgrammingLanguage,
+    Question,
+    question_text_hash,
+)
 
 
 # Настройка логирования
@@ -112,7 +117,7 @@ def _create_question(
 ) -> Optional[Question]:
     existing_question = session.exec(
         select(Question)
-        .where(Question.text == text)
+        .where(Question.text_hash == question_text_hash(text))
         .where(Question.category_id == category_id)
         .where(Question.language_id == language_id)
     ).first()
@@ -1,15 +1,17 @@
 import logging
 import os
+import sys
 
-from sqlmodel import create_engine
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlmodel import create_engine
 
-# Предполагается, что DATABASE_URL и engine импортируются из db.py
-# или определены здесь аналогично db.py для согласованности.
-# Для простоты этого скрипта, определим DATABASE_URL и создадим временный engine.
+from src.settings.config import CONFIG
 
 
-DATABASE_URL = "sqlite:///db.sqlite3"  # Убедитесь, что это тот же URL, что и в db.py
+# Тот же URL, что и в db.py (строится из CONFIG.database)
+DATABASE_URL = CONFIG.database.build_url()
 
 # Настройка логирования
 logging.basicConfig(
@@ -0,0 +1,448 @@
+"""Load test: simulated users walk the whole bot flow against local fakes.
+
+Every user sends /start, picks a language, answers the diagnostics, gets a
+practice plan and answers practice questions. Updates go through a real
+python-telegram-bot Application, the ``PerUserUpdateProcessor`` and
+``src.bot.urls.router``; only the edges are fake: the Bot API is a local
+aiohttp server and the chat model answers after a configurable delay.
+Latency and DB queries come from the per-update stats the metrics
+middleware logs, so they measure exactly what production measures.
+
+Usage:
+    python scripts/loadtest.py                          # 20 users, no LLM delay
+    python scripts/loadtest.py --users 200 --concurrency 64 --llm-latency 0.8
+    python scripts/loadtest.py --answers 5 --api-latency 0.05 --seed 7
+
+Unless DATABASE__* is set in the environment, a throwaway SQLite file is used,
+with the production SQLite profile and write queue. Updates that wait on
+the write lock show up as errors and as busy_timeout-sized latencies in
+the report.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+FAKE_TOKEN = "123456:LOADTEST"
+
+if __name__ == "__main__":
+    # CONFIG is built on import: point it at a scratch database first
+    os.environ.setdefault(
+        "DATABASE__NAME", os.path.join(tempfile.mkdtemp(), "loadtest.sqlite3")
+    )
+    os.environ.setdefault("TELEGRAM__TOKEN", FAKE_TOKEN)
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from constants.callback_data import ACTION_NEXT_QUESTION, DIAGNOSTIC_SCORE, LANG_SELECT
+from src import metrics
+from src.bot import urls as bot_urls
+from src.bot.request import InstrumentedRequest
+from src.db import db, services
+from src.db.writer import WriteQueue
+from src.settings.settings import CONCURRENT_UPDATES, SQLITE_WRITE_QUEUE
+from telegram_rest_mvc.processor import PerUserUpdateProcessor
+from telegram_rest_mvc.registrar import register_routes
+
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "RecallDev", "username": "bot"}
+FIRST_USER_ID = 10_000_000
+
+
+class FakeBotAPI:
+    """Just enough of the Bot API for the bot's routes, on a local port.
+
+    Remembers the latest message of each chat; its inline keyboard is what
+    the simulated user clicks on next.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.latest: Dict[int, dict] = {}
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1") -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/bot"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = self.METHODS.get(method)
+        result = handler(self, params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    def message(self, chat_id: int, text: str, reply_markup=None, message_id=None):
+        message = {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+        if reply_markup:
+            message["reply_markup"] = reply_markup
+        latest = self.latest.get(chat_id)
+        if message_id is None or (latest and latest["message_id"] == message_id):
+            self.latest[chat_id] = message
+        return message
+
+    def _send_message(self, params: dict) -> dict:
+        return self.message(int(params["chat_id"]), params["text"], _markup(params))
+
+    def _edit_message_text(self, params: dict) -> dict:
+        return self.message(
+            int(params["chat_id"]),
+            params["text"],
+            _markup(params),
+            message_id=int(params["message_id"]),
+        )
+
+    METHODS = {
+        "getMe": lambda self, params: BOT_USER,
+        "sendMessage": _send_message,
+        "editMessageText": _edit_message_text,
+    }
+
+
+def _markup(params: dict) -> Optional[dict]:
+    markup = params.get("reply_markup")
+    return json.loads(markup) if markup else None
+
+
+class FakeChatModel:
+    """Chat model answering after ``latency`` seconds.
+
+    Plan prompts get a JSON plan over the seeded categories; the same scores
+    give the same plan, as a real model tends to. Anything else gets a
+    canned explanation, which ``astream`` spreads over ``STREAM_CHUNKS``.
+    """
+
+    STREAM_CHUNKS = 10
+
+    def __init__(self, latency: float = 0.0, plan_size: int = 5):
+        self.latency = latency
+        self.plan_size = plan_size
+        self.categories = [c["name"] for c in services.INITIAL_DATA["categories"]]
+
+    async def ainvoke(self, messages: list):
+        return await self._complete_after(self.latency, messages)
+
+    async def _complete_after(self, latency: float, messages: list):
+        if latency:
+            await asyncio.sleep(latency)
+        prompt = _content(messages[-1])
+        if '"category_name"' in prompt:
+            content = json.dumps(self._plan(prompt), ensure_ascii=False)
+        else:
+            content = (
+                "Хороший ответ. Сильные стороны: пример и терминология. "
+                "Неточности: не упомянуты граничные случаи. Правильное объяснение: ..."
+            )
+        return SimpleNamespace(
+            content=content, usage_metadata={"total_tokens": len(prompt) // 4}
+        )
+
+    async def astream(self, messages: list):
+        words = (await self._complete_after(0.0, messages)).content.split(" ")
+        step = max(1, len(words) // self.STREAM_CHUNKS)
+        for start in range(0, len(words), step):
+            await asyncio.sleep(self.latency / self.STREAM_CHUNKS)
+            yield SimpleNamespace(content=" ".join(words[start : start + step]) + " ")
+
+    def _plan(self, prompt: str) -> List[dict]:
+        variant = hashlib.sha1(prompt.encode()).hexdigest()[:6]
+        return [
+            {
+                "category_name": self.categories[i % len(self.categories)],
+                "question_text": f"Вопрос {i + 1} нагрузочного теста ({variant})",
+            }
+            for i in range(self.plan_size)
+        ]
+
+
+def _content(message) -> str:
+    if isinstance(message, dict):
+        return message.get("content", "")
+    return getattr(message, "content", "")
+
+
+class UpdateLog(logging.Handler):
+    """Collects the per-update stats ``metrics.record_update`` logs."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.records: List[dict] = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(json.loads(record.getMessage()))
+
+
+class SimulatedUser:
+    """One Telegram user clicking through the bot as fast as it answers."""
+
+    def __init__(self, harness: "LoadTest", telegram_id: int, rng: random.Random):
+        self.harness = harness
+        self.telegram_id = telegram_id
+        self.rng = rng
+        self.profile = {"id": telegram_id, "is_bot": False, "first_name": "Load"}
+
+    def buttons(self, prefix: str) -> List[str]:
+        message = self.harness.api.latest.get(self.telegram_id)
+        rows = (message or {}).get("reply_markup", {}).get("inline_keyboard", [])
+        data = [button.get("callback_data", "") for row in rows for button in row]
+        return [value for value in data if value.startswith(prefix)]
+
+    async def send(self, text: str):
+        message = {
+            "message_id": self.harness.next_id(),
+            "date": int(time.time()),
+            "chat": {"id": self.telegram_id, "type": "private"},
+            "from": self.profile,
+            "text": text,
+        }
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(command)}
+            ]
+        await self.harness.feed(
+            {"update_id": self.harness.next_id(), "message": message}
+        )
+
+    async def click(self, data: str):
+        query = {
+            "id": str(self.harness.next_id()),
+            "from": self.profile,
+            "chat_instance": str(self.telegram_id),
+            "data": data,
+            "message": self.harness.api.latest[self.telegram_id],
+        }
+        await self.harness.feed(
+            {"update_id": self.harness.next_id(), "callback_query": query}
+        )
+
+    async def run(self, answers: int):
+        await self.send("/start")
+        languages = self.buttons(LANG_SELECT.prefix)
+        if not languages:
+            return
+        await self.click(languages[0])  # the first language has diagnostics
+        while scores := self.buttons(DIAGNOSTIC_SCORE.prefix):
+            await self.click(self.rng.choice(scores))
+        # The plan is generated inline after the last score
+        for number in range(answers):
+            await self.send(f"Ответ {number + 1}: " + "текст ответа " * 20)
+            if not self.buttons(ACTION_NEXT_QUESTION):
+                break  # plan finished
+            await self.click(ACTION_NEXT_QUESTION)
+
+
+class LoadTest:
+    def __init__(
+        self,
+        users: int = 20,
+        answers: int = 3,
+        concurrency: int = 16,
+        llm_latency: float = 0.0,
+        api_latency: float = 0.0,
+        seed: int = 0,
+        write_queue: Optional[bool] = None,
+    ):
+        self.users = users
+        self.answers = answers
+        self.concurrency = concurrency
+        self.api = FakeBotAPI(api_latency)
+        self.llm = FakeChatModel(llm_latency)
+        self.rng = random.Random(seed)
+        if write_queue is None:  # as in production: see main._post_init
+            write_queue = db.engine.dialect.name == "sqlite" and SQLITE_WRITE_QUEUE
+        self.write_queue = write_queue
+        self._ids = itertools.count(1)
+        self.app: Optional[Application] = None
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    async def feed(self, data: dict):
+        """Process one update the way the running bot would, and wait for it."""
+        update = Update.de_json(data, self.app.bot)
+        await self.app.update_processor.process_update(
+            update, self.app.process_update(update)
+        )
+
+    async def run(self) -> dict:
+        base_url = await self.api.start()
+        self.app = (
+            Application.builder()
+            .token(FAKE_TOKEN)
+            .base_url(base_url)
+            .request(InstrumentedRequest(connection_pool_size=256))
+            .concurrent_updates(PerUserUpdateProcessor(self.concurrency))
+            .build()
+        )
+        self.app.bot_data["chat_model"] = self.llm
+        register_routes(self.app, bot_urls.router)
+
+        log = UpdateLog()
+        metrics.update_logger.addHandler(log)
+        level, propagate = metrics.update_logger.level, metrics.update_logger.propagate
+        metrics.update_logger.setLevel(logging.INFO)
+        metrics.update_logger.propagate = False
+        db_writer = None
+        try:
+            await self.app.initialize()
+            if self.write_queue:
+                db_writer = self.app.bot_data["db_writer"] = WriteQueue()
+                await db_writer.start()
+            users = [
+                SimulatedUser(self, FIRST_USER_ID + i, random.Random(self.rng.random()))
+                for i in range(self.users)
+            ]
+            started = time.perf_counter()
+            await asyncio.gather(*(user.run(self.answers) for user in users))
+            elapsed = time.perf_counter() - started
+        finally:
+            metrics.update_logger.removeHandler(log)
+            metrics.update_logger.setLevel(level)
+            metrics.update_logger.propagate = propagate
+            if db_writer:
+                await db_writer.stop()
+            await self.app.shutdown()
+            await self.api.stop()
+        return summarize(log.records, elapsed, self.users)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, ``q`` in 0..100."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(records: List[dict], elapsed: float, users: int) -> dict:
+    by_route = defaultdict(list)
+    for record in records:
+        by_route[record["route"]].append(record)
+
+    def row(rows: List[dict]) -> dict:
+        seconds = [r["seconds"] for r in rows]
+        return {
+            "count": len(rows),
+            "errors": sum(r["outcome"] != "ok" for r in rows),
+            "p50_ms": percentile(seconds, 50) * 1000,
+            "p95_ms": percentile(seconds, 95) * 1000,
+            "p99_ms": percentile(seconds, 99) * 1000,
+            "db_queries": sum(r["db_queries"] for r in rows) / len(rows),
+        }
+
+    return {
+        "users": users,
+        "updates": len(records),
+        "seconds": elapsed,
+        "updates_per_second": len(records) / elapsed if elapsed else 0.0,
+        "routes": {route: row(rows) for route, rows in sorted(by_route.items())},
+        "total": row(records) if records else None,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['users']} users, {report['updates']} updates in "
+        f"{report['seconds']:.2f}s: {report['updates_per_second']:.1f} updates/s",
+        "",
+        f"{'route':<18}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'db q/upd':>10}",
+    ]
+    rows = list(report["routes"].items())
+    if report["total"]:
+        rows.append(("all", report["total"]))
+    for route, row in rows:
+        lines.append(
+            f"{route:<18}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>9.1f}"
+            f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['db_queries']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="simulated users")
+    parser.add_argument(
+        "--answers", type=int, default=3, help="practice answers per user"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENT_UPDATES,
+        help="updates handled at once (default: TELEGRAM__CONCURRENT_UPDATES)",
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.0, help="seconds per LLM call"
+    )
+    parser.add_argument(
+        "--api-latency", type=float, default=0.0, help="seconds per Bot API call"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--json", action="store_true", help="print the raw report")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from src.db.db import init_db
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args()
+    init_db()
+    services.try_populate_initial_data()
+    load_test = LoadTest(
+        users=args.users,
+        answers=args.answers,
+        concurrency=args.concurrency,
+        llm_latency=args.llm_latency,
+        api_latency=args.api_latency,
+        seed=args.seed,
+    )
+    report = asyncio.run(load_test.run())
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
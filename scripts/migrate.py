@@ -0,0 +1,40 @@
+"""Apply pending schema migrations (see src/db/migrations).
+
+Usage:
+    python scripts/migrate.py           # apply pending migrations
+    python scripts/migrate.py --status  # list applied and pending versions
+"""
+
+import logging
+import os
+import sys
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlmodel import SQLModel
+
+from src.db.db import engine
+from src.db.migrations import MIGRATIONS, applied_versions, run_migrations
+
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def print_status():
+    done = applied_versions(engine)
+    for migration in MIGRATIONS:
+        state = "applied" if migration.VERSION in done else "pending"
+        print(f"{migration.VERSION:04d}_{migration.NAME}: {state}")
+
+
+if __name__ == "__main__":
+    if "--status" in sys.argv[1:]:
+        print_status()
+    else:
+        SQLModel.metadata.create_all(engine)
+        applied = run_migrations(engine)
+        logger.info(f"Applied migrations: {applied or 'none, schema is up to date'}")
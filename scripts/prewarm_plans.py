@@ -0,0 +1,156 @@
+"""Pre-generate practice plan templates for the most common diagnostics.
+
+Groups recent ``UserProgress.diagnostic_scores_json`` by language and score
+bands (see src/db/plan_templates.py) and generates a plan for every common
+group whose template is missing or stale, a few LLM calls at a time. Run it
+off-peak, e.g. from cron, so users finishing diagnostics hit a template.
+
+Usage:
+    python scripts/prewarm_plans.py                    # top 50 groups, last 30 days
+    python scripts/prewarm_plans.py --top 200 --concurrency 8 --min-users 3
+    python scripts/prewarm_plans.py --dry-run          # list the groups only
+    python scripts/prewarm_plans.py --force            # regenerate fresh ones too
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.bot.views import practice as practice_view
+from src.db import plan_templates, services
+from src.db.db import get_session
+
+
+logger = logging.getLogger(__name__)
+
+# (language_id, example scores, users in the group)
+ScoreVector = Tuple[int, Dict[str, int], int]
+
+
+def common_score_vectors(
+    rows: Sequence[Tuple[int, str]], top: int = 50, min_users: int = 1
+) -> List[ScoreVector]:
+    """The ``top`` most frequent (language, score bands) groups in ``rows``."""
+    counts = Counter()
+    examples = {}
+    for language_id, scores_json in rows:
+        try:
+            scores = json.loads(scores_json)
+        except ValueError:
+            continue
+        if not scores:
+            continue
+        key = (language_id, plan_templates.score_key(scores))
+        counts[key] += 1
+        examples.setdefault(key, scores)
+    return [
+        (key[0], examples[key], users)
+        for key, users in counts.most_common(top)
+        if users >= min_users
+    ]
+
+
+async def warm_template(
+    llm, language_id: int, scores: Dict[str, int], force: bool = False
+) -> str:
+    """Generate and store one template; returns "fresh", "generated" or "failed"."""
+    with get_session() as session:
+        template = services.get_plan_template(
+            session, language_id, plan_templates.score_key(scores)
+        )
+        if template and plan_templates.is_fresh(template) and not force:
+            return "fresh"
+        language = services.get_language_by_id(session, language_id)
+        if language is None:
+            return "failed"
+        plan_questions = await practice_view.request_plan_questions(
+            llm, session, language, scores
+        )
+        if not plan_questions:
+            return "failed"
+        question_ids = services.upsert_plan_questions(
+            session, language_id, plan_questions
+        )
+        plan_templates.store(session, language_id, scores, question_ids)
+        return "generated"
+
+
+async def prewarm(
+    llm, vectors: Sequence[ScoreVector], concurrency: int = 4, force: bool = False
+) -> Counter:
+    """Warm every vector with at most ``concurrency`` LLM calls in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = Counter()
+
+    async def warm(language_id, scores):
+        async with semaphore:
+            try:
+                results[await warm_template(llm, language_id, scores, force)] += 1
+            except Exception:
+                logger.exception(f"Pre-warming {language_id} {scores} failed")
+                results["failed"] += 1
+
+    await asyncio.gather(
+        *(warm(language_id, scores) for language_id, scores, _ in vectors)
+    )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=50, help="groups to warm")
+    parser.add_argument(
+        "--min-users", type=int, default=2, help="skip groups with fewer users"
+    )
+    parser.add_argument(
+        "--days", type=int, default=30, help="only count progress updated since"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="LLM calls in flight"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="regenerate fresh templates too"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only list the groups")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    from langchain.chat_models import ChatOpenAI
+
+    from src.settings import settings
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    args = parse_args()
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=args.days)
+    with get_session() as session:
+        rows = services.get_diagnostic_score_vectors(session, since=since)
+    vectors = common_score_vectors(rows, top=args.top, min_users=args.min_users)
+    for language_id, scores, users in vectors:
+        key = plan_templates.score_key(scores)
+        logger.info(f"language {language_id} [{key}]: {users} users")
+
+    if args.dry_run or not vectors:
+        sys.exit(0)
+    if not settings.OPENAI_API_KEY:
+        logger.critical("LLM__OPENAI_API_KEY is not set")
+        sys.exit(1)
+    llm = ChatOpenAI(
+        model_name="gpt-3.5-turbo",
+        temperature=0.7,
+        openai_api_key=settings.OPENAI_API_KEY,
+    )
+    results = asyncio.run(prewarm(llm, vectors, args.concurrency, args.force))
+    logger.info(f"Plan templates: {dict(results)}")
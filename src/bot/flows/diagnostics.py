@@ -1,10 +1,13 @@
+from typing import List, Optional, Tuple
+
+from sqlmodel import Session
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from constants import callback_data, messages
 from src.bot.flow_result import FlowResult, FlowStatus
-from src.db import services
-from src.db.db import get_session
+from src.db import services, writer
+from src.db.db import commit_or_flush, get_session, run_blocking
 
 
 async def get_current_diagnostic_question(
@@ -12,19 +15,16 @@ async def get_current_diagnostic_question(
 ) -> FlowResult:
     telegram_id = context.user_data.get("telegram_id")
     with get_session() as session:
-        user = services.get_or_create_user(session, telegram_id=telegram_id)
+        await run_blocking(
+            services.get_or_create_user, session, telegram_id=telegram_id
+        )
         progress_id = context.user_data.get("active_progress_id")
         if not progress_id:
             # Automatically start diagnostics to avoid sending an error message to the user
             start_res = await start_diagnostics(context)
             if start_res.status != FlowStatus.OK:
                 return start_res
-            progress_id = context.user_data.get("active_progress_id")
-            # After auto-start, refresh diagnostic question IDs and current index from context
-            question_ids = context.user_data.get("diagnostic_question_ids", [])
-            current_index = context.user_data.get("diagnostic_current_index", 0)
 
-        user_progress = session.get(services.UserProgress, progress_id)
         question_ids = context.user_data.get("diagnostic_question_ids", [])
         current_index = context.user_data.get("diagnostic_current_index", 0)
 
@@ -35,63 +35,51 @@ async def get_current_diagnostic_question(
             return FlowResult(FlowStatus.DONE)
 
         question_id = question_ids[current_index]
-        question = services.get_question_by_id(session, question_id)
+        text = await run_blocking(_diagnostic_question_text, session, question_id)
 
-        if not question:
+        if text is None:
             return FlowResult(FlowStatus.ERROR)
 
-        question_text = question.text
-        category_name = question.category.name
         keyboard = [
             [
                 InlineKeyboardButton(
                     str(i),
-                    callback_data=f"{callback_data.DIAGNOSTIC_SCORE_PREFIX}{question_id}_{i}",
+                    callback_data=callback_data.DIAGNOSTIC_SCORE.encode(
+                        question_id=question_id, score=i
+                    ),
                 )
                 for i in range(1, 6)
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        text = messages.MSG_DIAGNOSTIC_QUESTION_PROMPT.format(
-            category_name=category_name, question_text=question_text
-        )
 
         return FlowResult(FlowStatus.OK, {"text": text, "reply_markup": reply_markup})
 
 
+def _diagnostic_question_text(session: Session, question_id: int) -> Optional[str]:
+    question = services.get_question_by_id(session, question_id)
+    if not question:
+        return None
+    return messages.MSG_DIAGNOSTIC_QUESTION_PROMPT.format(
+        category_name=question.category.name, question_text=question.text
+    )
+
+
 async def start_diagnostics(context: ContextTypes.DEFAULT_TYPE) -> FlowResult:
     telegram_id = context.user_data.get("telegram_id")
     with get_session() as session:
-        user = services.get_or_create_user(session, telegram_id=telegram_id)
-        if not user.active_language_id:
+        started = await run_blocking(_reset_diagnostics, session, telegram_id)
+        if started is None:
             return FlowResult(FlowStatus.NO_LANGUAGE)
-        # Use existing progress if it exists, otherwise create a new one.
-        user_progress = services.get_or_create_user_progress(
-            session, user_id=user.id, language_id=user.active_language_id
-        )
-        # If the previous diagnosis was completed, reset the results to start over.
-        user_progress.diagnostic_scores_json = None
-        user_progress.diagnostics_completed = False
-
-        session.add(user_progress)
-        session.commit()
-        session.refresh(user_progress)
-
-        context.user_data["active_progress_id"] = user_progress.id
-        diagnostic_questions = services.get_diagnostic_questions(
-            session, language_id=user.active_language_id
-        )
+        progress_id, question_ids = started
 
-        if not diagnostic_questions:
-            context.user_data["diagnostic_current_index"] = 0
-            context.user_data["diagnostic_question_ids"] = []
+        context.user_data["active_progress_id"] = progress_id
+        context.user_data["diagnostic_current_index"] = 0
+        context.user_data["diagnostic_question_ids"] = question_ids
 
+        if not question_ids:
             return FlowResult(FlowStatus.NO_QUESTIONS)
 
-        context.user_data["diagnostic_current_index"] = 0
-        context.user_data["diagnostic_question_ids"] = [
-            q.id for q in diagnostic_questions
-        ]
         context.user_data["diagnostic_scores_temp"] = {}
 
         # Immediately return the first diagnostic question so the user sees only one message.
@@ -102,6 +90,30 @@ async def start_diagnostics(context: ContextTypes.DEFAULT_TYPE) -> FlowResult:
         return first_q
 
 
+def _reset_diagnostics(
+    session: Session, telegram_id: int
+) -> Optional[Tuple[int, List[int]]]:
+    """Clear the user's diagnostic results; the progress id and the question ids."""
+    user = services.get_or_create_user(session, telegram_id=telegram_id)
+    if not user.active_language_id:
+        return None
+    # Use existing progress if it exists, otherwise create a new one.
+    user_progress = services.get_or_create_user_progress(
+        session, user_id=user.id, language_id=user.active_language_id
+    )
+    # If the previous diagnosis was completed, reset the results to start over.
+    user_progress.diagnostic_scores_json = None
+    user_progress.diagnostics_completed = False
+
+    session.add(user_progress)
+    commit_or_flush(session, user_progress)
+
+    diagnostic_questions = services.get_diagnostic_questions(
+        session, language_id=user.active_language_id
+    )
+    return user_progress.id, [q.id for q in diagnostic_questions]
+
+
 async def process_diagnostic_score(
     context: ContextTypes.DEFAULT_TYPE, question_id: int, score: int
 ) -> FlowResult:
@@ -113,14 +125,25 @@ async def process_diagnostic_score(
         return FlowResult(FlowStatus.NO_ACTIVE_QUESTION)
 
     with get_session() as session:
-        user_progress = session.get(services.UserProgress, progress_id)
-        services.save_diagnostic_answer(session, user_progress.id, question_id, score)
+        await writer.write(
+            context.bot_data,
+            services.save_diagnostic_answer,
+            session,
+            progress_id,
+            question_id,
+            score,
+        )
         next_index = current_index + 1
         context.user_data["diagnostic_current_index"] = next_index
 
         if next_index < len(question_ids):
             return FlowResult(FlowStatus.NEXT_QUESTION)
         else:
-            services.mark_diagnostics_completed(session, user_progress.id)
+            await writer.write(
+                context.bot_data,
+                services.mark_diagnostics_completed,
+                session,
+                progress_id,
+            )
 
             return FlowResult(FlowStatus.COMPLETED)
@@ -1,10 +1,16 @@
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from sqlmodel import Session
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
 from constants import callback_data, messages, prompts
 from src.bot.flow_result import FlowResult, FlowStatus
-from src.db import services
-from src.db.db import get_session
+from src.db import evaluation_cache, services, writer
+from src.db.db import get_session, run_blocking
+from src.llm import gateway as llm_gateway
 
 
 async def get_current_practice_question(
@@ -12,79 +18,134 @@ async def get_current_practice_question(
 ) -> FlowResult:
     telegram_id = context.user_data.get("telegram_id")
     with get_session() as session:
-        user = services.get_or_create_user(session, telegram_id=telegram_id)
-        user_progress = services.get_or_create_user_progress(
-            session, user_id=user.id, language_id=user.active_language_id
-        )
-        current_item = services.get_current_learning_item(
-            session, user_progress_id=user_progress.id
-        )
-        if not current_item or not current_item.question:
-            # distinguish between "нет плана" и "план завершён"
-            if services.user_has_practice_plan(
-                session, user_progress_id=user_progress.id
-            ):
-                return FlowResult(FlowStatus.FINISHED)
-            return FlowResult(FlowStatus.NO_PLAN)
+        return await run_blocking(_current_practice_question, session, telegram_id)
 
-        return FlowResult(FlowStatus.OK, {"text": current_item.question.text})
+
+def _current_practice_question(session: Session, telegram_id: int) -> FlowResult:
+    user = services.get_or_create_user(session, telegram_id=telegram_id)
+    user_progress = services.get_or_create_user_progress(
+        session, user_id=user.id, language_id=user.active_language_id
+    )
+    current_item = services.get_current_learning_item(
+        session, user_progress_id=user_progress.id
+    )
+    if not current_item or not current_item.question:
+        # distinguish between "нет плана" и "план завершён"
+        if services.user_has_practice_plan(session, user_progress_id=user_progress.id):
+            return FlowResult(FlowStatus.FINISHED)
+        return FlowResult(FlowStatus.NO_PLAN)
+
+    return FlowResult(FlowStatus.OK, {"text": current_item.question.text})
 
 
 async def next_practice_question(context: ContextTypes.DEFAULT_TYPE) -> FlowResult:
     telegram_id = context.user_data.get("telegram_id")
-
     with get_session() as session:
-        user = services.get_or_create_user(session, telegram_id=telegram_id)
-        user_progress = services.get_or_create_user_progress(
-            session, user_id=user.id, language_id=user.active_language_id
-        )
-        next_item = services.get_next_pending_learning_item(
-            session, user_progress_id=user_progress.id
+        return await run_blocking(_next_practice_question, session, telegram_id)
+
+
+def _next_practice_question(session: Session, telegram_id: int) -> FlowResult:
+    user = services.get_or_create_user(session, telegram_id=telegram_id)
+    user_progress = services.get_or_create_user_progress(
+        session, user_id=user.id, language_id=user.active_language_id
+    )
+    next_item = services.get_next_pending_learning_item(
+        session, user_progress_id=user_progress.id
+    )
+    if next_item:
+        services.set_current_learning_item(
+            session,
+            user_progress_id=user_progress.id,
+            new_current_item_id=next_item.id,
         )
-        if next_item:
-            services.set_current_learning_item(
-                session,
-                user_progress_id=user_progress.id,
-                new_current_item_id=next_item.id,
-            )
 
-            return FlowResult(FlowStatus.OK)
+        return FlowResult(FlowStatus.OK)
+
+    return FlowResult(FlowStatus.FINISHED)
 
-        return FlowResult(FlowStatus.FINISHED)
+
+@dataclass
+class _AnswerContext:
+    user_id: int
+    user_progress_id: int
+    item_id: int
+    question_id: int
+    prompt: str
+    cached_explanation: Optional[str]
+
+
+def _load_answer_context(
+    session: Session, telegram_id: int, answer_text: str, use_cache: bool
+) -> _AnswerContext:
+    user = services.get_or_create_user(session, telegram_id=telegram_id)
+    user_progress = services.get_or_create_user_progress(
+        session, user_id=user.id, language_id=user.active_language_id
+    )
+    current_item = services.get_current_learning_item(
+        session, user_progress_id=user_progress.id
+    )
+    question = current_item.question
+    prompt = prompts.PRACTICE_ANSWER_EVALUATION_PROMPT_TEMPLATE.format(
+        category_name=question.category.name,
+        question_text=question.text,
+        user_answer_text=answer_text,
+    )
+    cached = (
+        evaluation_cache.lookup(session, question.id, answer_text)
+        if use_cache
+        else None
+    )
+    return _AnswerContext(
+        user.id, user_progress.id, current_item.id, question.id, prompt, cached
+    )
 
 
 async def process_user_practice_answer(
-    context: ContextTypes.DEFAULT_TYPE, answer_text: str
+    context: ContextTypes.DEFAULT_TYPE,
+    answer_text: str,
+    on_progress: Optional[Callable[[str], Awaitable[None]]] = None,
 ) -> FlowResult:
+    """Evaluate the answer to the current plan item and save it.
+
+    With ``on_progress`` the evaluation is streamed: it is awaited with the
+    explanation generated so far after every chunk.
+    """
     telegram_id = context.user_data.get("telegram_id")
+    llm = context.bot_data.get("chat_model")
 
     with get_session() as session:
-        user = services.get_or_create_user(session, telegram_id=telegram_id)
-        user_progress = services.get_or_create_user_progress(
-            session, user_id=user.id, language_id=user.active_language_id
-        )
-        current_item = services.get_current_learning_item(
-            session, user_progress_id=user_progress.id
+        answer = await run_blocking(
+            _load_answer_context, session, telegram_id, answer_text, bool(llm)
         )
-        prompt = prompts.PRACTICE_ANSWER_EVALUATION_PROMPT_TEMPLATE.format(
-            category_name=current_item.question.category.name,
-            question_text=current_item.question.text,
-            user_answer_text=answer_text,
-        )
-        llm = context.bot_data.get("chat_model")
-        explanation = (
-            llm.invoke([{"role": "user", "content": prompt}]).content if llm else ""
-        )
-        services.save_user_answer(
-            session=session,
-            user_id=user.id,
-            question_id=current_item.question.id,
-            learning_plan_item_id=current_item.id,
+        explanation = ""
+        if llm:
+            explanation = answer.cached_explanation
+            if explanation is None:
+                started = time.perf_counter()
+                explanation = await _evaluate_answer(llm, answer.prompt, on_progress)
+                await writer.write(
+                    context.bot_data,
+                    evaluation_cache.store,
+                    session,
+                    answer.question_id,
+                    answer_text,
+                    explanation,
+                    llm_seconds=time.perf_counter() - started,
+                )
+        await writer.write(
+            context.bot_data,
+            services.save_user_answer,
+            session,
+            user_id=answer.user_id,
+            question_id=answer.question_id,
+            learning_plan_item_id=answer.item_id,
             answer_text=answer_text,
             llm_explanation=explanation,
         )
-        next_item = services.get_next_pending_learning_item(
-            session, user_progress_id=user_progress.id
+        next_item = await run_blocking(
+            services.get_next_pending_learning_item,
+            session,
+            user_progress_id=answer.user_progress_id,
         )
         if next_item:
             keyboard = [
@@ -111,3 +172,16 @@ async def process_user_practice_answer(
                 ],
             },
         )
+
+
+async def _evaluate_answer(llm, prompt: str, on_progress=None) -> str:
+    messages = [{"role": "user", "content": prompt}]
+    if on_progress is None:
+        response = await llm_gateway.ainvoke(llm, messages)
+        return response.content
+
+    explanation = ""
+    async for chunk in llm_gateway.astream(llm, messages):
+        explanation += chunk
+        await on_progress(explanation)
+    return explanation
@@ -0,0 +1,140 @@
+"""Background practice plan generation.
+
+Plan generation takes one LLM round-trip plus a batch of writes, so it runs in
+an in-process asyncio worker pool instead of the Telegram callback. Jobs are
+persisted in the ``plangenerationjob`` table and re-queued on startup, so a
+restart does not lose a user's plan.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+from typing import List
+
+from sqlalchemy import event
+
+from src.bot.views import practice as practice_view
+from src.db import services
+from src.db.db import get_session
+from src.llm import limiter
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlanJobQueue:
+    """Asyncio worker pool that generates practice plans and notifies users."""
+
+    def __init__(self, bot, bot_data: dict, workers: int = 4):
+        self.bot = bot
+        self.bot_data = bot_data
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Re-queue unfinished jobs from the database and spawn workers."""
+        with get_session() as session:
+            for job in services.get_unfinished_plan_jobs(session):
+                self._queue.put_nowait(job.id)
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"plan-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            f"Plan job queue started: {self.workers} workers, {self._queue.qsize()} pending"
+        )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def join(self):
+        """Wait until every queued job has been processed."""
+        await self._queue.join()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def enqueue(self, user_progress_id: int, telegram_id: int, chat_id: int):
+        with get_session() as session:
+            job = services.create_plan_job(
+                session,
+                user_progress_id=user_progress_id,
+                telegram_id=telegram_id,
+                chat_id=chat_id,
+            )
+            job_id = job.id
+            if session.info.get("unit_of_work"):
+                # Workers must not start before the update's writes are visible
+                event.listen(
+                    session,
+                    "after_commit",
+                    lambda _session: self._queue.put_nowait(job_id),
+                    once=True,
+                )
+                return job_id
+
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception:
+                logger.exception(f"Plan generation job {job_id} crashed")
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: int):
+        with get_session() as session:
+            job = services.get_plan_job(session, job_id)
+            if not job or job.status in ("done", "failed"):
+                return
+            telegram_id, chat_id = job.telegram_id, job.chat_id
+            user_progress_id = job.user_progress_id
+            services.update_plan_job_status(session, job_id, "running")
+
+        try:
+            await self._generate_and_notify(
+                job_id, telegram_id, chat_id, user_progress_id
+            )
+        except Exception as exc:
+            # Don't leave the job "running": record why it failed
+            with get_session() as session:
+                services.update_plan_job_status(
+                    session, job_id, "failed", error=f"{type(exc).__name__}: {exc}"
+                )
+            raise
+
+    async def _generate_and_notify(
+        self, job_id: int, telegram_id: int, chat_id: int, user_progress_id: int
+    ):
+        # Flows and views read the LLM from bot_data and the user from user_data
+        context = SimpleNamespace(
+            bot_data=self.bot_data, user_data={"telegram_id": telegram_id}
+        )
+        with get_session() as session:
+            user = services.get_or_create_user(session, telegram_id=telegram_id)
+            user_progress = session.get(services.UserProgress, user_progress_id)
+            # Nobody is waiting on a reply: interactive feedback goes first
+            with limiter.requester(user=telegram_id, priority=limiter.BACKGROUND):
+                success, practice_result = await practice_view.generate_practice_plan(
+                    context, session, user, user_progress
+                )
+            services.update_plan_job_status(
+                session,
+                job_id,
+                "done" if success else "failed",
+                error=None if success else str(practice_result),
+            )
+
+        for text, markup in await practice_view.plan_result_messages(
+            context, success, practice_result
+        ):
+            await self.bot.send_message(chat_id=chat_id, text=text, reply_markup=markup)
@@ -0,0 +1,100 @@
+"""Router middlewares: the per-update plumbing views used to repeat.
+
+``MIDDLEWARE`` runs outermost first: errors, metrics, session, user. So a
+failed update is rolled back before the error is reported, and the metrics
+cover the commit.
+"""
+
+import logging
+import time
+
+from sqlmodel import Session
+from telegram.ext import ContextTypes
+
+from constants import messages
+from src import metrics
+from src.db import services
+from src.db.db import unit_of_work
+from src.db.models import User
+from src.llm import limiter
+from telegram_rest_mvc.middleware import Handler, Request
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_UPDATE_SECONDS = 5.0
+
+
+async def error_middleware(request: Request, call_next: Handler):
+    """Log a failed update and tell the user instead of going silent."""
+    try:
+        return await call_next(request)
+    except Exception:
+        logger.exception(
+            f"Route {request.route.name!r} failed for user {request.telegram_id}"
+        )
+        message = request.update.effective_message
+        if message:
+            try:
+                await message.reply_text(messages.MSG_GENERAL_ERROR)
+            except Exception:
+                logger.exception("Could not report the error to the user")
+
+
+async def metrics_middleware(request: Request, call_next: Handler):
+    """Per-route wall time plus the DB, LLM and Bot API time spent inside it."""
+    started = time.perf_counter()
+    outcome = "error"
+    with metrics.track_update(request.route.name or request.route.pattern) as stats:
+        request.extra["stats"] = stats
+        try:
+            result = await call_next(request)
+            outcome = "ok"
+            return result
+        finally:
+            stats.seconds = request.extra["elapsed"] = time.perf_counter() - started
+            metrics.record_update(stats, outcome)
+            if stats.seconds >= SLOW_UPDATE_SECONDS:
+                logger.warning(f"Slow update: {stats}")
+
+
+async def session_middleware(request: Request, call_next: Handler):
+    """One unit of work per update; views and flows join it via get_session()."""
+    with unit_of_work() as session:
+        request.session = session
+        return await call_next(request)
+
+
+async def user_middleware(request: Request, call_next: Handler):
+    """Load the update's user once and share it with views and flows.
+
+    LLM calls made while handling the update queue as this user's.
+    """
+    telegram_id = request.telegram_id
+    if telegram_id is not None:
+        request.context.user_data["telegram_id"] = telegram_id
+        if request.session is not None:
+            request.user = services.get_or_create_user(
+                request.session, telegram_id=telegram_id
+            )
+    with limiter.requester(user=telegram_id):
+        return await call_next(request)
+
+
+MIDDLEWARE = [
+    error_middleware,
+    metrics_middleware,
+    session_middleware,
+    user_middleware,
+]
+
+
+def current_user(
+    context: ContextTypes.DEFAULT_TYPE, session: Session, telegram_id: int
+) -> User:
+    """The user ``user_middleware`` loaded, or a fresh load outside the router."""
+    request = getattr(context, "request", None)
+    user = request.user if request is not None else None
+    if user is not None and user.telegram_id == telegram_id:
+        return user
+    return services.get_or_create_user(session, telegram_id=telegram_id)
@@ -0,0 +1,287 @@
+"""Persistence for ``context.user_data`` across restarts and workers.
+
+Flows keep the diagnostics position and the active progress in
+``context.user_data``. ``UserDataPersistence`` plugs into PTB's
+``BasePersistence`` and stores a whitelisted, JSON-serializable subset of it
+in one of two stores:
+
+* ``SQLUserDataStore`` - the ``userdatarecord`` table in the bot database;
+* ``RedisUserDataStore`` - one Redis hash; works with any client exposing
+  async ``hget``/``hgetall``/``hset``/``hdel`` (``redis.asyncio``).
+
+Writes are write-behind: PTB hands over changed users every
+``update_interval`` seconds and they are written in one batch. With
+``refresh_on_update`` each update reloads its user's entry, so several
+workers can serve the same user without sticky routing.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.db import db
+from src.db.models import UserDataRecord
+
+
+logger = logging.getLogger(__name__)
+
+# Everything else in user_data (e.g. Message objects) stays process-local
+PERSISTED_USER_DATA_KEYS = (
+    "telegram_id",
+    "active_progress_id",
+    "diagnostic_question_ids",
+    "diagnostic_current_index",
+    "diagnostic_scores_temp",
+)
+
+# A failed batch is retried after update_interval, doubling up to this
+FLUSH_RETRY_MAX_SECONDS = 60
+
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class SQLUserDataStore:
+    """user_id -> JSON rows in the ``userdatarecord`` table.
+
+    Uses its own sessions: persistence runs outside any update's unit of work.
+    Queries run in a worker thread, so the event loop never waits on them.
+    """
+
+    async def load(self) -> Dict[int, str]:
+        return await asyncio.to_thread(self._load)
+
+    async def load_one(self, user_id: int) -> Optional[str]:
+        return await asyncio.to_thread(self._load_one, user_id)
+
+    async def save(self, entries: Dict[int, str]):
+        await asyncio.to_thread(self._save, entries)
+
+    async def delete(self, user_id: int):
+        await asyncio.to_thread(self._delete, user_id)
+
+    def _load(self) -> Dict[int, str]:
+        with Session(db.engine) as session:
+            rows = session.exec(select(UserDataRecord.user_id, UserDataRecord.data))
+            return dict(rows.all())
+
+    def _load_one(self, user_id: int) -> Optional[str]:
+        with Session(db.engine) as session:
+            return session.exec(
+                select(UserDataRecord.data).where(UserDataRecord.user_id == user_id)
+            ).first()
+
+    def _save(self, entries: Dict[int, str]):
+        now = datetime.datetime.utcnow()
+        with Session(db.engine) as session:
+            insert = _UPSERT_INSERTS[session.get_bind().dialect.name]
+            stmt = insert(UserDataRecord)
+            session.exec(
+                stmt.on_conflict_do_update(
+                    index_elements=["user_id"],
+                    set_={"data": stmt.excluded.data, "updated_at": now},
+                ),
+                params=[
+                    {"user_id": user_id, "data": data, "updated_at": now}
+                    for user_id, data in entries.items()
+                ],
+            )
+            session.commit()
+
+    def _delete(self, user_id: int):
+        with Session(db.engine) as session:
+            session.exec(
+                delete(UserDataRecord).where(UserDataRecord.user_id == user_id)
+            )
+            session.commit()
+
+
+class RedisUserDataStore:
+    """user_id -> JSON fields of a single Redis hash."""
+
+    def __init__(self, client, key: str = "recalldev:user_data"):
+        self.client = client
+        self.key = key
+
+    async def load(self) -> Dict[int, str]:
+        raw = await self.client.hgetall(self.key)
+        return {int(_text(k)): _text(v) for k, v in raw.items()}
+
+    async def load_one(self, user_id: int) -> Optional[str]:
+        value = await self.client.hget(self.key, str(user_id))
+        return _text(value) if value is not None else None
+
+    async def save(self, entries: Dict[int, str]):
+        await self.client.hset(
+            self.key, mapping={str(k): v for k, v in entries.items()}
+        )
+
+    async def delete(self, user_id: int):
+        await self.client.hdel(self.key, str(user_id))
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class UserDataPersistence(BasePersistence):
+    """Persists whitelisted ``user_data`` keys; bot/chat/callback data are not stored."""
+
+    def __init__(
+        self,
+        store,
+        keys: Iterable[str] = PERSISTED_USER_DATA_KEYS,
+        update_interval: float = 5,
+        refresh_on_update: bool = False,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self.keys = tuple(keys)
+        self.refresh_on_update = refresh_on_update
+        # JSON last read from / written to the store, to detect remote changes
+        self._synced: Dict[int, str] = {}
+        self._dirty: Dict[int, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._retry: Optional[asyncio.TimerHandle] = None
+        self._failures = 0
+
+    def _serialize(self, data: dict) -> str:
+        return json.dumps(
+            {key: data[key] for key in self.keys if key in data}, sort_keys=True
+        )
+
+    # --- user_data ---
+    async def get_user_data(self) -> Dict[int, dict]:
+        self._synced = await self.store.load()
+        return {user_id: json.loads(raw) for user_id, raw in self._synced.items()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        raw = self._serialize(data)
+        if self._synced.get(user_id) == raw:
+            return
+        self._dirty[user_id] = raw
+        if self._retry is None:  # otherwise it joins the pending retry
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        self._retry = None
+        # PTB reports every changed user back to back: write them in one batch
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_dirty())
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if not self.refresh_on_update or user_id in self._dirty:
+            return
+        raw = await self.store.load_one(user_id)
+        if raw is None or raw == self._synced.get(user_id):
+            return  # unchanged elsewhere; local data is at least as new
+        for key in self.keys:
+            user_data.pop(key, None)
+        user_data.update(json.loads(raw))
+        self._synced[user_id] = raw
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty.pop(user_id, None)
+        self._synced.pop(user_id, None)
+        await self.store.delete(user_id)
+
+    async def _flush_dirty(self):
+        await asyncio.sleep(0)
+        batch, self._dirty = self._dirty, {}
+        if not batch:
+            return
+        try:
+            await self.store.save(batch)
+            self._synced.update(batch)
+            self._failures = 0
+        except Exception:
+            logger.exception(f"Failed to persist user_data for {len(batch)} users")
+            # Retry with the next batch unless newer data arrived meanwhile
+            for user_id, raw in batch.items():
+                self._dirty.setdefault(user_id, raw)
+            self._failures += 1
+            delay = min(
+                self.update_interval * 2 ** (self._failures - 1),
+                FLUSH_RETRY_MAX_SECONDS,
+            )
+            if self._retry is None:
+                self._retry = asyncio.get_running_loop().call_later(
+                    delay, self._schedule_flush
+                )
+
+    async def flush(self) -> None:
+        if self._retry is not None:  # don't wait out the backoff
+            self._retry.cancel()
+            self._retry = None
+        if self._flush_task:
+            await self._flush_task
+        await self._flush_dirty()
+
+    # --- not persisted ---
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+
+def _redis_store(config) -> RedisUserDataStore:
+    from redis import asyncio as redis_asyncio  # optional dependency
+
+    return RedisUserDataStore(redis_asyncio.from_url(config.redis_url))
+
+
+STORES = {
+    "sql": lambda config: SQLUserDataStore(),
+    "redis": _redis_store,
+}
+
+
+def build_persistence(config) -> Optional[UserDataPersistence]:
+    """UserDataPersistence for ``CONFIG.persistence``; None when disabled."""
+    make_store = STORES.get(config.backend)
+    if make_store is None:
+        return None
+    return UserDataPersistence(
+        make_store(config),
+        update_interval=config.update_interval,
+        refresh_on_update=config.refresh_on_update,
+    )
@@ -0,0 +1,26 @@
+"""Bot API transport that reports request times to ``src.metrics``."""
+
+import time
+
+from telegram.request import HTTPXRequest
+
+from src import metrics
+from src.db import db
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest timing every Bot API call by method (sendMessage, ...).
+
+    The update's pending DB writes are committed first: no lock is held
+    while the request is in flight.
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        db.commit_before_io()
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        finally:
+            metrics.record_telegram_call(
+                url.rsplit("/", 1)[-1], time.perf_counter() - started
+            )
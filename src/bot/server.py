@@ -0,0 +1,153 @@
+"""HTTP side of the bot: the webhook entry point and the metrics endpoint.
+
+PTB's own ``run_webhook`` needs tornado and accepts updates unconditionally.
+This server answers 503 once ``max_pending_updates`` updates are queued or
+still being handled; Telegram keeps undelivered updates and retries them
+later, so an overloaded bot slows intake instead of piling up tasks.
+"""
+
+import asyncio
+import contextlib
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from src import metrics
+from src.db import db
+from src.db.evaluation_cache import evaluation_cache
+from src.db.user_cache import user_cache
+from src.llm import gateway as llm_gateway
+from telegram_rest_mvc.settings.config import Telegram
+
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def pending_updates(application: Application) -> int:
+    """Updates queued plus updates the processor has not finished yet."""
+    in_flight = getattr(application.update_processor, "pending", 0)
+    return application.update_queue.qsize() + in_flight
+
+
+def build_webhook_app(application: Application, config: Telegram) -> web.Application:
+    async def receive_update(request: web.Request) -> web.Response:
+        if config.webhook_secret and (
+            request.headers.get(SECRET_HEADER) != config.webhook_secret
+        ):
+            return web.Response(status=403)
+        if pending_updates(application) >= config.max_pending_updates:
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except ValueError:
+            return web.Response(status=400)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def healthz(_request: web.Request) -> web.Response:
+        return web.json_response(
+            {"status": "ok", "pending_updates": pending_updates(application)}
+        )
+
+    web_app = web.Application()
+    web_app.router.add_post(config.webhook_path, receive_update)
+    web_app.router.add_get("/healthz", healthz)
+    return web_app
+
+
+def _qsize(queue) -> int:
+    return queue.qsize() if queue is not None else 0
+
+
+def watch_runtime(application: Application):
+    """Point the queue, cache and pool gauges at this process's live objects."""
+    bot_data = application.bot_data
+    gauges = {
+        "updates": lambda: pending_updates(application),
+        "plan_jobs": lambda: _qsize(bot_data.get("plan_jobs")),
+        "db_writes": lambda: _qsize(bot_data.get("db_writer")),
+        "llm": lambda: _qsize(llm_gateway.get_limiter()),
+    }
+    for queue, function in gauges.items():
+        metrics.QUEUE_DEPTH.set_function(function, queue=queue)
+    caches = {"user": user_cache, "evaluation": evaluation_cache}
+    for name, cache in caches.items():
+        metrics.CACHE_HIT_RATIO.set_function(
+            lambda cache=cache: cache.stats()["hit_ratio"], cache=name
+        )
+        metrics.CACHE_ENTRIES.set_function(lambda cache=cache: len(cache), cache=name)
+    metrics.LLM_IN_FLIGHT.set_function(
+        lambda: getattr(llm_gateway.get_limiter(), "in_flight", 0)
+    )
+    metrics.DB_POOL_CHECKED_OUT.set_function(
+        lambda: getattr(db.engine.pool, "checkedout", lambda: 0)()
+    )
+
+
+async def serve_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=metrics.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server(listen: str, port: int) -> web.AppRunner:
+    """Serve ``GET /metrics`` on its own port; call ``cleanup()`` to stop."""
+    web_app = web.Application()
+    web_app.router.add_get("/metrics", serve_metrics)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, listen, port).start()
+    logger.info(f"Metrics server listening on {listen}:{port}")
+    return runner
+
+
+async def _wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+async def run_webhook(application: Application, config: Telegram):
+    """Serve updates over HTTPS webhooks until SIGINT/SIGTERM.
+
+    Mirrors ``Application.run_polling``: post_init/post_stop hooks run and
+    pending updates are processed before shutdown.
+    """
+    if not config.webhook_url:
+        raise ValueError("TELEGRAM__WEBHOOK_URL is required in webhook mode")
+
+    runner = web.AppRunner(build_webhook_app(application, config))
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.bot.set_webhook(
+        url=config.webhook_url.rstrip("/") + config.webhook_path,
+        secret_token=config.webhook_secret,
+        max_connections=config.webhook_max_connections,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    await application.start()
+    await runner.setup()
+    await web.TCPSite(runner, config.webhook_listen, config.webhook_port).start()
+    logger.info(
+        f"Webhook server listening on {config.webhook_listen}:{config.webhook_port}"
+    )
+    try:
+        await _wait_for_stop_signal()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
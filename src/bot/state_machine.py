@@ -2,9 +2,10 @@ import logging
 from enum import Enum
 from typing import Optional
 
-from sqlmodel import Session, select
+from sqlmodel import Session
 
-from src.db.models import User
+from src.db import user_cache
+from src.db.db import commit_or_flush
 
 
 logger = logging.getLogger(__name__)
@@ -19,20 +20,19 @@ class UserState(Enum):
 
 
 def get_user_state(session: Session, telegram_id: int) -> str:
-    user = session.exec(select(User).where(User.telegram_id == telegram_id)).first()
-    return (
-        getattr(user, "state", UserState.LANG_SELECT.value)
-        if user
-        else UserState.LANG_SELECT.value
-    )
+    # Read the row, not the cached snapshot: another worker may have moved the
+    # user on. Within an update it is already in the session's identity map.
+    user = user_cache.load_user(session, telegram_id)
+    return user.state if user else UserState.LANG_SELECT.value
 
 
 def set_user_state(session: Session, telegram_id: int, state: str | UserState) -> None:
-    user = session.exec(select(User).where(User.telegram_id == telegram_id)).first()
+    # The cache is updated after the commit (write-through in user_cache)
+    user = user_cache.load_user(session, telegram_id)
     if user:
         user.state = state.value if isinstance(state, UserState) else state
         session.add(user)
-        session.commit()
+        commit_or_flush(session)
 
 
 # Helper functions
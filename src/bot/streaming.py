@@ -0,0 +1,92 @@
+"""Progressive edits of one message while an LLM reply streams in.
+
+Telegram throttles frequent edits of a message, so partial text is
+coalesced: at most one edit per ``interval`` and only once enough new text
+arrived. The first partial edit is not delayed. ``finish()`` always shows
+the final text, continued in new messages past Telegram's length limit.
+"""
+
+import logging
+import time
+from typing import Callable, List, Optional
+
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest
+
+from src.settings.config import CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+MIN_NEW_CHARS = 20
+PARTIAL_SUFFIX = " …"
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """``text`` in parts of at most ``limit`` characters, cut at line or word breaks."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip()
+    parts.append(text)
+    return parts
+
+
+class ProgressiveEdit:
+    """Edits ``message`` with the text generated so far."""
+
+    def __init__(
+        self,
+        message: Message,
+        interval: float = CONFIG.llm.stream_edit_interval,
+        min_new_chars: int = MIN_NEW_CHARS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.message = message
+        self.interval = interval
+        self.min_new_chars = min_new_chars
+        self._clock = clock
+        self._shown = ""
+        self._last_edit = float("-inf")
+        self.edits = 0
+
+    async def update(self, text: str):
+        """Show ``text`` (the whole reply so far) unless an edit is too soon."""
+        if len(text) - len(self._shown) < self.min_new_chars:
+            return
+        if self._clock() - self._last_edit < self.interval:
+            return
+        preview = text[: MAX_MESSAGE_LENGTH - len(PARTIAL_SUFFIX)] + PARTIAL_SUFFIX
+        try:
+            await self._edit(preview)
+        except Exception as e:  # a preview is best effort; finish() still runs
+            logger.warning(f"Could not show a partial reply: {e}")
+            return
+        self._shown = text
+
+    async def finish(
+        self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None
+    ):
+        """Show the final ``text``; ``reply_markup`` goes on its last message."""
+        parts = split_text(text)
+        markups = [None] * (len(parts) - 1) + [reply_markup]
+        await self._edit(parts[0], markups[0])
+        for part, markup in zip(parts[1:], markups[1:]):
+            await self.message.chat.send_message(part, reply_markup=markup)
+        self._shown = text
+
+    async def _edit(self, text: str, reply_markup=None):
+        self._last_edit = self._clock()
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup)
+            self.edits += 1
+        except BadRequest as e:
+            # Telegram rejects an edit that changes nothing
+            if "not modified" not in str(e).lower():
+                raise
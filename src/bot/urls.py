@@ -1,10 +1,8 @@
 """URL configuration for telegram_rest_mvc routes used by this bot."""
 
-from constants.callback_data import (
-    ACTION_NEXT_QUESTION,
-    DIAGNOSTIC_SCORE_PREFIX,
-    LANG_SELECT_PREFIX,
-)
+from constants import messages
+from constants.callback_data import ACTION_NEXT_QUESTION, DIAGNOSTIC_SCORE, LANG_SELECT
+from src.bot.middleware import MIDDLEWARE
 from src.bot.views import diagnostics as diagnostics_view_module
 from src.bot.views import language as language_view_module
 from src.bot.views import message as message_view_module
@@ -17,7 +15,9 @@ from telegram_rest_mvc.router import path
 from telegram_rest_mvc.views import View
 
 
-router = Router()
+router = Router(
+    middleware=MIDDLEWARE, expired_callback_text=messages.MSG_BUTTON_EXPIRED
+)
 
 
 class PingView(View):
@@ -56,7 +56,7 @@ msg_path(router, message_view_module.UserTextMessageView.as_handler(), name="use
 # Callback route for diagnostic scores
 cb_path(
     router,
-    pattern=f"^{DIAGNOSTIC_SCORE_PREFIX}",
+    pattern=DIAGNOSTIC_SCORE,
     handler=diagnostics_view_module.DiagnosticScoreView.as_handler(),
     name="diagnostic_score",
 )
@@ -64,7 +64,7 @@ cb_path(
 # Language selection callback
 cb_path(
     router,
-    pattern=f"^{LANG_SELECT_PREFIX}",
+    pattern=LANG_SELECT,
     handler=language_view_module.LanguageSelectionView.as_handler(),
     name="language_select",
 )
@@ -1,13 +1,15 @@
 import logging
+from typing import Optional
 
+from sqlmodel import Session
 from telegram import InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from constants import callback_data, messages
+from constants import messages
 from src import utils
 from src.bot.flow_result import FlowResult, FlowStatus
 from src.bot.flows import diagnostics as diagnostics_flow
-from src.bot.flows import practice as practice_flow
+from src.bot.middleware import current_user
 from src.bot.views import practice as practice_view
 from src.db import services
 from src.db.db import get_session
@@ -21,6 +23,21 @@ DEFAULT_ERR = getattr(
 )
 
 
+def _active_progress_id(
+    context: ContextTypes.DEFAULT_TYPE, session: Session, telegram_id: int
+) -> Optional[int]:
+    """The progress being diagnosed: from user_data, else the active language's."""
+    progress_id = context.user_data.get("active_progress_id")
+    if progress_id is not None:
+        return progress_id
+    user = current_user(context, session, telegram_id)
+    if not user.active_language_id:
+        return None
+    return services.get_or_create_user_progress(
+        session, user.id, user.active_language_id
+    ).id
+
+
 def render(result: FlowResult):
     """Convert FlowResult diagnostics to text/markup for Telegram."""
     dispatch = {
@@ -47,9 +64,6 @@ def render(result: FlowResult):
 
 class DiagnosticsView(View):
     async def command(self):
-        telegram_id = self.update.effective_user.id
-        self.context.user_data["telegram_id"] = telegram_id
-
         flow_result = await diagnostics_flow.start_diagnostics(self.context)
 
         # If user has no active language, send technology selection list
@@ -93,16 +107,11 @@ class DiagnosticScoreView(View):
 
         logger.info(f"DiagnosticScoreView received data: {query.data}")
 
-        try:
-            data_payload = query.data.replace(callback_data.DIAGNOSTIC_SCORE_PREFIX, "")
-            question_id_str, score_str = data_payload.split("_")
-            question_id = int(question_id_str)
-            score = int(score_str)
-        except Exception:
+        if not self.params:
             await query.edit_message_text(messages.MSG_DIAGNOSTIC_SCORE_PARSE_ERROR)
             return
-
-        self.context.user_data["telegram_id"] = self.update.effective_user.id
+        question_id = self.params["question_id"]
+        score = self.params["score"]
 
         flow_result = await diagnostics_flow.process_diagnostic_score(
             self.context, question_id, score
@@ -119,38 +128,39 @@ class DiagnosticScoreView(View):
                 messages.MSG_DIAGNOSTICS_SCORES_SAVED_COMPLETE
             )
 
-            # Generate practice plan
             with get_session() as session:
-                user = services.get_or_create_user(
-                    session, telegram_id=self.update.effective_user.id
+                progress_id = _active_progress_id(
+                    self.context, session, self.update.effective_user.id
+                )
+            if progress_id is None:
+                await query.message.reply_text(messages.MSG_NO_ACTIVE_LANGUAGE_START)
+                return
+            plan_jobs = self.context.bot_data.get("plan_jobs")
+            if plan_jobs:
+                # Generate the plan in the background; the worker notifies the user
+                await plan_jobs.enqueue(
+                    user_progress_id=progress_id,
+                    telegram_id=self.update.effective_user.id,
+                    chat_id=query.message.chat_id,
                 )
-                user_progress = session.get(
-                    services.UserProgress,
-                    self.context.user_data.get("active_progress_id"),
+                await query.message.reply_text(messages.MSG_GENERATING_PRACTICE_PLAN)
+                return
+
+            # No job queue configured: generate practice plan inline
+            with get_session() as session:
+                user = current_user(
+                    self.context, session, self.update.effective_user.id
                 )
+                user_progress = session.get(services.UserProgress, progress_id)
 
                 success, practice_result = await generate_practice_plan(
                     self.context, session, user, user_progress
                 )
 
-            if success:
-                await query.message.reply_text(
-                    messages.MSG_NEW_PRACTICE_QUESTIONS_READY.format(
-                        count=practice_result
-                    )
-                )
-                # First practice question
-                p_res = await practice_flow.get_current_practice_question(self.context)
-                p_text, p_markup = practice_view.render(p_res)
-                await query.message.reply_text(p_text, reply_markup=p_markup)
-            elif practice_result == "NO_QUESTIONS":
-                await query.message.reply_text(
-                    messages.MSG_PRACTICE_PLAN_GENERATION_FAILED_NO_QUESTIONS
-                )
-            else:
-                await query.message.reply_text(
-                    messages.MSG_PRACTICE_PLAN_GENERATION_ERROR
-                )
+            for text, markup in await practice_view.plan_result_messages(
+                self.context, success, practice_result
+            ):
+                await query.message.reply_text(text, reply_markup=markup)
             return
 
         if flow_result.status == FlowStatus.NO_ACTIVE_QUESTION:
@@ -3,7 +3,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from constants import callback_data
+from src.bot.middleware import current_user
 from src.db import services
 from src.db.db import get_session
 from telegram_rest_mvc.views import View
@@ -13,10 +13,11 @@ class LanguageSelectionView(View):
     async def command(self):
         query = self.update.callback_query
         await query.answer()
-        language_slug = query.data.replace(callback_data.LANG_SELECT_PREFIX, "")
+        if not self.params:
+            return  # malformed button
         with get_session() as session:
-            user = services.get_or_create_user(session, telegram_id=query.from_user.id)
-            lang = services.get_language_by_id(session, int(language_slug))
+            user = current_user(self.context, session, query.from_user.id)
+            lang = services.get_language_by_id(session, self.params["language_id"])
             services.set_user_active_language(
                 session, user_id=user.id, language_id=lang.id
             )
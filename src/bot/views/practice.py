@@ -9,8 +9,10 @@ from constants import messages, prompts
 from src import utils
 from src.bot.flow_result import FlowResult, FlowStatus
 from src.bot.flows import practice as practice_flow
-from src.db import services
+from src.bot.middleware import current_user
+from src.db import plan_templates, services
 from src.db.db import get_session
+from src.llm import gateway as llm_gateway
 from telegram_rest_mvc.views import View
 
 
@@ -82,8 +84,53 @@ async def _generate_and_save_practice_questions(context, session, user, user_pro
     else:
         diagnostic_scores = json.loads(user_progress.diagnostic_scores_json)
 
+    question_ids = plan_templates.lookup(session, active_language.id, diagnostic_scores)
+    if question_ids is None:
+        llm = context.bot_data.get("chat_model")
+        if not llm:
+            logger.error(
+                "LLM (chat_model) not found in context.bot_data for practice plan generation."
+            )
+            return 0
+        plan_questions = await request_plan_questions(
+            llm, session, active_language, diagnostic_scores
+        )
+        if not plan_questions:
+            return 0
+        question_ids = services.upsert_plan_questions(
+            session, active_language.id, plan_questions
+        )
+        plan_templates.store(
+            session, active_language.id, diagnostic_scores, question_ids
+        )
+
+    current_order_index = (
+        services.get_max_learning_plan_order_index(
+            session, user_progress_id=user_progress.id
+        )
+        + 1
+    )
+    first_new_item_id = services.add_plan_items(
+        session,
+        user_progress_id=user_progress.id,
+        plan_question_ids=question_ids,
+        start_order_index=current_order_index,
+    )
+    if not first_new_item_id:
+        return 0
+
+    services.set_current_learning_item(
+        session,
+        user_progress_id=user_progress.id,
+        new_current_item_id=first_new_item_id,
+    )
+    return len(question_ids)
+
+
+async def request_plan_questions(llm, session, language, diagnostic_scores):
+    """Ask the LLM for a plan: ``(category_name, question_text)`` pairs, or None."""
     all_categories = services.get_categories_for_language(
-        session, language_id=active_language.id
+        session, language_id=language.id
     )
     category_map = {str(cat.id): cat.name for cat in all_categories}
     formatted_scores = "\n".join(
@@ -94,79 +141,36 @@ async def _generate_and_save_practice_questions(context, session, user, user_pro
     )
 
     prompt_text = prompts.PRACTICE_PLAN_GENERATION_PROMPT_TEMPLATE.format(
-        language_name=active_language.name,
+        language_name=language.name,
         formatted_scores=formatted_scores,
         category_list_str=", ".join([cat.name for cat in all_categories]),
     )
 
-    llm = context.bot_data.get("chat_model")
-    if not llm:
-        logger.error(
-            "LLM (chat_model) not found in context.bot_data for practice plan generation."
-        )
-        return 0
-
     try:
-        llm_raw = llm.invoke([HumanMessage(content=prompt_text)])
+        llm_raw = await llm_gateway.ainvoke(llm, [HumanMessage(content=prompt_text)])
         llm_response = getattr(llm_raw, "content", None)
         if not llm_response:
             logger.error("LLM returned no content for practice plan generation.")
-            return 0
+            return None
         plan_json_str = _extract_json_from_llm_response(llm_response)
         plan = json.loads(plan_json_str)
     except Exception as e:
         logger.exception(f"Failed to generate practice plan via LLM: {e}")
-        return 0
+        return None
 
     questions = plan if isinstance(plan, list) else plan.get("questions")
     if not questions or not isinstance(questions, list):
         logger.error("LLM plan JSON invalid")
-        return 0
-
-    new_plan_items = 0
-    first_new_item_id = None
-    current_order_index = (
-        services.get_max_learning_plan_order_index(
-            session, user_progress_id=user_progress.id
-        )
-        + 1
-    )
+        return None
 
-    for q in questions:
-        category_name = q.get("category_name") or q.get("category")
-        if not category_name:
-            continue
-        category = services.get_or_create_category(session, name=category_name)
-        question_text = q.get("question_text") or q.get("text")
-        if not question_text:
-            continue
-        question = services.create_question(
-            session=session,
-            text=question_text,
-            category_id=category.id,
-            language_id=active_language.id,
-            is_diagnostic=False,
-        )
-        plan_item = services.add_question_to_learning_plan(
-            session,
-            user_progress_id=user_progress.id,
-            question_id=question.id,
-            order_index=current_order_index,
-            status="pending",
+    plan_questions = [
+        (
+            q.get("category_name") or q.get("category"),
+            q.get("question_text") or q.get("text"),
         )
-        if new_plan_items == 0:
-            first_new_item_id = plan_item.id
-        new_plan_items += 1
-        current_order_index += 1
-
-    if new_plan_items and first_new_item_id:
-        services.set_current_learning_item(
-            session,
-            user_progress_id=user_progress.id,
-            new_current_item_id=first_new_item_id,
-        )
-
-    return new_plan_items
+        for q in questions
+    ]
+    return [(cat, text) for cat, text in plan_questions if cat and text]
 
 
 async def generate_practice_plan(context, session, user, user_progress):
@@ -186,13 +190,29 @@ async def generate_practice_plan(context, session, user, user_progress):
         return False, "ERROR"
 
 
+async def plan_result_messages(context, success, practice_result):
+    """Messages (text, reply_markup) announcing the outcome of plan generation."""
+    if success:
+        p_res = await practice_flow.get_current_practice_question(context)
+        return [
+            (
+                messages.MSG_NEW_PRACTICE_QUESTIONS_READY.format(count=practice_result),
+                None,
+            ),
+            render(p_res),
+        ]
+    if practice_result == "NO_QUESTIONS":
+        return [(messages.MSG_PRACTICE_PLAN_GENERATION_FAILED_NO_QUESTIONS, None)]
+
+    return [(messages.MSG_PRACTICE_PLAN_GENERATION_ERROR, None)]
+
+
 class PracticeView(View):
     async def command(self):
         telegram_id = self.update.effective_user.id
-        self.context.user_data["telegram_id"] = telegram_id
 
         with get_session() as session:
-            user = services.get_or_create_user(session, telegram_id=telegram_id)
+            user = current_user(self.context, session, telegram_id)
             user_progress = services.get_or_create_user_progress(
                 session, user_id=user.id, language_id=user.active_language_id
             )
@@ -206,7 +226,7 @@ class PracticeView(View):
 
         flow_res = await practice_flow.get_current_practice_question(self.context)
         text, markup = render(flow_res)
-        msg = src.utils.get_effective_message(self.update, self.context)
+        msg = utils.get_effective_message(self.update, self.context)
         if msg:
             await msg.reply_text(text, reply_markup=markup)
 
@@ -218,8 +238,6 @@ class NextQuestionView(View):
         query = self.update.callback_query
         await query.answer()
 
-        self.context.user_data["telegram_id"] = query.from_user.id
-
         flow_res = await practice_flow.next_practice_question(self.context)
 
         if flow_res.status == FlowStatus.OK:
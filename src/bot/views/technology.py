@@ -4,6 +4,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from constants import callback_data, messages
 from src import utils
+from src.bot.middleware import current_user
 from src.db import services
 from src.db.db import get_session
 from telegram_rest_mvc.views import View
@@ -13,7 +14,7 @@ class TechnologyView(View):
     async def command(self):
         telegram_id = self.update.effective_user.id
         with get_session() as session:
-            user = services.get_or_create_user(session, telegram_id=telegram_id)
+            user = current_user(self.context, session, telegram_id)
             technologies = services.list_languages(session)
             if not technologies:
                 msg = utils.get_effective_message(self.update, self.context)
@@ -25,7 +26,9 @@ class TechnologyView(View):
                 [
                     InlineKeyboardButton(
                         tech.name,
-                        callback_data=f"{callback_data.LANG_SELECT_PREFIX}{tech.id}",
+                        callback_data=callback_data.LANG_SELECT.encode(
+                            language_id=tech.id
+                        ),
                     )
                 ]
                 for tech in technologies
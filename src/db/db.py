@@ -1,15 +1,26 @@
+import asyncio
 import logging
 import os
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
 
+from sqlalchemy import event
 from sqlmodel import Session, SQLModel, create_engine
 
+from src import metrics
+from src.db.migrations import run_migrations
+from src.settings.config import CONFIG
+
 from .models import (
     Category,
+    PlanGenerationJob,
     ProgrammingLanguage,
     Question,
     User,
     UserAnswer,
+    UserDataRecord,
     UserLearningPlanItem,
     UserProgress,
 )
@@ -17,28 +28,198 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
-DATABASE_URL = "sqlite:///db.sqlite3"
-engine = create_engine(DATABASE_URL, echo=True)
+
+def engine_options(db_config, url: str) -> dict:
+    """create_engine() keyword arguments derived from the Database settings."""
+    options = {
+        "echo": db_config.echo,
+        "pool_pre_ping": db_config.pool_pre_ping,
+        "pool_recycle": db_config.pool_recycle,
+    }
+    # In-memory SQLite lives in a single connection; pool sizing does not apply
+    if ":memory:" not in url and not url.endswith("://"):
+        options.update(
+            pool_size=db_config.pool_size,
+            max_overflow=db_config.max_overflow,
+            pool_timeout=db_config.pool_timeout,
+        )
+
+    if url.startswith("postgresql") and db_config.statement_timeout_ms:
+        timeout = db_config.statement_timeout_ms
+        options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+def apply_sqlite_pragmas(sync_engine, db_config):
+    """SQLite production profile: WAL, relaxed fsync, bigger caches, busy wait."""
+    pragmas = [
+        f"PRAGMA synchronous={db_config.sqlite_synchronous}",
+        f"PRAGMA mmap_size={db_config.sqlite_mmap_size}",
+        f"PRAGMA cache_size={db_config.sqlite_cache_size}",
+        f"PRAGMA busy_timeout={db_config.sqlite_busy_timeout_ms}",
+    ]
+    if db_config.sqlite_wal:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def instrument_pool(sync_engine):
+    """Time how long callers wait for a connection from the engine's pool."""
+    pool = sync_engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            metrics.record_pool_checkout(time.perf_counter() - started)
+
+    # Pools have no "checkout requested" event, so wrap the entry point
+    pool.connect = timed_connect
+
+
+def instrument_engine(sync_engine):
+    """Time every statement and pool checkout into src.metrics."""
+    instrument_pool(sync_engine)
+    # dispose() swaps in a fresh pool
+    event.listen(sync_engine, "engine_disposed", instrument_pool)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        metrics.record_db_query(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed_query(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def create_db_engine(db_config):
+    url = db_config.build_url()
+    new_engine = create_engine(url, **engine_options(db_config, url))
+    if new_engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(new_engine, db_config)
+    instrument_engine(new_engine)
+    return new_engine
+
+
+DATABASE_URL = CONFIG.database.build_url()
+engine = create_db_engine(CONFIG.database)
+
+
+# Session of the unit of work open in the current task (one per update)
+_current_session: ContextVar[Session | None] = ContextVar(
+    "current_session", default=None
+)
 
 
 @contextmanager
 def get_session():
+    """Session for the caller; joins the unit of work of the current update."""
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
     with Session(engine) as session:
         yield session
 
 
+@contextmanager
+def unit_of_work():
+    """One session per update, committed when the block exits cleanly.
+
+    Services called inside only flush. The transaction is also committed by
+    ``commit_before_io()`` whenever the update waits on the Bot API or the
+    LLM, so a failure rolls back the work since the last such wait. Nested
+    calls join the outer unit of work.
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+    with Session(engine, expire_on_commit=False) as session:
+        session.info["unit_of_work"] = True
+        token = _current_session.set(session)
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            _current_session.reset(token)
+
+
+def offloads_queries() -> bool:
+    """Whether ``run_blocking`` moves DB work off the event loop."""
+    return CONFIG.database.offload_queries and engine.dialect.name != "sqlite"
+
+
+async def run_blocking(fn: Callable, *args, **kwargs):
+    """Run blocking DB work, in a worker thread unless the database is SQLite.
+
+    On PostgreSQL a slow query then stalls only its own update, not every
+    user's. SQLite stays on the loop: its queries are local and its writes
+    go through the WriteQueue. The call keeps the caller's contextvars, so
+    it joins the update's unit of work.
+    """
+    if not offloads_queries():
+        return fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def commit_before_io():
+    """Commit the current unit of work before the task awaits network I/O.
+
+    SQLite has a single writer: a transaction kept open across an await
+    makes other updates' writes busy-wait on the event loop, which the lock
+    holder itself needs to finish. Called by the Bot API transport, the LLM
+    gateway and queued writes.
+    """
+    session = _current_session.get()
+    if session is not None and session.in_transaction():
+        session.commit()
+
+
+def commit_or_flush(session: Session, *instances):
+    """Commit and refresh ``instances``, or only flush inside a unit of work."""
+    if session.info.get("unit_of_work"):
+        session.flush()
+        return
+    session.commit()
+    for instance in instances:
+        session.refresh(instance)
+
+
 def init_db():
     """
     Initializes the database by ensuring all tables defined in the models
-    are created if they do not already exist. This function does NOT
-    delete any existing database or tables. Deletion is handled by drop_db.py.
+    are created if they do not already exist, then applies pending schema
+    migrations. This function does NOT delete any existing database or
+    tables. Deletion is handled by drop_db.py.
     """
     logger.info(f"Initializing database ({DATABASE_URL}): Ensuring all tables exist...")
     try:
         # SQLModel.metadata.create_all(engine) will create tables for all imported models
         # that inherit from SQLModel and have `table=True` if they don't already exist.
-        # It will not alter existing tables if their schema has changed (that requires migrations).
+        # It will not alter existing tables: schema changes are applied by migrations.
         SQLModel.metadata.create_all(engine)
+        applied = run_migrations(engine)
+        if applied:
+            logger.info(f"Applied migrations: {applied}")
         # SQLite and some drivers may defer DDL changes until the transaction is
         # committed. Open a temporary connection and commit explicitly so that
         # any subsequent new connections (e.g., via sqlalchemy.inspect) can
@@ -0,0 +1,132 @@
+"""Reuse of LLM answer evaluations for repeated answers to the same question.
+
+Many users send the same answer to a question: blank, "не знаю", text
+pasted from the same source. Answers are keyed by question id and a
+fingerprint of the normalized answer text and the evaluation prompt, so a
+prompt change starts a fresh cache. Lookups try the in-process LRU first,
+then the ``answerevaluation`` table; rows expire after the TTL and the
+least recently used ones are evicted beyond ``evaluation_max_rows``.
+Memory hits are written back to the table in batches, so the rows
+answered from memory stay the most recently used.
+"""
+
+import datetime
+import hashlib
+import threading
+from collections import Counter
+from typing import Optional
+
+from sqlmodel import Session
+
+from constants import prompts
+from src import metrics
+from src.cache import TTLCache
+from src.db import services
+from src.settings.config import CONFIG
+
+
+evaluation_cache = TTLCache(
+    maxsize=CONFIG.cache.evaluation_memory_size,
+    ttl=CONFIG.cache.evaluation_ttl_seconds,
+)
+
+PROMPT_VERSION = hashlib.sha256(
+    prompts.PRACTICE_ANSWER_EVALUATION_PROMPT_TEMPLATE.encode("utf-8")
+).hexdigest()[:12]
+
+# Expired and excess rows are evicted once per this many stores
+EVICT_EVERY = 100
+# Memory hits are written back to the table once per this many
+TOUCH_EVERY = 50
+
+# Sentence punctuation around an answer; a leading "!" is a negation
+_LEADING = " .,;:?…"
+_TRAILING = " .,;:!?…"
+
+_stores = 0
+_touched: Counter = Counter()
+_touched_lock = threading.Lock()
+
+
+def normalize_answer(text: str) -> str:
+    """Answer text casefolded, whitespace collapsed, edge punctuation stripped.
+
+    Symbols inside the answer are kept: ``a<b`` and ``a>b`` differ.
+    """
+    text = " ".join(text.casefold().split())
+    return text.lstrip(_LEADING).rstrip(_TRAILING)
+
+
+def answer_fingerprint(text: str) -> str:
+    key = f"{PROMPT_VERSION}\n{normalize_answer(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _created_after() -> datetime.datetime:
+    ttl = datetime.timedelta(seconds=CONFIG.cache.evaluation_ttl_seconds)
+    return datetime.datetime.utcnow() - ttl
+
+
+def lookup(session: Session, question_id: int, answer_text: str) -> Optional[str]:
+    """Cached explanation for this answer, or None when the LLM must be asked."""
+    key = (question_id, answer_fingerprint(answer_text))
+    cached = evaluation_cache.get(key)
+    if cached is not None:
+        explanation, llm_seconds = cached
+        metrics.record_evaluation_cache("memory", llm_seconds)
+        with _touched_lock:
+            _touched[key] += 1
+            pending = sum(_touched.values())
+        if pending >= TOUCH_EVERY:
+            flush_touches(session)
+        return explanation
+
+    evaluation = services.get_answer_evaluation(
+        session, question_id, key[1], created_after=_created_after()
+    )
+    if evaluation is None:
+        metrics.record_evaluation_cache("miss")
+        return None
+    evaluation_cache.set(key, (evaluation.explanation, evaluation.llm_seconds))
+    metrics.record_evaluation_cache("db", evaluation.llm_seconds)
+    return evaluation.explanation
+
+
+def flush_touches(session: Session):
+    """Write the memory hits since the last flush to the table."""
+    global _touched
+
+    with _touched_lock:
+        touched, _touched = _touched, Counter()
+    services.touch_answer_evaluations(
+        session, dict(touched), datetime.datetime.utcnow()
+    )
+
+
+def store(
+    session: Session,
+    question_id: int,
+    answer_text: str,
+    explanation: str,
+    llm_seconds: float = 0.0,
+):
+    """Remember a fresh evaluation; evicts old rows every ``EVICT_EVERY`` stores.
+
+    The memory tier is filled right away: an evaluation stays correct even
+    if the update that produced it is rolled back.
+    """
+    global _stores
+
+    if not explanation:
+        return  # an empty completion is not worth reusing
+    fingerprint = answer_fingerprint(answer_text)
+    services.save_answer_evaluation(
+        session, question_id, fingerprint, explanation, llm_seconds
+    )
+    evaluation_cache.set((question_id, fingerprint), (explanation, llm_seconds))
+    _stores += 1
+    if _stores % EVICT_EVERY == 0:
+        flush_touches(session)  # rows hot in memory must not look idle
+        services.evict_answer_evaluations(
+            session, _created_after(), CONFIG.cache.evaluation_max_rows
+        )
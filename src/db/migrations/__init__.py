@@ -0,0 +1,60 @@
+"""Small versioned schema migration runner.
+
+``create_all`` only creates missing tables; it never changes existing ones.
+Schema changes to existing tables are migrations instead: modules named
+``mNNNN_<name>.py`` with ``VERSION``, ``NAME`` and ``upgrade(engine)``,
+registered in ``MIGRATIONS``. Applied versions are recorded in the
+``schema_migrations`` table.
+
+Migrations must be idempotent: a fresh database already has the latest
+schema from ``create_all`` and simply records them as applied.
+"""
+
+import datetime
+import logging
+from typing import List
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.engine import Engine
+
+from src.db.migrations import m0001_question_text_hash, m0002_learning_plan_indexes
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = [m0001_question_text_hash, m0002_learning_plan_indexes]
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def applied_versions(engine: Engine) -> set:
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine, migrations=MIGRATIONS) -> List[int]:
+    """Apply pending migrations in version order; returns the applied versions."""
+    done = applied_versions(engine)
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.VERSION):
+        if migration.VERSION in done:
+            continue
+        logger.info(f"Applying migration {migration.VERSION:04d}_{migration.NAME}")
+        migration.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                schema_migrations.insert().values(
+                    version=migration.VERSION,
+                    name=migration.NAME,
+                    applied_at=datetime.datetime.utcnow(),
+                )
+            )
+        applied.append(migration.VERSION)
+    return applied
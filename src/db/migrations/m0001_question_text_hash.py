@@ -0,0 +1,84 @@
+"""Question.text_hash: add, backfill, merge duplicates, unique index."""
+
+import logging
+
+from sqlalchemy import bindparam, func, select, update
+
+from src.db.migrations import operations
+from src.db.models import Question, SQLModel, question_text_hash
+
+
+VERSION = 1
+NAME = "question_text_hash"
+
+logger = logging.getLogger(__name__)
+
+question = Question.__table__
+DEDUPE_INDEX = next(
+    index for index in question.indexes if index.name.startswith("uq_question_")
+)
+
+
+def _fetch_unhashed(conn, limit):
+    return conn.execute(
+        select(question.c.id, question.c.text)
+        .where(question.c.text_hash.is_(None))
+        .limit(limit)
+    ).all()
+
+
+def _store_hashes(conn, rows):
+    conn.execute(
+        update(question)
+        .where(question.c.id == bindparam("question_id"))
+        .values(text_hash=bindparam("hash")),
+        [{"question_id": row.id, "hash": question_text_hash(row.text)} for row in rows],
+    )
+
+
+def merge_duplicate_questions(conn) -> int:
+    """Keep one question per dedupe key and repoint references to it."""
+    key = (question.c.language_id, question.c.category_id, question.c.text_hash)
+    groups = conn.execute(select(*key).group_by(*key).having(func.count() > 1)).all()
+    referencing = [
+        fk.parent
+        for table in SQLModel.metadata.sorted_tables
+        for fk in table.foreign_keys
+        if fk.column.table is question
+    ]
+
+    merged = 0
+    for language_id, category_id, text_hash in groups:
+        # Prefer the diagnostic copy, then the oldest one
+        ids = (
+            conn.execute(
+                select(question.c.id)
+                .where(question.c.language_id == language_id)
+                .where(question.c.category_id == category_id)
+                .where(question.c.text_hash == text_hash)
+                .order_by(question.c.is_diagnostic.desc(), question.c.id)
+            )
+            .scalars()
+            .all()
+        )
+        keeper, duplicates = ids[0], ids[1:]
+        for column in referencing:
+            conn.execute(
+                update(column.table)
+                .where(column.in_(duplicates))
+                .values({column.name: keeper})
+            )
+        conn.execute(question.delete().where(question.c.id.in_(duplicates)))
+        merged += len(duplicates)
+
+    if merged:
+        logger.info(f"Merged {merged} duplicate questions")
+    return merged
+
+
+def upgrade(engine, batch_size: int = 1000):
+    operations.add_column(engine, "question", "text_hash", "VARCHAR(64)")
+    operations.backfill_in_batches(engine, _fetch_unhashed, _store_hashes, batch_size)
+    with engine.begin() as conn:
+        merge_duplicate_questions(conn)
+    operations.create_index(engine, DEDUPE_INDEX)
@@ -0,0 +1,17 @@
+"""Composite and partial indexes for learning-plan lookups."""
+
+from src.db.migrations import operations
+from src.db.models import UserLearningPlanItem
+
+
+VERSION = 2
+NAME = "learning_plan_indexes"
+
+# Superseded by the composite indexes, which all start with user_progress_id
+LEGACY_INDEX = "ix_userlearningplanitem_user_progress_id"
+
+
+def upgrade(engine):
+    for index in UserLearningPlanItem.__table__.indexes:
+        operations.create_index(engine, index)
+    operations.drop_index(engine, LEGACY_INDEX)
@@ -0,0 +1,83 @@
+"""Idempotent schema operations for migrations.
+
+Every helper is safe to re-run and can run against a live database:
+indexes are built ``CONCURRENTLY`` on PostgreSQL (no write lock on the
+table), and backfills commit in small batches instead of one long
+transaction.
+"""
+
+import logging
+from typing import Callable, Sequence
+
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+def has_column(engine: Engine, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def add_column(engine: Engine, table: str, column: str, ddl_type: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if has_column(engine, table, column):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    logger.info(f"Added column {table}.{column}")
+
+
+def create_index_sql(index: Index, dialect) -> str:
+    """CREATE INDEX IF NOT EXISTS, CONCURRENTLY on PostgreSQL."""
+    options = index.dialect_options["postgresql"]
+    options["concurrently"] = dialect.name == "postgresql"
+    try:
+        return str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    finally:
+        options["concurrently"] = False
+
+
+def drop_index_sql(name: str, dialect) -> str:
+    concurrently = " CONCURRENTLY" if dialect.name == "postgresql" else ""
+    return f"DROP INDEX{concurrently} IF EXISTS {name}"
+
+
+def _execute_outside_transaction(engine: Engine, sql: str):
+    # CREATE/DROP INDEX CONCURRENTLY refuses to run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(sql))
+
+
+def create_index(engine: Engine, index: Index):
+    _execute_outside_transaction(engine, create_index_sql(index, engine.dialect))
+    logger.info(f"Ensured index {index.name}")
+
+
+def drop_index(engine: Engine, name: str):
+    _execute_outside_transaction(engine, drop_index_sql(name, engine.dialect))
+    logger.info(f"Dropped index {name} (if it existed)")
+
+
+def backfill_in_batches(
+    engine: Engine,
+    fetch: Callable[[Connection, int], Sequence],
+    apply: Callable[[Connection, Sequence], None],
+    batch_size: int = 1000,
+) -> int:
+    """Repeat ``apply(conn, fetch(conn, batch_size))`` until fetch returns no rows.
+
+    Each batch is its own short transaction, so readers and writers are
+    never blocked for the duration of the whole backfill.
+    """
+    done = 0
+    while True:
+        with engine.begin() as conn:
+            rows = fetch(conn, batch_size)
+            if not rows:
+                return done
+            apply(conn, rows)
+        done += len(rows)
+        logger.info(f"Backfilled {done} rows")
@@ -1,9 +1,20 @@
 import datetime
+import hashlib
 from typing import List, Optional
 
+from sqlalchemy import Index, event, text
 from sqlmodel import Field, Relationship, SQLModel, UniqueConstraint
 
 
+def normalize_question_text(text: str) -> str:
+    """Canonical question text for deduplication: case and whitespace folded."""
+    return " ".join(text.split()).casefold()
+
+
+def question_text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_question_text(text).encode("utf-8")).hexdigest()
+
+
 # Forward declarations for type hinting
 class ProgrammingLanguage(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -45,10 +56,28 @@ class Question(SQLModel, table=True):
     author_notes: Optional[str] = Field(
         default=None
     )  # e.g., correct answer hints, internal notes
+    # question_text_hash(text); filled on insert/update, backfilled for old rows
+    text_hash: Optional[str] = Field(default=None, max_length=64)
 
     category: Optional[Category] = Relationship()
     language: Optional[ProgrammingLanguage] = Relationship()
 
+    __table_args__ = (
+        Index(
+            "uq_question_language_category_text_hash",
+            "language_id",
+            "category_id",
+            "text_hash",
+            unique=True,
+        ),
+    )
+
+
+@event.listens_for(Question, "before_insert")
+@event.listens_for(Question, "before_update")
+def _set_question_text_hash(_mapper, _connection, target: Question):
+    target.text_hash = question_text_hash(target.text)
+
 
 class UserProgress(SQLModel, table=True):
     __tablename__ = "userprogress"  # Explicit table name to avoid potential conflicts
@@ -81,7 +110,8 @@ class UserProgress(SQLModel, table=True):
 class UserLearningPlanItem(SQLModel, table=True):
     __tablename__ = "userlearningplanitem"
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_progress_id: int = Field(foreign_key="userprogress.id", index=True)
+    # Indexed through the composite indexes in __table_args__
+    user_progress_id: int = Field(foreign_key="userprogress.id")
     question_id: int = Field(foreign_key="question.id")
     order_index: int  # Sequence of the question in this specific plan
     status: str = Field(
@@ -94,6 +124,25 @@ class UserLearningPlanItem(SQLModel, table=True):
     )
     question: Optional[Question] = Relationship()
 
+    __table_args__ = (
+        # Next pending item: progress + status, ordered by order_index
+        Index(
+            "ix_plan_item_progress_status_order",
+            "user_progress_id",
+            "status",
+            "order_index",
+        ),
+        # Max order_index and "has a plan" checks
+        Index("ix_plan_item_progress_order", "user_progress_id", "order_index"),
+        # The current item, looked up on every practice message
+        Index(
+            "ix_plan_item_current",
+            "user_progress_id",
+            sqlite_where=text("status = 'current'"),
+            postgresql_where=text("status = 'current'"),
+        ),
+    )
+
 
 class UserAnswer(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -121,9 +170,80 @@ class UserAnswer(SQLModel, table=True):
     learning_plan_item: Optional[UserLearningPlanItem] = Relationship()
 
 
+class AnswerEvaluation(SQLModel, table=True):
+    """LLM evaluation reused for the same normalized answer to a question."""
+
+    __tablename__ = "answerevaluation"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    question_id: int = Field(foreign_key="question.id")
+    # evaluation_cache.answer_fingerprint(): normalized answer + prompt version
+    answer_fingerprint: str = Field(max_length=64)
+    explanation: str
+    llm_seconds: float = Field(default=0.0)  # What each reuse saves
+    hits: int = Field(default=0)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    last_used_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow, index=True
+    )
+
+    __table_args__ = (
+        Index(
+            "uq_answerevaluation_question_fingerprint",
+            "question_id",
+            "answer_fingerprint",
+            unique=True,
+        ),
+    )
+
+
+class PlanTemplate(SQLModel, table=True):
+    """Practice plan reused for users with the same language and score bands."""
+
+    __tablename__ = "plantemplate"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    language_id: int = Field(foreign_key="programminglanguage.id")
+    score_key: str  # plan_templates.score_key(): score band per category
+    question_ids_json: str  # JSON list of Question ids in plan order
+    uses: int = Field(default=0)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    last_used_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index(
+            "uq_plantemplate_language_score_key",
+            "language_id",
+            "score_key",
+            unique=True,
+        ),
+    )
+
+
 class UserDiagnosticAnswer(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     user_progress_id: int = Field(foreign_key="userprogress.id")
     question_id: int = Field(foreign_key="question.id")
     score: int
     answered_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
+class PlanGenerationJob(SQLModel, table=True):
+    __tablename__ = "plangenerationjob"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_progress_id: int = Field(foreign_key="userprogress.id", index=True)
+    telegram_id: int
+    chat_id: int  # Where to notify the user once the plan is ready
+    status: str = Field(
+        default="pending", index=True
+    )  # "pending", "running", "done", "failed"
+    error: Optional[str] = Field(default=None)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    finished_at: Optional[datetime.datetime] = Field(default=None)
+
+
+class UserDataRecord(SQLModel, table=True):
+    """Persisted subset of a user's PTB ``context.user_data`` (JSON)."""
+
+    __tablename__ = "userdatarecord"
+    user_id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    data: str
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
@@ -0,0 +1,74 @@
+"""Practice plans reused across users with similar diagnostics.
+
+A generated plan depends only on the language and the per-category
+self-assessment scores. Scores are quantized into bands (1-2 low, 3 mid,
+4-5 high, as the plan prompt treats them), so users with the same language
+and bands share one ``PlanTemplate``: the ids of the questions the LLM
+produced for the first of them. A template is regenerated once it is
+older than ``plan_template_ttl_seconds`` or has served
+``plan_template_max_uses`` plans, which keeps plans varied.
+"""
+
+import datetime
+import json
+from typing import Dict, List, Optional
+
+from sqlmodel import Session
+
+from src import metrics
+from src.db import services
+from src.db.models import PlanTemplate
+from src.settings.config import CONFIG
+
+
+SCORE_BANDS = {1: "low", 2: "low", 3: "mid", 4: "high", 5: "high"}
+
+
+def score_band(score) -> str:
+    return SCORE_BANDS[min(max(int(score), 1), 5)]
+
+
+def score_key(diagnostic_scores: Dict[str, int]) -> str:
+    """Canonical ``category_id:band`` list, e.g. ``"3:low,4:high"``."""
+    bands = sorted(
+        (str(category_id), score_band(score))
+        for category_id, score in diagnostic_scores.items()
+    )
+    return ",".join(f"{category_id}:{band}" for category_id, band in bands)
+
+
+def is_fresh(template: PlanTemplate) -> bool:
+    age = datetime.datetime.utcnow() - template.created_at
+    return (
+        age.total_seconds() < CONFIG.cache.plan_template_ttl_seconds
+        and template.uses < CONFIG.cache.plan_template_max_uses
+    )
+
+
+def lookup(
+    session: Session, language_id: int, diagnostic_scores: Dict[str, int]
+) -> Optional[List[int]]:
+    """Question ids of a fresh template for these scores, or None."""
+    template = services.get_plan_template(
+        session, language_id, score_key(diagnostic_scores)
+    )
+    if template is None or not is_fresh(template):
+        metrics.PLAN_TEMPLATE_LOOKUPS.inc(
+            result="miss" if template is None else "stale"
+        )
+        return None
+    services.mark_plan_template_used(session, template)
+    metrics.PLAN_TEMPLATE_LOOKUPS.inc(result="hit")
+    return json.loads(template.question_ids_json)
+
+
+def store(
+    session: Session,
+    language_id: int,
+    diagnostic_scores: Dict[str, int],
+    question_ids: List[int],
+):
+    if question_ids:
+        services.save_plan_template(
+            session, language_id, score_key(diagnostic_scores), question_ids
+        )
@@ -1,28 +1,44 @@
 import datetime
 import json
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 
+from sqlalchemy import bindparam, delete, func, insert, literal, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, select
 
+from src.db import user_cache
 from src.db.db import (  # engine нужен для create_all в populate_initial_data
+    commit_or_flush,
     engine,
     get_session,
 )
 from src.db.models import SQLModel  # Для SQLModel.metadata.create_all
 from src.db.models import (
+    AnswerEvaluation,
     Category,
+    PlanGenerationJob,
+    PlanTemplate,
     ProgrammingLanguage,
     Question,
     User,
     UserAnswer,
     UserLearningPlanItem,
     UserProgress,
+    question_text_hash,
 )
 
 
 logger = logging.getLogger(__name__)
 
+# Dialect INSERT constructs supporting ON CONFLICT
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+QUESTION_DEDUPE_KEY = ["language_id", "category_id", "text_hash"]
+
+
+def _upsert_insert(session: Session, model):
+    return _UPSERT_INSERTS[session.get_bind().dialect.name](model)
+
 
 # --- ProgrammingLanguage Services ---
 def get_or_create_language(
@@ -34,8 +50,7 @@ def get_or_create_language(
     if not language:
         language = ProgrammingLanguage(name=name, slug=slug)
         session.add(language)
-        session.commit()
-        session.refresh(language)
+        commit_or_flush(session, language)
         logger.info(f"Created language: {name} ({slug})")
     return language
 
@@ -64,8 +79,7 @@ def get_or_create_category(
     if not category:
         category = Category(name=name, description=description)
         session.add(category)
-        session.commit()
-        session.refresh(category)
+        commit_or_flush(session, category)
         logger.info(f"Created category: {name}")
     return category
 
@@ -134,8 +148,7 @@ def create_user(
 ) -> User:
     user = User(telegram_id=telegram_id, ui_language_code=ui_language_code)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    commit_or_flush(session, user)
     logger.info(f"Created user: {telegram_id}")
 
     return user
@@ -144,7 +157,7 @@ def create_user(
 def get_or_create_user(
     session: Session, telegram_id: int, ui_language_code: str = "ru"
 ) -> User:
-    user = session.exec(select(User).where(User.telegram_id == telegram_id)).first()
+    user = user_cache.load_user(session, telegram_id)
     if user:
         return user
     return create_user(session, telegram_id, ui_language_code)
@@ -157,8 +170,7 @@ def set_user_active_language(
     if user:
         user.active_language_id = language_id
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        commit_or_flush(session, user)
         logger.info(f"Set active language for user {user_id} to {language_id}")
     return user
 
@@ -172,33 +184,35 @@ def create_question(
     is_diagnostic: bool = False,
     author_notes: Optional[str] = None,
 ) -> Question:
-    # Check if a similar question already exists to avoid duplicates
-    existing_question = session.exec(
-        select(Question)
-        .where(Question.text == text)
-        .where(Question.category_id == category_id)
-        .where(Question.language_id == language_id)
-    ).first()
-    if existing_question:
+    # Upsert on the (language_id, category_id, text_hash) unique index
+    text_hash = question_text_hash(text)
+    result = session.exec(
+        _upsert_insert(session, Question)
+        .values(
+            text=text,
+            text_hash=text_hash,
+            category_id=category_id,
+            language_id=language_id,
+            is_diagnostic=is_diagnostic,
+            author_notes=author_notes,
+        )
+        .on_conflict_do_nothing(index_elements=QUESTION_DEDUPE_KEY)
+    )
+    if result.rowcount:
+        commit_or_flush(session)
+        logger.info(
+            f"Created question: {text[:50]}... for lang_id={language_id}, cat_id={category_id}"
+        )
+    else:
         logger.warning(
             f"Question with text '{text}' for lang_id={language_id}, cat_id={category_id} already exists."
         )
-        return existing_question
-
-    question = Question(
-        text=text,
-        category_id=category_id,
-        language_id=language_id,
-        is_diagnostic=is_diagnostic,
-        author_notes=author_notes,
-    )
-    session.add(question)
-    session.commit()
-    session.refresh(question)
-    logger.info(
-        f"Created question: {text[:50]}... for lang_id={language_id}, cat_id={category_id}"
-    )
-    return question
+    return session.exec(
+        select(Question)
+        .where(Question.language_id == language_id)
+        .where(Question.category_id == category_id)
+        .where(Question.text_hash == text_hash)
+    ).one()
 
 
 def get_diagnostic_questions(
@@ -211,7 +225,7 @@ def get_diagnostic_questions(
     )
     if category_id:
         statement = statement.where(Question.category_id == category_id)
-    return session.exec(statement).all()
+    return session.exec(statement.order_by(Question.id)).all()
 
 
 def get_question_by_id(session: Session, question_id: int) -> Optional[Question]:
@@ -247,8 +261,7 @@ def mark_diagnostics_completed(session: Session, user_progress_id: int):
     if progress:
         progress.diagnostics_completed = True
         session.add(progress)
-        session.commit()
-        session.refresh(progress)
+        commit_or_flush(session, progress)
     return progress
 
 
@@ -276,8 +289,7 @@ def create_new_user_progress(session, user_id, language_id):
         diagnostics_completed=False,
     )
     session.add(user_progress)
-    session.commit()
-    session.refresh(user_progress)
+    commit_or_flush(session, user_progress)
     logger.info(f"Created UserProgress for user {user_id}, language {language_id}")
 
     return user_progress
@@ -309,7 +321,7 @@ def add_question_to_learning_plan(
     ).all()
     for old_item in old_items:
         session.delete(old_item)
-    session.commit()
+    session.flush()
 
     item = UserLearningPlanItem(
         user_progress_id=user_progress_id,
@@ -318,14 +330,135 @@ def add_question_to_learning_plan(
         status=status,
     )
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    commit_or_flush(session, item)
     logger.info(
         f"Added question {question_id} to plan for progress {user_progress_id} at index {order_index}"
     )
     return item
 
 
+def bulk_create_plan(
+    session: Session,
+    user_progress_id: int,
+    language_id: int,
+    questions: Sequence[Tuple[str, str]],
+    start_order_index: int,
+    status: str = "pending",
+) -> Optional[int]:
+    """Store a generated plan in a handful of statements.
+
+    ``questions`` are ``(category_name, question_text)`` pairs in plan order.
+    Categories and questions are upserted in one statement each and resolved
+    in one query each, plan items are inserted in one executemany. Returns the
+    id of the first new plan item, or None when there was nothing to add.
+    """
+    question_ids = upsert_plan_questions(session, language_id, questions)
+    if not question_ids:
+        return None
+    return add_plan_items(
+        session, user_progress_id, question_ids, start_order_index, status
+    )
+
+
+def upsert_plan_questions(
+    session: Session, language_id: int, questions: Sequence[Tuple[str, str]]
+) -> List[int]:
+    """Question ids for ``(category_name, question_text)`` pairs, in plan order.
+
+    Missing categories and questions are inserted; existing rows are reused.
+    Does not commit: the caller stores the plan in the same transaction.
+    """
+    questions = list(dict.fromkeys(q for q in questions if all(q)))
+    if not questions:
+        return []
+
+    names = {name for name, _ in questions}
+    session.exec(
+        _upsert_insert(session, Category)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    category_ids = dict(
+        session.exec(
+            select(Category.name, Category.id).where(Category.name.in_(names))
+        ).all()
+    )
+
+    # Plan order of (category_id, text_hash) keys; the first spelling of a text wins
+    texts = {}
+    for name, text in questions:
+        texts.setdefault((category_ids[name], question_text_hash(text)), text)
+    keys = list(texts)
+    session.exec(
+        _upsert_insert(session, Question).on_conflict_do_nothing(
+            index_elements=QUESTION_DEDUPE_KEY
+        ),
+        params=[
+            {
+                "text": text,
+                "text_hash": text_hash,
+                "category_id": category_id,
+                "language_id": language_id,
+                "is_diagnostic": False,
+            }
+            for (category_id, text_hash), text in texts.items()
+        ],
+    )
+    question_ids = {
+        (category_id, text_hash): question_id
+        for category_id, text_hash, question_id in session.exec(
+            select(Question.category_id, Question.text_hash, Question.id)
+            .where(Question.language_id == language_id)
+            .where(Question.category_id.in_(set(category_ids.values())))
+            .where(Question.text_hash.in_({text_hash for _, text_hash in keys}))
+        ).all()
+    }
+
+    return [question_ids[key] for key in keys]
+
+
+def add_plan_items(
+    session: Session,
+    user_progress_id: int,
+    plan_question_ids: Sequence[int],
+    start_order_index: int,
+    status: str = "pending",
+) -> Optional[int]:
+    """Append questions to a plan in order; returns the first new item's id."""
+    if not plan_question_ids:
+        return None
+    # Same contract as add_question_to_learning_plan: a question appears once per plan
+    session.exec(
+        delete(UserLearningPlanItem)
+        .where(UserLearningPlanItem.user_progress_id == user_progress_id)
+        .where(UserLearningPlanItem.question_id.in_(plan_question_ids))
+    )
+    assigned_at = datetime.datetime.utcnow()
+    session.exec(
+        insert(UserLearningPlanItem),
+        params=[
+            {
+                "user_progress_id": user_progress_id,
+                "question_id": question_id,
+                "order_index": start_order_index + offset,
+                "status": status,
+                "assigned_at": assigned_at,
+            }
+            for offset, question_id in enumerate(plan_question_ids)
+        ],
+    )
+    first_item_id = session.exec(
+        select(UserLearningPlanItem.id)
+        .where(UserLearningPlanItem.user_progress_id == user_progress_id)
+        .where(UserLearningPlanItem.order_index == start_order_index)
+    ).first()
+    commit_or_flush(session)
+    logger.info(
+        f"Added {len(plan_question_ids)} questions to plan for progress {user_progress_id}"
+    )
+    return first_item_id
+
+
 def get_learning_item_by_id(
     session: Session, item_id: int
 ) -> Optional[UserLearningPlanItem]:
@@ -338,7 +471,8 @@ def get_current_learning_item(
     return session.exec(
         select(UserLearningPlanItem)
         .where(UserLearningPlanItem.user_progress_id == user_progress_id)
-        .where(UserLearningPlanItem.status == "current")
+        # Inline literal: a bound parameter cannot match the partial index
+        .where(UserLearningPlanItem.status == literal("current", literal_execute=True))
     ).first()
 
 
@@ -365,8 +499,7 @@ def update_learning_item_status(
     if item:
         item.status = status
         session.add(item)
-        session.commit()
-        session.refresh(item)
+        commit_or_flush(session, item)
         logger.info(f"Updated status of learning item {item_id} to {status}")
     return item
 
@@ -384,14 +517,13 @@ def set_current_learning_item(
         if item.id != new_current_item_id:
             item.status = "answered"
             session.add(item)
-    session.commit()
+    session.flush()
 
     new_item = session.get(UserLearningPlanItem, new_current_item_id)
     if new_item:
         new_item.status = "current"
         session.add(new_item)
-        session.commit()
-        session.refresh(new_item)
+        commit_or_flush(session, new_item)
         logger.info(
             f"Set learning item {new_current_item_id} to 'current' for progress {user_progress_id}"
         )
@@ -406,12 +538,23 @@ def save_diagnostic_scores(
     if progress:
         progress.diagnostic_scores_json = json.dumps(scores, ensure_ascii=False)
         session.add(progress)
-        session.commit()
-        session.refresh(progress)
+        commit_or_flush(session, progress)
         logger.info(f"Saved diagnostic scores for progress {user_progress_id}")
     return progress
 
 
+def get_diagnostic_score_vectors(
+    session: Session, since: Optional[datetime.datetime] = None
+) -> List[Tuple[int, str]]:
+    """``(language_id, diagnostic_scores_json)`` of progress with saved scores."""
+    statement = select(
+        UserProgress.language_id, UserProgress.diagnostic_scores_json
+    ).where(UserProgress.diagnostic_scores_json.is_not(None))
+    if since is not None:
+        statement = statement.where(UserProgress.updated_at >= since)
+    return session.exec(statement).all()
+
+
 # --- UserDiagnosticAnswer Services ---
 def save_diagnostic_answer(
     session: Session, user_progress_id: int, question_id: int, score: int
@@ -427,15 +570,13 @@ def save_diagnostic_answer(
         answer.score = score
         answer.answered_at = datetime.datetime.utcnow()
         session.add(answer)
-        session.commit()
-        session.refresh(answer)
+        commit_or_flush(session, answer)
     else:
         answer = UserDiagnosticAnswer(
             user_progress_id=user_progress_id, question_id=question_id, score=score
         )
         session.add(answer)
-        session.commit()
-        session.refresh(answer)
+        commit_or_flush(session, answer)
     return answer
 
 
@@ -470,14 +611,204 @@ def save_user_answer(
         is_correct_by_llm=is_correct_by_llm,
     )
     session.add(answer)
-    session.commit()
-    session.refresh(answer)
+    commit_or_flush(session, answer)
     logger.info(
         f"Saved answer for user {user_id}, question {question_id}, item {learning_plan_item_id}"
     )
     return answer
 
 
+# --- AnswerEvaluation Services ---
+def get_answer_evaluation(
+    session: Session,
+    question_id: int,
+    answer_fingerprint: str,
+    created_after: datetime.datetime,
+) -> Optional[AnswerEvaluation]:
+    """A stored evaluation newer than ``created_after``; marks it as used."""
+    evaluation = session.exec(
+        select(AnswerEvaluation).where(
+            AnswerEvaluation.question_id == question_id,
+            AnswerEvaluation.answer_fingerprint == answer_fingerprint,
+            AnswerEvaluation.created_at > created_after,
+        )
+    ).first()
+    if evaluation:
+        evaluation.hits += 1
+        evaluation.last_used_at = datetime.datetime.utcnow()
+        session.add(evaluation)
+        commit_or_flush(session, evaluation)
+    return evaluation
+
+
+def save_answer_evaluation(
+    session: Session,
+    question_id: int,
+    answer_fingerprint: str,
+    explanation: str,
+    llm_seconds: float = 0.0,
+):
+    """Insert or refresh the evaluation of ``answer_fingerprint`` in one statement."""
+    now = datetime.datetime.utcnow()
+    statement = _upsert_insert(session, AnswerEvaluation).values(
+        question_id=question_id,
+        answer_fingerprint=answer_fingerprint,
+        explanation=explanation,
+        llm_seconds=llm_seconds,
+        hits=0,
+        created_at=now,
+        last_used_at=now,
+    )
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=["question_id", "answer_fingerprint"],
+            set_={
+                "explanation": statement.excluded.explanation,
+                "llm_seconds": statement.excluded.llm_seconds,
+                "created_at": statement.excluded.created_at,
+                "last_used_at": statement.excluded.last_used_at,
+            },
+        )
+    )
+    commit_or_flush(session)
+
+
+def touch_answer_evaluations(
+    session: Session, hits: Dict[Tuple[int, str], int], used_at: datetime.datetime
+):
+    """Record reuses served from memory: ``(question_id, fingerprint) -> hits``."""
+    if not hits:
+        return
+    table = AnswerEvaluation.__table__
+    session.execute(
+        update(table)
+        .where(
+            table.c.question_id == bindparam("key_question_id"),
+            table.c.answer_fingerprint == bindparam("key_fingerprint"),
+        )
+        .values(hits=table.c.hits + bindparam("new_hits"), last_used_at=used_at),
+        [
+            {
+                "key_question_id": question_id,
+                "key_fingerprint": fingerprint,
+                "new_hits": count,
+            }
+            for (question_id, fingerprint), count in hits.items()
+        ],
+    )
+    commit_or_flush(session)
+
+
+def evict_answer_evaluations(
+    session: Session, created_before: datetime.datetime, max_rows: int
+) -> int:
+    """Drop expired evaluations, then the least recently used beyond ``max_rows``."""
+    removed = session.exec(
+        delete(AnswerEvaluation).where(AnswerEvaluation.created_at <= created_before)
+    ).rowcount
+    excess = (
+        session.exec(select(func.count()).select_from(AnswerEvaluation)).one()
+        - max_rows
+    )
+    if excess > 0:
+        oldest = (
+            select(AnswerEvaluation.id)
+            .order_by(AnswerEvaluation.last_used_at)
+            .limit(excess)
+        )
+        removed += session.exec(
+            delete(AnswerEvaluation).where(AnswerEvaluation.id.in_(oldest))
+        ).rowcount
+    commit_or_flush(session)
+    return removed
+
+
+# --- PlanTemplate Services ---
+def get_plan_template(
+    session: Session, language_id: int, score_key: str
+) -> Optional[PlanTemplate]:
+    return session.exec(
+        select(PlanTemplate).where(
+            PlanTemplate.language_id == language_id,
+            PlanTemplate.score_key == score_key,
+        )
+    ).first()
+
+
+def mark_plan_template_used(session: Session, template: PlanTemplate):
+    template.uses += 1
+    template.last_used_at = datetime.datetime.utcnow()
+    session.add(template)
+    commit_or_flush(session, template)
+
+
+def save_plan_template(
+    session: Session, language_id: int, score_key: str, question_ids: Sequence[int]
+):
+    """Insert the template, or replace a stale one's questions and counters."""
+    now = datetime.datetime.utcnow()
+    statement = _upsert_insert(session, PlanTemplate).values(
+        language_id=language_id,
+        score_key=score_key,
+        question_ids_json=json.dumps(list(question_ids)),
+        uses=0,
+        created_at=now,
+        last_used_at=now,
+    )
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=["language_id", "score_key"],
+            set_={
+                "question_ids_json": statement.excluded.question_ids_json,
+                "uses": 0,
+                "created_at": statement.excluded.created_at,
+                "last_used_at": statement.excluded.last_used_at,
+            },
+        )
+    )
+    commit_or_flush(session)
+
+
+# --- PlanGenerationJob Services ---
+def create_plan_job(
+    session: Session, user_progress_id: int, telegram_id: int, chat_id: int
+) -> PlanGenerationJob:
+    job = PlanGenerationJob(
+        user_progress_id=user_progress_id, telegram_id=telegram_id, chat_id=chat_id
+    )
+    session.add(job)
+    commit_or_flush(session, job)
+    logger.info(f"Queued plan generation job {job.id} for progress {user_progress_id}")
+    return job
+
+
+def get_plan_job(session: Session, job_id: int) -> Optional[PlanGenerationJob]:
+    return session.get(PlanGenerationJob, job_id)
+
+
+def get_unfinished_plan_jobs(session: Session) -> List[PlanGenerationJob]:
+    """Jobs that were queued or interrupted mid-run (e.g. by a restart)."""
+    return session.exec(
+        select(PlanGenerationJob)
+        .where(PlanGenerationJob.status.in_(["pending", "running"]))
+        .order_by(PlanGenerationJob.id)
+    ).all()
+
+
+def update_plan_job_status(
+    session: Session, job_id: int, status: str, error: Optional[str] = None
+) -> Optional[PlanGenerationJob]:
+    job = session.get(PlanGenerationJob, job_id)
+    if job:
+        job.status = status
+        job.error = error
+        if status in ("done", "failed"):
+            job.finished_at = datetime.datetime.utcnow()
+        session.add(job)
+        commit_or_flush(session, job)
+    return job
+
+
 # --- Data Population (Optional, for initial setup) ---
 INITIAL_DATA = {
     "languages": [
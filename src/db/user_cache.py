@@ -0,0 +1,102 @@
+"""Per-process cache of user id, state and active language by telegram_id.
+
+A single update looks its user up several times (view, state machine,
+flows). Snapshots are cached when a user row is read. They are written
+through when a commit changed the row and dropped on rollback, so a cache
+entry never holds uncommitted data. The TTL bounds staleness between
+processes, so the conversation state is read from the row itself (see
+``state_machine.get_user_state``); the cached id only saves the lookup query.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as _Session
+from sqlalchemy.orm import object_session
+from sqlmodel import Session, select
+
+from src.cache import TTLCache
+from src.db.models import User
+from src.settings.config import CONFIG
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    telegram_id: int
+    state: str
+    active_language_id: Optional[int]
+
+
+user_cache = TTLCache(
+    maxsize=CONFIG.cache.user_max_size, ttl=CONFIG.cache.user_ttl_seconds
+)
+
+# session.info key: snapshots of users written in the open transaction
+_PENDING = "user_cache_pending"
+
+
+def snapshot(user: User) -> CachedUser:
+    return CachedUser(
+        id=user.id,
+        telegram_id=user.telegram_id,
+        state=user.state,
+        active_language_id=user.active_language_id,
+    )
+
+
+def remember(user: User) -> CachedUser:
+    cached = snapshot(user)
+    user_cache.set(user.telegram_id, cached)
+    return cached
+
+
+def lookup(telegram_id: int, session: Session | None = None) -> Optional[CachedUser]:
+    """Cached snapshot; ``session``'s own uncommitted writes take precedence."""
+    if session is not None:
+        pending = session.info.get(_PENDING, {}).get(telegram_id)
+        if pending is not None:
+            return pending
+    return user_cache.get(telegram_id)
+
+
+def invalidate(telegram_id: int):
+    """Drop a user whose row was changed outside the ORM."""
+    user_cache.pop(telegram_id)
+
+
+def load_user(session: Session, telegram_id: int) -> Optional[User]:
+    """User row by telegram_id, avoiding the lookup query when cached.
+
+    With a cached id the row is fetched by primary key, which the session
+    answers from its identity map once the update has loaded the user.
+    """
+    cached = lookup(telegram_id)
+    user = session.get(User, cached.id) if cached else None
+    if user is None or user.telegram_id != telegram_id:
+        user = session.exec(select(User).where(User.telegram_id == telegram_id)).first()
+        if user:
+            remember(user)
+    return user
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+def _track_user_write(_mapper, _connection, target: User):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING, {})[target.telegram_id] = snapshot(target)
+
+
+@event.listens_for(_Session, "after_commit")
+def _write_through(session):
+    for telegram_id, cached in session.info.pop(_PENDING, {}).items():
+        user_cache.set(telegram_id, cached)
+
+
+@event.listens_for(_Session, "after_rollback")
+def _discard_uncommitted(session):
+    # Reads in this transaction may have cached the uncommitted rows too
+    for telegram_id in session.info.pop(_PENDING, {}):
+        user_cache.pop(telegram_id)
@@ -0,0 +1,96 @@
+"""Single-writer queue for SQLite.
+
+SQLite allows one writer at a time; concurrent handlers committing on their
+own sessions end up in "database is locked" retries. Hot-path writes are
+instead submitted to one writer task that executes them sequentially on a
+dedicated thread, while readers (WAL mode) keep reading without blocking.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from sqlmodel import Session
+
+from src.db import db
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """Executes ``fn(session, *args, **kwargs)`` write jobs one at a time."""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer"
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run(), name="db-writer")
+        logger.info("SQLite write queue started")
+
+    async def stop(self):
+        """Finish queued writes, then stop the writer task."""
+        await self._queue.join()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, fn: Callable, *args, **kwargs):
+        """Queue a write and wait for its committed result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, kwargs, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            fn, args, kwargs, future = await self._queue.get()
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, self._execute, fn, args, kwargs
+                )
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                logger.exception(f"Queued write {getattr(fn, '__name__', fn)} failed")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, fn, args, kwargs):
+        # Own session: returned objects stay readable after it is closed
+        with Session(self.engine or db.engine, expire_on_commit=False) as session:
+            result = fn(session, *args, **kwargs)
+            session.commit()
+            return result
+
+
+async def write(bot_data: dict, fn: Callable, session: Session, *args, **kwargs):
+    """Run a write service through the configured WriteQueue, or ``run_blocking``.
+
+    Inside a unit of work the update's pending writes are committed first,
+    so the writer's connection does not wait on a lock this task holds, and
+    the session is expired afterwards to reload what the writer changed.
+    """
+    queue = bot_data.get("db_writer")
+    if queue is None:
+        return await db.run_blocking(fn, session, *args, **kwargs)
+    in_unit_of_work = session.info.get("unit_of_work")
+    if in_unit_of_work:
+        db.commit_before_io()
+    result = await queue.submit(fn, *args, **kwargs)
+    if in_unit_of_work:
+        session.expire_all()
+    return result
@@ -0,0 +1,161 @@
+"""Async gateway for chat model calls.
+
+All flows talk to the LLM through this module, so a slow completion never
+blocks the python-telegram-bot event loop for other users. ``astream``
+yields a completion as it is generated, for progressive replies. With
+``configure_limiter`` every call first waits for an ``LLMLimiter`` slot.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from src import metrics
+from src.db import db
+from src.llm.limiter import Lease, LLMLimiter, estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 32
+
+_executor: Optional[ThreadPoolExecutor] = None
+_limiter: Optional[LLMLimiter] = None
+_completion_tokens = 0
+
+
+def configure(max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+    """(Re)create the thread pool used for models without native async support."""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+    logger.info(f"LLM executor configured with {max_workers} workers")
+
+
+def configure_limiter(
+    limiter: Optional[LLMLimiter], expected_completion_tokens: int = 0
+) -> None:
+    """Route every later call through ``limiter`` (None turns limiting off)."""
+    global _limiter, _completion_tokens
+
+    _limiter = limiter
+    _completion_tokens = expected_completion_tokens
+
+
+def get_limiter() -> Optional[LLMLimiter]:
+    return _limiter
+
+
+@asynccontextmanager
+async def _slot(messages: list):
+    if _limiter is None:
+        yield Lease(0)
+        return
+    async with _limiter.slot(estimate_tokens(messages, _completion_tokens)) as lease:
+        yield lease
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    if _executor is None:
+        configure()
+    return _executor
+
+
+async def ainvoke(llm: Any, messages: list) -> Any:
+    """Call the chat model without blocking the event loop.
+
+    Uses the model's native ``ainvoke`` when it exists (LangChain chat models),
+    otherwise runs the synchronous ``invoke`` in the dedicated thread pool.
+    Call time (excluding the limiter wait), errors and token usage go to
+    ``src.metrics``.
+    """
+    db.commit_before_io()
+    async with _slot(messages) as lease:
+        started = time.perf_counter()
+        try:
+            native = getattr(llm, "ainvoke", None)
+            if native is not None:
+                response = await native(messages)
+            else:
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(
+                    _get_executor(), llm.invoke, messages
+                )
+        except Exception:
+            metrics.record_llm_call(time.perf_counter() - started, error=True)
+            raise
+        lease.tokens = token_count(response) or None
+    metrics.record_llm_call(time.perf_counter() - started, lease.tokens or 0)
+    return response
+
+
+async def astream(llm: Any, messages: list) -> AsyncIterator[str]:
+    """Yield the completion's text in chunks as the model produces them.
+
+    Models without ``astream`` yield their whole ``ainvoke`` answer at once.
+    The model is read by a separate task, so the limiter slot and the
+    recorded call time cover only the model and not whatever the caller
+    awaits between chunks. Records the call like ``ainvoke`` plus the time
+    to the first chunk.
+    """
+    native = getattr(llm, "astream", None)
+    if native is None:
+        response = await ainvoke(llm, messages)
+        yield response.content
+        return
+
+    db.commit_before_io()
+    chunks: asyncio.Queue = asyncio.Queue()
+    reader = asyncio.create_task(_read_stream(native, messages, chunks))
+    try:
+        while (text := await chunks.get()) is not None:
+            yield text
+        await reader  # re-raises the model's error
+    finally:
+        reader.cancel()
+
+
+async def _read_stream(native: Any, messages: list, chunks: asyncio.Queue):
+    """Put the streamed texts on ``chunks``, then None once the model is done."""
+    async with _slot(messages) as lease:
+        started = time.perf_counter()
+        tokens = 0
+        error = False
+        first_chunk = True
+        try:
+            async for chunk in native(messages):
+                tokens += token_count(chunk)
+                text = getattr(chunk, "content", chunk)
+                if not isinstance(text, str) or not text:
+                    continue
+                if first_chunk:
+                    metrics.LLM_FIRST_CHUNK_SECONDS.observe(
+                        time.perf_counter() - started
+                    )
+                    first_chunk = False
+                chunks.put_nowait(text)
+        except Exception:
+            error = True
+            raise
+        finally:
+            chunks.put_nowait(None)
+            # Without usage in the chunks the reserved estimate stands
+            lease.tokens = tokens or None
+            metrics.record_llm_call(
+                time.perf_counter() - started, tokens or lease.estimate, error=error
+            )
+
+
+def token_count(response: Any) -> int:
+    """Total tokens reported by a LangChain message (0 when unknown)."""
+    usage = getattr(response, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("total_tokens"):
+        return usage["total_tokens"]
+    metadata = getattr(response, "response_metadata", None)
+    token_usage = metadata.get("token_usage") if isinstance(metadata, dict) else None
+    return token_usage.get("total_tokens", 0) if isinstance(token_usage, dict) else 0
@@ -0,0 +1,210 @@
+"""Process-wide admission control for chat model calls.
+
+Every LLM call takes a slot from the ``LLMLimiter`` the gateway is
+configured with. A slot is granted when fewer than ``max_in_flight`` calls
+are running and the requests- and tokens-per-minute buckets can pay for it.
+Waiting calls are served by priority (interactive before background), and
+round-robin between users within a priority, so one user with many queued
+calls cannot starve the others.
+
+Callers say who is asking with ``requester()``; calls outside of it are
+interactive and anonymous.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from src import metrics
+
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Rough prompt size: OpenAI tokenizers average about four characters a token
+CHARS_PER_TOKEN = 4
+
+_requester: ContextVar[Tuple[int, Optional[Hashable]]] = ContextVar(
+    "llm_requester", default=(INTERACTIVE, None)
+)
+
+
+@contextmanager
+def requester(user: Optional[Hashable] = None, priority: int = INTERACTIVE):
+    """Attribute the LLM calls made inside the block to ``user`` at ``priority``."""
+    token = _requester.set((priority, user))
+    try:
+        yield
+    finally:
+        _requester.reset(token)
+
+
+def estimate_tokens(messages: list, completion_tokens: int = 0) -> int:
+    """Prompt tokens guessed from the message text, plus the expected completion."""
+    chars = sum(len(str(getattr(message, "content", message))) for message in messages)
+    return chars // CHARS_PER_TOKEN + completion_tokens
+
+
+class TokenBucket:
+    """``per_minute`` units a minute, refilled continuously, bursting to one minute."""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken; above capacity, a full bucket."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Spend ``amount``; negative amounts refund. The level may go below zero."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass
+class Lease:
+    """A granted slot; set ``tokens`` to the actual usage to settle the estimate."""
+
+    estimate: int
+    tokens: Optional[int] = None
+
+
+@dataclass
+class _Waiter:
+    estimate: int
+    future: asyncio.Future
+
+
+class LLMLimiter:
+    """In-flight cap plus optional requests/tokens per minute budgets."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._requests = (
+            TokenBucket(requests_per_minute, clock) if requests_per_minute else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, clock) if tokens_per_minute else None
+        )
+        # priority -> user -> waiters; a user's deque moves to the end once served
+        self._queues: Dict[int, "OrderedDict[Hashable, Deque[_Waiter]]"] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+        self._retry: Optional[asyncio.TimerHandle] = None
+
+    def qsize(self) -> int:
+        return sum(
+            len(waiters)
+            for users in self._queues.values()
+            for waiters in users.values()
+        )
+
+    @asynccontextmanager
+    async def slot(self, estimate: int = 0):
+        """Wait for a slot for a call expected to use ``estimate`` tokens."""
+        priority, user = _requester.get()
+        started = time.perf_counter()
+        await self._acquire(priority, user, estimate)
+        metrics.LLM_QUEUE_SECONDS.observe(
+            time.perf_counter() - started, priority=PRIORITY_NAMES[priority]
+        )
+        lease = Lease(estimate)
+        try:
+            yield lease
+        finally:
+            self._release(lease)
+
+    async def _acquire(self, priority: int, user: Optional[Hashable], estimate: int):
+        waiter = _Waiter(estimate, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(user, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(Lease(estimate))  # granted just as the caller gave up
+            else:
+                self._discard(priority, user, waiter)
+            raise
+
+    def _discard(self, priority: int, user: Optional[Hashable], waiter: _Waiter):
+        waiters = self._queues[priority].get(user)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[priority][user]
+        self._dispatch()
+
+    def _release(self, lease: Lease):
+        self.in_flight -= 1
+        if self._tokens is not None and lease.tokens is not None:
+            self._tokens.take(lease.tokens - lease.estimate)
+        self._dispatch()
+
+    def _next(self) -> Optional[Tuple[int, Hashable, _Waiter]]:
+        for priority, users in self._queues.items():
+            for user, waiters in users.items():
+                return priority, user, waiters[0]
+        return None
+
+    def _delay(self, estimate: int) -> float:
+        delays = [0.0]
+        if self._requests is not None:
+            delays.append(self._requests.delay(1))
+        if self._tokens is not None:
+            delays.append(self._tokens.delay(estimate))
+        return max(delays)
+
+    def _dispatch(self):
+        """Grant slots to the head waiters while capacity and budgets allow."""
+        while self.in_flight < self.max_in_flight:
+            head = self._next()
+            if head is None:
+                return
+            priority, user, waiter = head
+            delay = self._delay(waiter.estimate)
+            if delay > 0:
+                self._schedule_retry(delay)
+                return
+            users = self._queues[priority]
+            users[user].popleft()
+            if users[user]:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            if waiter.future.done():
+                continue  # cancelled; _discard finds nothing left to remove
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(waiter.estimate)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _schedule_retry(self, delay: float):
+        if self._retry is not None and not self._retry.cancelled():
+            self._retry.cancel()
+        self._retry = asyncio.get_running_loop().call_later(delay, self._dispatch)
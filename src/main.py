@@ -14,9 +14,18 @@ from langchain.chat_models import ChatOpenAI
 from telegram.ext import Application
 
 from src.bot import urls as bot_urls
-from src.db import services
+from src.bot.jobs import PlanJobQueue
+from src.bot.persistence import build_persistence
+from src.bot.request import InstrumentedRequest
+from src.bot.server import run_webhook, start_metrics_server, watch_runtime
+from src.db import db, services
 from src.db.db import init_db
+from src.db.writer import WriteQueue
+from src.llm import gateway as llm_gateway
+from src.llm.limiter import LLMLimiter
 from src.settings import settings
+from src.settings.config import CONFIG
+from telegram_rest_mvc.processor import PerUserUpdateProcessor
 from telegram_rest_mvc.registrar import register_routes
 
 
@@ -48,6 +57,45 @@ else:
         logger.exception("Failed to initialize ChatOpenAI. LLM features will not work.")
         llm = None
 
+
+async def _post_init(application: Application):
+    if db.engine.dialect.name == "sqlite" and settings.SQLITE_WRITE_QUEUE:
+        db_writer = WriteQueue()
+        await db_writer.start()
+        application.bot_data["db_writer"] = db_writer
+
+    plan_jobs = PlanJobQueue(
+        application.bot, application.bot_data, workers=settings.PLAN_JOB_WORKERS
+    )
+    await plan_jobs.start()
+    application.bot_data["plan_jobs"] = plan_jobs
+
+    if settings.METRICS_ENABLED:
+        watch_runtime(application)
+        application.bot_data["metrics_server"] = await start_metrics_server(
+            CONFIG.metrics.listen, CONFIG.metrics.port
+        )
+
+
+async def _post_stop(application: Application):
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server:
+        await metrics_server.cleanup()
+    plan_jobs = application.bot_data.get("plan_jobs")
+    if plan_jobs:
+        await plan_jobs.stop()
+    db_writer = application.bot_data.get("db_writer")
+    if db_writer:
+        await db_writer.stop()
+
+
+# TELEGRAM__MODE -> how updates reach the application
+RUNNERS = {
+    "polling": lambda app: app.run_polling(),
+    "webhook": lambda app: asyncio.run(run_webhook(app, CONFIG.telegram)),
+}
+
+
 # --- Main Application Setup ---
 if __name__ == "__main__":
     logger.info("Starting bot...")
@@ -76,7 +124,35 @@ if __name__ == "__main__":
     if sys.platform.startswith("win"):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    app = Application.builder().token(settings.TELEGRAM_TOKEN).build()
+    llm_gateway.configure(settings.LLM_EXECUTOR_WORKERS)
+    llm_gateway.configure_limiter(
+        LLMLimiter(
+            CONFIG.llm.max_in_flight,
+            CONFIG.llm.requests_per_minute,
+            CONFIG.llm.tokens_per_minute,
+        ),
+        CONFIG.llm.expected_completion_tokens,
+    )
+
+    builder = (
+        Application.builder()
+        .token(settings.TELEGRAM_TOKEN)
+        .request(
+            InstrumentedRequest(connection_pool_size=settings.CONNECTION_POOL_SIZE)
+        )
+        .post_init(_post_init)
+        .post_stop(_post_stop)
+        .concurrent_updates(
+            PerUserUpdateProcessor(
+                settings.CONCURRENT_UPDATES, settings.MAX_USER_BACKLOG
+            )
+        )
+    )
+    persistence = build_persistence(CONFIG.persistence)
+    if persistence:
+        builder = builder.persistence(persistence)
+        logger.info(f"user_data persistence: {settings.PERSISTENCE_BACKEND}")
+    app = builder.build()
     app.bot_data["chat_model"] = llm
     logger.info(f"[Startup] llm in bot_data: {app.bot_data.get('chat_model')!r}")
     if llm is None:
@@ -84,5 +160,5 @@ if __name__ == "__main__":
             "[Startup] llm is None at runtime! LLM-dependent features will not work."
         )
     register_routes(app, bot_urls.router)
-    logger.info("Bot is running...")
-    app.run_polling()
+    logger.info(f"Bot is running ({settings.TELEGRAM_MODE})...")
+    RUNNERS[settings.TELEGRAM_MODE](app)
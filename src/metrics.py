@@ -0,0 +1,324 @@
+"""Process metrics with Prometheus text export, plus per-update accounting.
+
+Counters, gauges and histograms live in ``REGISTRY`` and are rendered by
+``render()``. ``track_update()`` opens an ``UpdateStats`` for the current
+task; the DB engine events, the LLM gateway and the Bot API request add to
+it through the ``record_*`` helpers, so each update knows where its time went.
+"""
+
+import bisect
+import json
+import logging
+import math
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+
+update_logger = logging.getLogger("recalldev.updates")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Current value; ``set_function`` samples a callback at render time."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, Union[float, Callable[[], float]]] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels):
+        with self._lock:
+            self._values[self._key(labels)] = function
+
+    def value(self, **labels) -> float:
+        value = self._values.get(self._key(labels), 0)
+        return value() if callable(value) else value
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: item[0])
+        for key, value in items:
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value() if callable(value) else value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield from super().render()
+        with self._lock:
+            items = sorted(
+                (key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()
+            )
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def render(self) -> str:
+        lines = [line for metric in self._metrics.values() for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+render = REGISTRY.render
+
+UPDATES = REGISTRY.counter(
+    "recalldev_updates_total",
+    "Routed updates by route and outcome",
+    ["route", "outcome"],
+)
+UPDATE_SECONDS = REGISTRY.histogram(
+    "recalldev_update_duration_seconds", "Wall time per routed update", ["route"]
+)
+UPDATE_DB_QUERIES = REGISTRY.histogram(
+    "recalldev_update_db_queries",
+    "DB queries per routed update",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "recalldev_db_query_duration_seconds", "Time per DB statement"
+)
+LLM_CALLS = REGISTRY.counter("recalldev_llm_calls_total", "LLM calls", ["outcome"])
+LLM_SECONDS = REGISTRY.histogram(
+    "recalldev_llm_call_duration_seconds", "Time per LLM call"
+)
+LLM_TOKENS = REGISTRY.counter("recalldev_llm_tokens_total", "Tokens used by LLM calls")
+LLM_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "recalldev_llm_first_chunk_seconds", "Time to the first streamed LLM chunk"
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "recalldev_llm_queue_seconds",
+    "Wait for an LLM limiter slot by priority",
+    ["priority"],
+)
+LLM_IN_FLIGHT = REGISTRY.gauge("recalldev_llm_in_flight", "LLM calls holding a slot")
+TELEGRAM_SECONDS = REGISTRY.histogram(
+    "recalldev_telegram_request_duration_seconds",
+    "Time per Bot API request",
+    ["method"],
+)
+DB_POOL_CHECKOUT_SECONDS = REGISTRY.histogram(
+    "recalldev_db_pool_checkout_seconds", "Wait for a pooled DB connection"
+)
+DB_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "recalldev_db_pool_checked_out", "DB connections currently in use"
+)
+QUEUE_DEPTH = REGISTRY.gauge("recalldev_queue_depth", "Items waiting", ["queue"])
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "recalldev_cache_hit_ratio", "Hits / lookups since start", ["cache"]
+)
+CACHE_ENTRIES = REGISTRY.gauge("recalldev_cache_entries", "Cached entries", ["cache"])
+EVALUATION_CACHE_LOOKUPS = REGISTRY.counter(
+    "recalldev_evaluation_cache_lookups_total",
+    "Answer evaluation lookups by result: memory, db or miss",
+    ["result"],
+)
+EVALUATION_CACHE_SAVED_SECONDS = REGISTRY.counter(
+    "recalldev_evaluation_cache_saved_seconds_total",
+    "LLM time the reused answer evaluations originally took",
+)
+PLAN_TEMPLATE_LOOKUPS = REGISTRY.counter(
+    "recalldev_plan_template_lookups_total",
+    "Practice plan template lookups by result: hit, stale or miss",
+    ["result"],
+)
+
+
+@dataclass
+class UpdateStats:
+    route: str
+    seconds: float = 0.0
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    llm_tokens: int = 0
+    telegram_calls: int = 0
+    telegram_seconds: float = 0.0
+
+
+_current_stats: ContextVar[Optional[UpdateStats]] = ContextVar(
+    "current_update_stats", default=None
+)
+
+
+def current_stats() -> Optional[UpdateStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_update(route: str):
+    """Collect ``UpdateStats`` for the update handled in this task."""
+    stats = UpdateStats(route=route)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def record_update(stats: UpdateStats, outcome: str):
+    UPDATES.inc(route=stats.route, outcome=outcome)
+    UPDATE_SECONDS.observe(stats.seconds, route=stats.route)
+    UPDATE_DB_QUERIES.observe(stats.db_queries, route=stats.route)
+    update_logger.info(
+        json.dumps({"event": "update", "outcome": outcome, **asdict(stats)})
+    )
+
+
+def record_db_query(seconds: float):
+    DB_QUERY_SECONDS.observe(seconds)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += seconds
+
+
+def record_pool_checkout(seconds: float):
+    DB_POOL_CHECKOUT_SECONDS.observe(seconds)
+
+
+def record_llm_call(seconds: float, tokens: int = 0, error: bool = False):
+    LLM_CALLS.inc(outcome="error" if error else "ok")
+    LLM_SECONDS.observe(seconds)
+    LLM_TOKENS.inc(tokens)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.llm_calls += 1
+        stats.llm_seconds += seconds
+        stats.llm_tokens += tokens
+
+
+def record_evaluation_cache(result: str, saved_seconds: float = 0.0):
+    EVALUATION_CACHE_LOOKUPS.inc(result=result)
+    EVALUATION_CACHE_SAVED_SECONDS.inc(saved_seconds)
+
+
+def record_telegram_call(method: str, seconds: float):
+    TELEGRAM_SECONDS.observe(seconds, method=method)
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.telegram_calls += 1
+        stats.telegram_seconds += seconds
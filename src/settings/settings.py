@@ -3,9 +3,21 @@ from src.settings.config import CONFIG
 
 # Standard settings for the application
 DATABASE_URL = CONFIG.database.build_url()
+SQLITE_WRITE_QUEUE = CONFIG.database.sqlite_write_queue
 # All individual DB params are available via CONFIG.database.<field> (engine, name, user, password, host, port, url)
 TELEGRAM_TOKEN = CONFIG.telegram.token
+TELEGRAM_MODE = CONFIG.telegram.mode
+CONCURRENT_UPDATES = CONFIG.telegram.concurrent_updates
+MAX_USER_BACKLOG = CONFIG.telegram.max_user_backlog
+CONNECTION_POOL_SIZE = CONFIG.telegram.connection_pool_size
 OPENAI_API_KEY = CONFIG.llm.openai_api_key
+LLM_EXECUTOR_WORKERS = CONFIG.llm.executor_workers
+PLAN_JOB_WORKERS = CONFIG.llm.plan_job_workers
+LLM_STREAM_FEEDBACK = CONFIG.llm.stream_feedback
+USER_CACHE_TTL_SECONDS = CONFIG.cache.user_ttl_seconds
+USER_CACHE_MAX_SIZE = CONFIG.cache.user_max_size
+PERSISTENCE_BACKEND = CONFIG.persistence.backend
+METRICS_ENABLED = CONFIG.metrics.enabled
 DEBUG = CONFIG.debug
 
 # --- User custom settings below ---
@@ -4,6 +4,8 @@ This package provides:
     • Router / path() — URL-like routing for Telegram updates.
     • Base View classes with Django-style dispatch.
     • Helpers to convert routes into python-telegram-bot handlers.
+    • PerUserUpdateProcessor / UserDispatcher — concurrent updates, ordered per user.
+    • Router middleware — per-update plumbing (sessions, users, timing, errors).
 
 Usage example::
 
@@ -0,0 +1,144 @@
+"""Typed, compact callback_data: ``<tag>:<base64url(packed fields)>``.
+
+Fields are packed as varints (ints, zigzag-encoded), single bytes (bools)
+and length-prefixed UTF-8 (strs), so ``CallbackSchema("ds", question_id=int,
+score=int).encode(question_id=1234, score=5)`` is ``"ds:pBMK"``. The plain
+text tag keeps payloads routable by prefix. Encoding fails loudly rather
+than producing data over Telegram's 64-byte limit.
+
+Buttons already sent in an older ``<legacy_prefix><field>_<field>`` format
+keep working when the schema names that ``legacy_prefix``.
+"""
+
+import base64
+import binascii
+from typing import Any, Dict, Optional, Tuple
+
+
+MAX_CALLBACK_DATA_BYTES = 64  # Telegram Bot API limit
+
+
+class CallbackDataError(ValueError):
+    """callback_data does not fit the schema or the 64-byte limit."""
+
+
+def _write_uint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_uint(raw: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_int(out: bytearray, value: int):
+    _write_uint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _read_int(raw: bytes, pos: int) -> Tuple[int, int]:
+    value, pos = _read_uint(raw, pos)
+    return (-(value >> 1) - 1 if value & 1 else value >> 1), pos
+
+
+def _write_bool(out: bytearray, value: bool):
+    out.append(1 if value else 0)
+
+
+def _read_bool(raw: bytes, pos: int) -> Tuple[bool, int]:
+    return bool(raw[pos]), pos + 1
+
+
+def _write_str(out: bytearray, value: str):
+    encoded = value.encode()
+    _write_uint(out, len(encoded))
+    out += encoded
+
+
+def _read_str(raw: bytes, pos: int) -> Tuple[str, int]:
+    length, pos = _read_uint(raw, pos)
+    if pos + length > len(raw):
+        raise CallbackDataError("truncated string field")
+    return raw[pos : pos + length].decode(), pos + length
+
+
+# field type -> (writer, reader)
+FIELD_CODECS = {
+    int: (_write_int, _read_int),
+    bool: (_write_bool, _read_bool),
+    str: (_write_str, _read_str),
+}
+
+# field type -> parser of its text in the legacy "_"-separated format
+LEGACY_PARSERS = {int: int, bool: lambda text: text in ("1", "True", "true"), str: str}
+
+
+class CallbackSchema:
+    """A callback route's tag plus its ordered, typed fields."""
+
+    def __init__(
+        self, tag: str, *, legacy_prefix: Optional[str] = None, **fields: type
+    ):
+        if ":" in tag:
+            raise ValueError(f"Callback tag must not contain ':': {tag!r}")
+        unsupported = [name for name, t in fields.items() if t not in FIELD_CODECS]
+        if unsupported:
+            raise TypeError(f"Unsupported callback field types: {unsupported}")
+        self.tag = tag
+        self.fields = fields
+        self.prefix = f"{tag}:"
+        self.legacy_prefix = legacy_prefix
+
+    def encode(self, **values: Any) -> str:
+        out = bytearray()
+        for name, field_type in self.fields.items():
+            value = values[name]
+            if not isinstance(value, field_type):
+                raise TypeError(f"{self.tag}.{name} must be {field_type.__name__}")
+            FIELD_CODECS[field_type][0](out, value)
+        data = self.prefix + base64.urlsafe_b64encode(out).rstrip(b"=").decode()
+        if len(data.encode()) > MAX_CALLBACK_DATA_BYTES:
+            raise CallbackDataError(
+                f"{self.tag} callback_data is {len(data.encode())} bytes, "
+                f"over the {MAX_CALLBACK_DATA_BYTES}-byte limit"
+            )
+        return data
+
+    def decode(self, data: str) -> Dict[str, Any]:
+        if self.legacy_prefix and data.startswith(self.legacy_prefix):
+            return self._decode_legacy(data)
+        if not data.startswith(self.prefix):
+            raise CallbackDataError(f"Not a {self.tag} callback: {data!r}")
+        payload = data[len(self.prefix) :]
+        try:
+            raw = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+            values, pos = {}, 0
+            for name, field_type in self.fields.items():
+                values[name], pos = FIELD_CODECS[field_type][1](raw, pos)
+        except (IndexError, UnicodeDecodeError, binascii.Error) as exc:
+            raise CallbackDataError(f"Malformed {self.tag} callback: {data!r}") from exc
+        if pos != len(raw):
+            raise CallbackDataError(f"Trailing bytes in {self.tag} callback: {data!r}")
+        return values
+
+    def _decode_legacy(self, data: str) -> Dict[str, Any]:
+        parts = data[len(self.legacy_prefix) :].split("_", len(self.fields) - 1)
+        if len(parts) != len(self.fields):
+            raise CallbackDataError(f"Malformed legacy {self.tag} callback: {data!r}")
+        try:
+            return {
+                name: LEGACY_PARSERS[field_type](part)
+                for (name, field_type), part in zip(self.fields.items(), parts)
+            }
+        except ValueError as exc:
+            raise CallbackDataError(
+                f"Malformed legacy {self.tag} callback: {data!r}"
+            ) from exc
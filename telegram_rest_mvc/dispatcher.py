@@ -0,0 +1,95 @@
+"""Per-key ordered dispatch with cross-key parallelism."""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional, Tuple
+
+
+class BacklogFull(Exception):
+    """A key already has ``max_backlog`` items waiting."""
+
+
+class UserDispatcher:
+    """Shards work by key (a user id) onto per-key FIFO queues.
+
+    Each non-empty queue has one worker task, so different keys run in
+    parallel, at most ``max_concurrent`` at once, while items of one key run
+    strictly in submission order. A queue and its worker disappear as soon
+    as the queue drains, so idle users cost nothing.
+    """
+
+    def __init__(self, max_concurrent: int, max_backlog: Optional[int] = None):
+        self.max_backlog = max_backlog
+        self._slots = asyncio.BoundedSemaphore(max_concurrent)
+        self._queues: Dict[Hashable, asyncio.Queue] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+
+    def backlog(self, key: Hashable) -> int:
+        """Items of ``key`` waiting behind the one that is running."""
+        queue = self._queues.get(key)
+        return queue.qsize() if queue else 0
+
+    @property
+    def active_keys(self) -> int:
+        return len(self._queues)
+
+    async def submit(self, key: Hashable, coroutine: Awaitable[Any]) -> Any:
+        """Run ``coroutine`` after every earlier item of ``key``; return its result."""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            self._workers[key] = asyncio.create_task(self._drain(key, queue))
+        elif self.max_backlog is not None and queue.qsize() >= self.max_backlog:
+            coroutine.close()
+            raise BacklogFull(key)
+
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((coroutine, future))
+        return await future
+
+    async def run_unordered(self, coroutine: Awaitable[Any]) -> Any:
+        """Run work that belongs to no key, sharing the concurrency limit."""
+        async with self._slots:
+            return await coroutine
+
+    async def _drain(self, key: Hashable, queue: asyncio.Queue):
+        item: Optional[Tuple[Awaitable[Any], asyncio.Future]] = None
+        try:
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    # No await since the check: submit() cannot slip in here
+                    del self._queues[key]
+                    del self._workers[key]
+                    return
+                coroutine, future = item
+                try:
+                    async with self._slots:
+                        result = await coroutine
+                except Exception as exc:
+                    if not future.done():
+                        future.set_exception(exc)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                item = None
+        except asyncio.CancelledError:
+            self._abandon(key, queue, item)
+            raise
+
+    def _abandon(self, key, queue, item):
+        self._queues.pop(key, None)
+        self._workers.pop(key, None)
+        pending = [item] if item else []
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        for coroutine, future in pending:
+            coroutine.close()
+            future.cancel()
+
+    async def shutdown(self):
+        """Cancel all workers; waiting submitters get CancelledError."""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
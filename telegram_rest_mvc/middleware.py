@@ -0,0 +1,48 @@
+"""Middleware chain run by the Router around every routed update.
+
+A middleware is ``async def mw(request, call_next)``: it may prepare the
+request (open a session, load the user), ``await call_next(request)`` and
+act on the result or the exception. The chain is composed once, when the
+router compiles its routes.
+"""
+
+import functools
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+
+@dataclass
+class Request:
+    """One routed update plus whatever the middlewares attach to it."""
+
+    update: Update
+    context: ContextTypes.DEFAULT_TYPE
+    route: Any  # router.Route
+    session: Any = None
+    user: Any = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def telegram_id(self) -> Optional[int]:
+        user = self.update.effective_user
+        return user.id if user else None
+
+
+Handler = Callable[[Request], Awaitable[Any]]
+Middleware = Callable[[Request, Handler], Awaitable[Any]]
+
+
+async def call_route(request: Request):
+    """Innermost handler: the route's PTB-style callback."""
+    return await request.route.handler(request.update, request.context)
+
+
+def compose(middleware: Sequence[Middleware], endpoint: Handler = call_route):
+    """``middleware[0]`` runs first and wraps everything after it."""
+    handler = endpoint
+    for layer in reversed(middleware):
+        handler = functools.partial(layer, call_next=handler)
+    return handler
@@ -0,0 +1,63 @@
+"""Update processor: parallel across users, ordered per user."""
+
+import logging
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .dispatcher import BacklogFull, UserDispatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+def user_key(update: object) -> Optional[Hashable]:
+    """Serialization key of an update: its user, else its chat."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Pass to ``ApplicationBuilder.concurrent_updates()``.
+
+    Updates are sharded by user onto a ``UserDispatcher``: up to
+    ``max_concurrent_updates`` handlers run at once, but never two for the
+    same user, so one user's messages and callbacks keep their order.
+    Updates beyond ``max_user_backlog`` waiting for one user are dropped.
+    ``pending`` (accepted but unfinished updates) lets the ingress apply
+    backpressure.
+    """
+
+    def __init__(
+        self, max_concurrent_updates: int, max_user_backlog: Optional[int] = None
+    ):
+        # The base semaphore must not be the limit: it is taken before the
+        # user's queue and would let one user's backlog hold every slot.
+        super().__init__(2**31 - 1)
+        self.dispatcher = UserDispatcher(max_concurrent_updates, max_user_backlog)
+        self.pending = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        self.pending += 1
+        try:
+            key = user_key(update)
+            if key is None:
+                await self.dispatcher.run_unordered(coroutine)
+            else:
+                await self.dispatcher.submit(key, coroutine)
+        except BacklogFull:
+            logger.warning(f"Dropped update from {key}: too many updates waiting")
+        finally:
+            self.pending -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await self.dispatcher.shutdown()
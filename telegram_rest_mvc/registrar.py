@@ -11,14 +11,29 @@ from telegram.ext import (
 from .router import Router
 
 
+def _register_commands(app: Application, router: Router):
+    commands = [route.pattern.lstrip("/") for route in router.routes("command")]
+    if commands:
+        app.add_handler(CommandHandler(commands, router.dispatch_command))
+
+
+def _register_callbacks(app: Application, router: Router):
+    if router.routes("callback"):
+        app.add_handler(CallbackQueryHandler(router.dispatch_callback))
+
+
+def _register_messages(app: Application, router: Router):
+    for route in router.routes("message"):
+        app.add_handler(
+            MessageHandler(filters.TEXT & ~filters.COMMAND, router.bind(route))
+        )
+
+
+# One PTB handler per route kind: the router dispatches inside it
+REGISTRARS = (_register_commands, _register_callbacks, _register_messages)
+
+
 def register_routes(app: Application, router: Router):
-    for route in router.all_routes():
-        if route.kind == "command":
-            app.add_handler(CommandHandler(route.pattern.lstrip("/"), route.handler))
-        elif route.kind == "callback":
-            app.add_handler(CallbackQueryHandler(route.handler, pattern=route.pattern))
-        elif route.kind == "message":
-            app.add_handler(
-                MessageHandler(filters.TEXT & ~filters.COMMAND, route.handler)
-            )
-        # Extend here for messages, etc.
+    router.compile()
+    for register in REGISTRARS:
+        register(app, router)
@@ -1,5 +1,12 @@
+import re
 from dataclasses import dataclass
-from typing import Callable, List, Optional
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from .codec import CallbackDataError, CallbackSchema
+from .middleware import Middleware, Request, compose
 
 
 @dataclass
@@ -8,13 +15,81 @@ class Route:
     handler: Callable
     name: Optional[str] = None
     kind: str = "command"  # 'command' or 'callback' or 'message'
+    schema: Optional[CallbackSchema] = None  # decodes callback route params
 
 
-class Router:
-    """Simple registry that stores routes and resolves by pattern."""
+# Regex metacharacters; a pattern without them (besides ^...$) is a literal
+_REGEX_SPECIAL = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def _literal_pattern(pattern: str) -> Optional[Tuple[str, bool]]:
+    """``"^abc"`` -> ("abc", False); ``"^abc$"`` -> ("abc", True); regex -> None."""
+    if not pattern.startswith("^"):
+        return None
+    body = pattern[1:]
+    exact = body.endswith("$") and not body.endswith("\\$")
+    if exact:
+        body = body[:-1]
+    if _REGEX_SPECIAL.search(body):
+        return None
+    return body, exact
+
+
+class PrefixTrie:
+    """Maps callback_data to a route in O(len(data)).
+
+    Exact entries win over prefix entries; among prefixes the longest wins.
+    """
+
+    _PREFIX, _EXACT = "\0prefix", "\0exact"
 
     def __init__(self):
+        self._root: dict = {}
+
+    def add(self, key: str, route: Route, exact: bool = False):
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(self._EXACT if exact else self._PREFIX, route)
+
+    def match(self, data: str) -> Optional[Route]:
+        node = self._root
+        best = node.get(self._PREFIX)
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                return best
+            best = node.get(self._PREFIX, best)
+        return node.get(self._EXACT, best)
+
+
+class Router:
+    """Registry of routes, compiled into one dispatcher per update kind.
+
+    Commands resolve through a dict and callbacks through a ``PrefixTrie``,
+    so routing cost does not grow with the number of routes. Callback
+    patterns of the form ``^prefix`` or ``^exact$`` go into the trie; any
+    other regex is tried afterwards, in registration order.
+
+    Every routed update runs through ``middleware`` (outermost first), which
+    sees it as a ``Request`` that is also exposed as ``context.request``.
+    A callback query no route matches (e.g. a button from an older release)
+    is answered, with ``expired_callback_text`` as an alert when set.
+    """
+
+    def __init__(
+        self,
+        middleware: Sequence[Middleware] = (),
+        expired_callback_text: Optional[str] = None,
+    ):
+        self.expired_callback_text = expired_callback_text
         self._routes: List[Route] = []
+        self.middleware: List[Middleware] = list(middleware)
+        self._compiled = False
+        self._chain = compose(self.middleware)
+        self._commands: Dict[str, Route] = {}
+        self._callbacks = PrefixTrie()
+        self._callback_regexes: List[Tuple[re.Pattern, Route]] = []
 
     def add(
         self,
@@ -22,12 +97,98 @@ class Router:
         handler: Callable,
         name: Optional[str] = None,
         kind: str = "command",
+        schema: Optional[CallbackSchema] = None,
     ):
-        self._routes.append(Route(pattern, handler, name, kind))
+        self._routes.append(Route(pattern, handler, name, kind, schema))
+        self._compiled = False
+
+    def use(self, middleware: Middleware):
+        """Append a middleware; it runs inside the ones added before it."""
+        self.middleware.append(middleware)
+        self._compiled = False
 
     def all_routes(self) -> List[Route]:
         return list(self._routes)
 
+    def routes(self, kind: str) -> List[Route]:
+        return [route for route in self._routes if route.kind == kind]
+
+    def compile(self):
+        self._commands = {}
+        self._callbacks = PrefixTrie()
+        self._callback_regexes = []
+        for route in self.routes("command"):
+            self._commands.setdefault(route.pattern.lstrip("/").lower(), route)
+        for route in self.routes("callback"):
+            literal = _literal_pattern(route.pattern)
+            if literal:
+                self._callbacks.add(literal[0], route, exact=literal[1])
+            else:
+                self._callback_regexes.append((re.compile(route.pattern), route))
+            if route.schema and route.schema.legacy_prefix:
+                self._callbacks.add(route.schema.legacy_prefix, route)
+        self._chain = compose(self.middleware)
+        self._compiled = True
+
+    def resolve_command(self, command: str) -> Optional[Route]:
+        if not self._compiled:
+            self.compile()
+        return self._commands.get(command.lower())
+
+    def resolve_callback(self, data: str) -> Optional[Route]:
+        if not self._compiled:
+            self.compile()
+        route = self._callbacks.match(data)
+        if route is None:
+            route = next(
+                (r for regex, r in self._callback_regexes if regex.match(data)), None
+            )
+        return route
+
+    async def handle(
+        self, route: Route, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Run ``route`` for ``update`` through the middleware chain."""
+        if not self._compiled:
+            self.compile()
+        request = Request(update, context, route)
+        context.request = request
+        return await self._chain(request)
+
+    def bind(self, route: Route) -> Callable:
+        """PTB callback running ``route`` through the middleware chain."""
+
+        async def _handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            return await self.handle(route, update, context)
+
+        return _handler
+
+    async def dispatch_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        # "/cmd@BotName args" -> "cmd"
+        command = update.effective_message.text.split(maxsplit=1)[0][1:]
+        route = self.resolve_command(command.split("@", 1)[0])
+        if route:
+            await self.handle(route, update, context)
+
+    async def dispatch_callback(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        data = update.callback_query.data
+        route = self.resolve_callback(data) if isinstance(data, str) else None
+        if route is None:
+            # Without an answer the button keeps spinning
+            text = self.expired_callback_text
+            await update.callback_query.answer(text, show_alert=text is not None)
+            return
+        if route.schema:
+            try:
+                context.route_params = route.schema.decode(data)
+            except CallbackDataError:
+                context.route_params = None  # views report malformed buttons
+        await self.handle(route, update, context)
+
 
 def path(router: "Router", pattern: str, handler: Callable, name: Optional[str] = None):
     """Django-like helper to register a route on the given router."""
@@ -36,10 +197,20 @@ def path(router: "Router", pattern: str, handler: Callable, name: Optional[str]
 
 
 def callback(
-    router: "Router", pattern: str, handler: Callable, name: Optional[str] = None
+    router: "Router",
+    pattern: Union[str, CallbackSchema],
+    handler: Callable,
+    name: Optional[str] = None,
 ):
-    """Register a CallbackQuery pattern route."""
-    router.add(pattern, handler, name, kind="callback")
+    """Register a CallbackQuery route by regex pattern or ``CallbackSchema``.
+
+    A schema route matches its tag and the decoded fields reach the view as
+    ``View.params``.
+    """
+    if isinstance(pattern, CallbackSchema):
+        router.add(f"^{pattern.prefix}", handler, name, "callback", pattern)
+    else:
+        router.add(pattern, handler, name, kind="callback")
     return handler
 
 
@@ -1,9 +1,38 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Telegram(BaseModel):
     token: str = Field(..., description="Telegram Bot Token")
+    mode: Literal["polling", "webhook"] = Field(
+        "polling", description='Update source: "polling" or "webhook"'
+    )
+    webhook_url: str | None = Field(
+        None, description="Public HTTPS base URL Telegram posts updates to"
+    )
+    webhook_listen: str = Field("0.0.0.0", description="Webhook server bind address")
+    webhook_port: int = Field(8443, description="Webhook server port")
+    webhook_path: str = Field("/telegram", description="Webhook URL path")
+    webhook_secret: str | None = Field(
+        None, description="X-Telegram-Bot-Api-Secret-Token to require on webhooks"
+    )
+    webhook_max_connections: int = Field(
+        40, description="Parallel webhook connections Telegram may open (1-100)"
+    )
+    concurrent_updates: int = Field(
+        16, description="Updates handled at once (one per user at a time)"
+    )
+    max_pending_updates: int = Field(
+        1000, description="Accepted but unfinished updates before 503 backpressure"
+    )
+    max_user_backlog: int | None = Field(
+        50, description="Updates queued for one user before new ones are dropped"
+    )
+    connection_pool_size: int = Field(
+        256, description="HTTP connections to the Bot API shared by all updates"
+    )
 
 
 class Database(BaseModel):
@@ -14,6 +43,29 @@ class Database(BaseModel):
     host: str = Field("localhost", description="Database host")
     port: int = Field(5432, description="Database port")
     url: str | None = None  # Optional: explicit SQLAlchemy URL
+    echo: bool = Field(False, description="Log every SQL statement (debug only)")
+    pool_size: int = Field(10, description="Persistent connections kept in the pool")
+    max_overflow: int = Field(20, description="Extra connections allowed under load")
+    pool_timeout: int = Field(30, description="Seconds to wait for a free connection")
+    pool_pre_ping: bool = Field(True, description="Check connections before use")
+    pool_recycle: int = Field(1800, description="Reconnect after N seconds (-1: never)")
+    offload_queries: bool = Field(
+        True, description="Run flow DB work in worker threads (not on SQLite)"
+    )
+    statement_timeout_ms: int | None = Field(
+        30000, description="PostgreSQL statement_timeout; None disables it"
+    )
+    # SQLite production profile, applied to every new SQLite connection
+    sqlite_wal: bool = Field(True, description="journal_mode=WAL: readers never block")
+    sqlite_synchronous: str = Field("NORMAL", description="PRAGMA synchronous")
+    sqlite_mmap_size: int = Field(268435456, description="PRAGMA mmap_size, bytes")
+    sqlite_cache_size: int = Field(
+        -65536, description="PRAGMA cache_size (negative: KiB)"
+    )
+    sqlite_busy_timeout_ms: int = Field(5000, description="PRAGMA busy_timeout")
+    sqlite_write_queue: bool = Field(
+        True, description="Serialize hot-path writes through a single writer task"
+    )
 
     def build_url(self) -> str:
         if self.url:
@@ -25,12 +77,78 @@ class Database(BaseModel):
 
 class LLM(BaseModel):
     openai_api_key: str | None = None
+    executor_workers: int = Field(
+        32, description="Thread pool size for models without native async support"
+    )
+    plan_job_workers: int = Field(
+        4, description="Concurrent background practice plan generation jobs"
+    )
+    stream_feedback: bool = Field(
+        True, description="Stream answer feedback into the placeholder message"
+    )
+    stream_edit_interval: float = Field(
+        1.0, description="Min seconds between edits of a streamed message"
+    )
+    max_in_flight: int = Field(16, description="Max concurrent LLM calls per process")
+    requests_per_minute: float | None = Field(
+        3500, description="LLM request budget per minute (0: unlimited)"
+    )
+    tokens_per_minute: float | None = Field(
+        200000, description="LLM token budget per minute (0: unlimited)"
+    )
+    expected_completion_tokens: int = Field(
+        500, description="Completion tokens reserved per call before it finishes"
+    )
+
+
+class Cache(BaseModel):
+    user_ttl_seconds: float = Field(
+        60, description="How long a cached user snapshot is trusted"
+    )
+    user_max_size: int = Field(10000, description="Max cached users (LRU)")
+    evaluation_ttl_seconds: float = Field(
+        7 * 24 * 3600, description="How long an answer evaluation is reused"
+    )
+    evaluation_memory_size: int = Field(
+        2000, description="Answer evaluations kept in process memory (LRU)"
+    )
+    evaluation_max_rows: int = Field(
+        100000, description="Answer evaluations kept in the database (LRU)"
+    )
+    plan_template_ttl_seconds: float = Field(
+        30 * 24 * 3600, description="How long a generated plan is reused"
+    )
+    plan_template_max_uses: int = Field(
+        1000, description="Plans served from one template before it is regenerated"
+    )
+
+
+class Persistence(BaseModel):
+    backend: str = Field(
+        "none", description='user_data store: "none", "sql" or "redis"'
+    )
+    redis_url: str = "redis://localhost:6379/0"
+    update_interval: float = Field(
+        5, description="Seconds between write-behind flushes of user_data"
+    )
+    refresh_on_update: bool = Field(
+        False, description="Reload user_data on every update (several workers)"
+    )
+
+
+class Metrics(BaseModel):
+    enabled: bool = Field(False, description="Serve Prometheus metrics over HTTP")
+    listen: str = Field("127.0.0.1", description="Metrics server bind address")
+    port: int = Field(9464, description="Metrics server port (GET /metrics)")
 
 
 class BaseConfiguration(BaseSettings):
     telegram: Telegram
     database: Database = Database()
     llm: LLM = LLM()
+    cache: Cache = Cache()
+    persistence: Persistence = Persistence()
+    metrics: Metrics = Metrics()
     debug: bool = False
 
     model_config = SettingsConfigDict(
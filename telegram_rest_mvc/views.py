@@ -1,8 +1,11 @@
-from typing import Any, Awaitable, Callable, Coroutine
+import functools
+from typing import Any, Awaitable, Callable, ContextManager, Coroutine, Dict, Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from .middleware import Request
+
 
 class View:
     """Base View: instance stores `update` & `context`; override `command()`.
@@ -19,6 +22,16 @@ class View:
         self.update = update
         self.context = context
 
+    @property
+    def request(self) -> Optional[Request]:
+        """The router's ``Request`` (None when the view is called directly)."""
+        return getattr(self.context, "request", None)
+
+    @property
+    def params(self) -> Optional[Dict[str, Any]]:
+        """Fields the router decoded from callback_data; None if malformed."""
+        return getattr(self.context, "route_params", {})
+
     async def command(self):  # noqa: D401
         """Handle command (override in subclass)."""
         if self.command_handler:
@@ -38,3 +51,26 @@ class View:
             await self.command()
 
         return _handler
+
+
+def atomic(scope_factory: Callable[[], ContextManager]):
+    """Class decorator: run the view's ``command()`` inside ``scope_factory()``.
+
+    Meant for a database unit of work, so one update is one transaction::
+
+        @atomic(unit_of_work)
+        class PracticeView(View): ...
+    """
+
+    def decorator(view_cls: type[View]) -> type[View]:
+        command = view_cls.command
+
+        @functools.wraps(command)
+        async def _atomic_command(self):
+            with scope_factory():
+                await command(self)
+
+        view_cls.command = _atomic_command
+        return view_cls
+
+    return decorator
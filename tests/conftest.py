@@ -1,3 +1,4 @@
+import os
 import pathlib
 import sys
 import types
@@ -9,6 +10,9 @@ SRC_PATH = PROJECT_ROOT / "src"
 sys.path.insert(0, str(SRC_PATH))
 sys.path.insert(0, str(PROJECT_ROOT))
 
+# CONFIG is built at import time and requires a bot token
+os.environ.setdefault("TELEGRAM__TOKEN", "test-token")
+
 from types import SimpleNamespace
 
 import pytest
@@ -52,6 +56,38 @@ def _apply_test_engine(engine, monkeypatch):
     SQLModel.metadata.create_all(engine)
 
 
+@pytest.fixture(autouse=True)
+def _clear_user_cache():
+    """Cached user snapshots and evaluations must not leak between tests."""
+    from src.db.evaluation_cache import evaluation_cache
+    from src.db.user_cache import user_cache
+
+    for cache in (user_cache, evaluation_cache):
+        cache.clear()
+    yield
+    for cache in (user_cache, evaluation_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def sqlite_file_engine(tmp_path, monkeypatch):
+    """The production SQLite profile (WAL, busy_timeout) on a scratch file.
+
+    Unlike the in-memory engine, every thread and connection sees the same
+    database, so code running in worker threads can be tested against it.
+    """
+    from src.db import db as db_module
+    from telegram_rest_mvc.settings.config import Database
+
+    engine = db_module.create_db_engine(
+        Database(name=str(tmp_path / "test.sqlite3"), sqlite_busy_timeout_ms=2000)
+    )
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db_module, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
 @pytest.fixture
 def session(engine):
     """Provide a fresh DB session for each test."""
@@ -0,0 +1,224 @@
+import datetime
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from src import metrics
+from src.bot import state_machine
+from src.bot.flows import practice as practice_flow
+from src.cache import TTLCache
+from src.db import db as db_module
+from src.db import evaluation_cache, services
+from src.db.user_cache import user_cache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_lru_and_expiry():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recent
+    cache.set("c", 3)  # evicts "b"
+    assert cache.get("b") is None
+
+    timer.now = 11
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 3,
+        "size": 0,
+        "maxsize": 2,
+        "hit_ratio": 0.25,
+    }
+
+
+@pytest.fixture
+def statements(session):
+    captured = []
+
+    def _capture(conn, cursor, statement, params, context, executemany):
+        captured.append(statement)
+
+    event.listen(session.get_bind(), "before_cursor_execute", _capture)
+    yield captured
+    event.remove(session.get_bind(), "before_cursor_execute", _capture)
+
+
+def test_repeated_lookups_hit_the_cache(session, sample_questions, statements):
+    telegram_id = sample_questions.user.telegram_id
+    user = services.get_or_create_user(session, telegram_id=telegram_id)
+    statements.clear()
+
+    assert state_machine.get_user_state(session, telegram_id) == user.state
+    assert services.get_or_create_user(session, telegram_id=telegram_id) is user
+    assert statements == []
+    assert user_cache.stats()["hits"] >= 2
+
+
+def test_set_user_state_writes_through(session, sample_questions):
+    telegram_id = sample_questions.user.telegram_id
+    state_machine.set_user_state(session, telegram_id, "practice")
+
+    assert user_cache.get(telegram_id).state == "practice"
+    services.set_user_active_language(session, sample_questions.user.id, None)
+    assert user_cache.get(telegram_id).active_language_id is None
+
+
+def test_rolled_back_state_is_not_cached(sample_questions):
+    telegram_id = sample_questions.user.telegram_id
+    with pytest.raises(RuntimeError):
+        with db_module.unit_of_work() as session:
+            state_machine.set_user_state(session, telegram_id, "end")
+            assert state_machine.get_user_state(session, telegram_id) == "end"
+            raise RuntimeError("handler failed")
+
+    assert user_cache.get(telegram_id) is None
+    with db_module.get_session() as session:
+        assert state_machine.get_user_state(session, telegram_id) != "end"
+
+
+def test_state_changed_by_another_worker_is_not_served_from_cache(sample_questions):
+    from sqlalchemy import text
+
+    telegram_id = sample_questions.user.telegram_id
+    with db_module.get_session() as session:
+        state_machine.set_user_state(session, telegram_id, "practice")
+    assert user_cache.get(telegram_id).state == "practice"
+
+    # Another process moves the user on; this process's cache is not told
+    with db_module.engine.begin() as conn:
+        conn.execute(
+            text("UPDATE user SET state = 'end' WHERE telegram_id = :telegram_id"),
+            {"telegram_id": telegram_id},
+        )
+
+    with db_module.unit_of_work() as session:
+        assert state_machine.get_user_state(session, telegram_id) == "end"
+
+
+def test_answer_fingerprint_folds_trivial_differences():
+    assert evaluation_cache.normalize_answer("  Не  ЗНАЮ!!\n") == "не знаю"
+    assert evaluation_cache.answer_fingerprint(
+        "Ещё не знаю."
+    ) == evaluation_cache.answer_fingerprint("ещё  не знаю")
+    assert evaluation_cache.answer_fingerprint(
+        "list"
+    ) != evaluation_cache.answer_fingerprint("tuple")
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("a < b", "a > b"),
+        ("x++", "x--"),
+        ("[]", "{}"),
+        ("a == b", "a != b"),
+        ("!done", "done"),
+        ("a.b", "a b"),
+    ],
+)
+def test_operator_only_differences_do_not_share_an_evaluation(first, second):
+    assert evaluation_cache.answer_fingerprint(
+        first
+    ) != evaluation_cache.answer_fingerprint(second)
+
+
+@pytest.mark.asyncio
+async def test_repeated_answers_reuse_the_evaluation(
+    session, sample_questions, test_context
+):
+    data = sample_questions
+    progress = services.get_or_create_user_progress(session, data.user.id, data.lang.id)
+    item = services.add_question_to_learning_plan(
+        session, progress.id, data.q2.id, order_index=0
+    )
+    services.set_current_learning_item(session, progress.id, item.id)
+    test_context.user_data["telegram_id"] = data.user.telegram_id
+
+    calls = []
+
+    class CountingChat:
+        def invoke(self, messages):
+            calls.append(messages)
+            return SimpleNamespace(content="Cached explanation")
+
+    test_context.bot_data["chat_model"] = CountingChat()
+    lookups = {
+        result: metrics.EVALUATION_CACHE_LOOKUPS.value(result=result)
+        for result in ("memory", "db", "miss")
+    }
+
+    first = await practice_flow.process_user_practice_answer(test_context, "Не знаю.")
+    second = await practice_flow.process_user_practice_answer(test_context, "не знаю")
+    evaluation_cache.evaluation_cache.clear()  # the table still has it
+    third = await practice_flow.process_user_practice_answer(test_context, "НЕ ЗНАЮ!")
+
+    assert len(calls) == 1
+    assert {r.data["explanation"] for r in (first, second, third)} == {
+        "Cached explanation"
+    }
+    for result in ("miss", "memory", "db"):
+        assert metrics.EVALUATION_CACHE_LOOKUPS.value(result=result) == (
+            lookups[result] + 1
+        )
+
+
+def test_memory_hits_mark_the_row_used(session, sample_questions, monkeypatch):
+    question_id = sample_questions.q1.id
+    evaluation_cache.store(session, question_id, "memory hit", "x")
+    fingerprint = evaluation_cache.answer_fingerprint("memory hit")
+    session.commit()
+    before = services.get_answer_evaluation(
+        session, question_id, fingerprint, datetime.datetime.min
+    )
+    hits, last_used_at = before.hits, before.last_used_at
+    monkeypatch.setattr(evaluation_cache, "TOUCH_EVERY", 2)
+    monkeypatch.setattr(evaluation_cache, "_touched", Counter())
+
+    for _ in range(2):
+        assert evaluation_cache.lookup(session, question_id, "Memory hit.") == "x"
+    session.commit()
+    session.expire_all()
+
+    after = services.get_answer_evaluation(
+        session, question_id, fingerprint, datetime.datetime.min
+    )
+    assert after.hits == hits + 3  # two memory hits, then this lookup
+    assert after.last_used_at > last_used_at
+
+
+def test_expired_and_least_recently_used_evaluations_are_evicted(
+    session, sample_questions
+):
+    question_id = sample_questions.q1.id
+    for answer in ("a", "b", "c"):
+        services.save_answer_evaluation(session, question_id, answer, "x")
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=30)
+    stale = services.get_answer_evaluation(session, question_id, "a", old)
+    stale.created_at = old
+    services.get_answer_evaluation(session, question_id, "c", old)  # recently used
+    session.add(stale)
+    session.commit()
+
+    services.evict_answer_evaluations(
+        session, created_before=old + datetime.timedelta(days=1), max_rows=1
+    )
+
+    kept = [
+        answer
+        for answer in ("a", "b", "c")
+        if services.get_answer_evaluation(
+            session, question_id, answer, datetime.datetime.min
+        )
+    ]
+    assert kept == ["c"]
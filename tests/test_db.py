@@ -1,7 +1,7 @@
 import logging
 
 import pytest
-from sqlmodel import inspect
+from sqlmodel import SQLModel, inspect
 
 from src.db import db as db_module
 from src.db import services
@@ -36,3 +36,332 @@ def test_get_session_context_manager():
     with get_session() as s2:
         lang = services.get_language_by_slug(s2, "rust")
         assert lang and lang.name == "Rust"
+
+
+# ---------------- engine configuration -----------------
+
+
+def test_engine_options_file_sqlite():
+    from telegram_rest_mvc.settings.config import Database
+
+    cfg = Database(name="prod.sqlite3", pool_size=3, max_overflow=1)
+    opts = db_module.engine_options(cfg, cfg.build_url())
+
+    assert opts["echo"] is False and opts["pool_pre_ping"] is True
+    assert opts["pool_size"] == 3 and opts["max_overflow"] == 1
+    assert "connect_args" not in opts
+
+
+def test_engine_options_memory_sqlite_skips_pool_sizing():
+    from telegram_rest_mvc.settings.config import Database
+
+    cfg = Database(url="sqlite:///:memory:")
+    assert "pool_size" not in db_module.engine_options(cfg, cfg.build_url())
+
+
+def test_engine_options_postgres_statement_timeout():
+    from telegram_rest_mvc.settings.config import Database
+
+    cfg = Database(engine="postgresql", statement_timeout_ms=5000)
+    sync_opts = db_module.engine_options(cfg, cfg.build_url())
+    assert sync_opts["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+def test_create_db_engine_uses_config(tmp_path):
+    from telegram_rest_mvc.settings.config import Database
+
+    cfg = Database(name=str(tmp_path / "tuned.sqlite3"), pool_size=2)
+    tuned = db_module.create_db_engine(cfg)
+
+    assert tuned.echo is False
+    assert tuned.pool.size() == 2
+    assert str(tuned.url).endswith("tuned.sqlite3")
+    tuned.dispose()
+
+
+# ---------------- SQLite production profile -----------
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    from telegram_rest_mvc.settings.config import Database
+
+    cfg = Database(name=str(tmp_path / "wal.sqlite3"), sqlite_busy_timeout_ms=1234)
+    tuned = db_module.create_db_engine(cfg)
+
+    with tuned.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 1234
+        assert pragma("cache_size") == cfg.sqlite_cache_size
+    tuned.dispose()
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    from telegram_rest_mvc.settings.config import Database
+
+    tuned = db_module.create_db_engine(Database(name=str(tmp_path / "w.sqlite3")))
+    SQLModel.metadata.create_all(tuned)
+    yield tuned
+    tuned.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_queue_serializes_and_commits(file_engine):
+    import asyncio
+
+    from src.db.writer import WriteQueue
+
+    queue = WriteQueue(engine=file_engine)
+    await queue.start()
+    users = await asyncio.gather(
+        *(
+            queue.submit(services.get_or_create_user, telegram_id=7000 + i)
+            for i in range(10)
+        )
+    )
+    await queue.stop()
+
+    assert len({u.id for u in users}) == 10
+    with db_module.Session(file_engine) as s:
+        assert services.get_or_create_user(s, telegram_id=7009).id == users[-1].id
+
+
+@pytest.mark.asyncio
+async def test_write_queue_propagates_errors(file_engine):
+    from src.db.writer import WriteQueue
+
+    def boom(session):
+        raise ValueError("bad write")
+
+    queue = WriteQueue(engine=file_engine)
+    await queue.start()
+    with pytest.raises(ValueError):
+        await queue.submit(boom)
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_write_helper_routes_through_queue(session):
+    from src.db import writer
+
+    class FakeQueue:
+        async def submit(self, fn, *args, **kwargs):
+            return ("queued", fn.__name__, args)
+
+    queued = await writer.write(
+        {"db_writer": FakeQueue()}, services.get_or_create_user, session, 1
+    )
+    assert queued == ("queued", "get_or_create_user", (1,))
+
+    inline = await writer.write({}, services.get_or_create_user, session, 7100)
+    assert inline.telegram_id == 7100
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_inline_on_sqlite():
+    import threading
+
+    assert not db_module.offloads_queries()
+    assert await db_module.run_blocking(threading.get_ident) == threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_offloads_on_other_databases(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(
+        db_module, "engine", SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+    )
+    assert db_module.offloads_queries()
+
+    def work(marker):
+        # the worker sees the caller's contextvars, i.e. its unit of work
+        return threading.get_ident(), db_module._current_session.get(), marker
+
+    token = db_module._current_session.set("uow")
+    try:
+        ident, current, marker = await db_module.run_blocking(work, marker=1)
+    finally:
+        db_module._current_session.reset(token)
+    assert ident != threading.get_ident()
+    assert (current, marker) == ("uow", 1)
+
+    monkeypatch.setattr(db_module.CONFIG.database, "offload_queries", False)
+    assert not db_module.offloads_queries()
+
+
+@pytest.fixture
+def uow_engine(file_engine, monkeypatch):
+    """File engine with a DBAPI commit counter, used by unit_of_work()."""
+    from sqlalchemy import event
+
+    monkeypatch.setattr(db_module, "engine", file_engine)
+    file_engine.commits = 0
+
+    @event.listens_for(file_engine, "commit")
+    def _count(conn):
+        file_engine.commits += 1
+
+    return file_engine
+
+
+def test_unit_of_work_commits_once(uow_engine):
+    from src.bot.state_machine import set_user_state
+
+    with db_module.unit_of_work() as session:
+        lang = services.get_or_create_language(session, name="Go", slug="go")
+        cat = services.get_or_create_category(session, name="Concurrency")
+        user = services.get_or_create_user(session, telegram_id=8000)
+        progress = services.get_or_create_user_progress(session, user.id, lang.id)
+        for order in range(3):
+            question = services.create_question(
+                session, text=f"Q{order}", category_id=cat.id, language_id=lang.id
+            )
+            item = services.add_question_to_learning_plan(
+                session, progress.id, question.id, order_index=order
+            )
+        services.set_current_learning_item(session, progress.id, item.id)
+        set_user_state(session, 8000, "practice")
+        # nested scopes and plain get_session() join the same transaction
+        with get_session() as inner, db_module.unit_of_work() as nested:
+            assert inner is session and nested is session
+        assert uow_engine.commits == 0
+
+    assert uow_engine.commits == 1
+    with db_module.Session(uow_engine) as s:
+        assert services.get_current_learning_item(s, progress.id).id == item.id
+        assert services.get_or_create_user(s, telegram_id=8000).state == "practice"
+
+
+def test_unit_of_work_rolls_back_on_error(uow_engine):
+    with pytest.raises(RuntimeError):
+        with db_module.unit_of_work() as session:
+            services.get_or_create_language(session, name="Rust", slug="rust")
+            raise RuntimeError("view failed")
+
+    assert uow_engine.commits == 0
+    with db_module.Session(uow_engine) as s:
+        assert services.list_languages(s) == []
+
+
+def test_migrations_upgrade_legacy_database(file_engine):
+    from sqlalchemy import insert, select
+
+    from src.db.migrations import m0002_learning_plan_indexes, run_migrations
+    from src.db.migrations.m0001_question_text_hash import DEDUPE_INDEX
+    from src.db.models import (
+        Category,
+        ProgrammingLanguage,
+        Question,
+        UserLearningPlanItem,
+    )
+
+    question = Question.__table__
+    plan_item = UserLearningPlanItem.__table__
+    with file_engine.begin() as conn:
+        # Legacy schema: no text_hash, single-column plan index, duplicated texts
+        DEDUPE_INDEX.drop(conn)
+        conn.exec_driver_sql("ALTER TABLE question DROP COLUMN text_hash")
+        for index in plan_item.indexes:
+            index.drop(conn)
+        conn.exec_driver_sql(
+            f"CREATE INDEX {m0002_learning_plan_indexes.LEGACY_INDEX} "
+            "ON userlearningplanitem (user_progress_id)"
+        )
+        conn.execute(insert(ProgrammingLanguage.__table__).values(name="Py", slug="py"))
+        conn.execute(insert(Category.__table__).values(name="Basics"))
+        for text in ["What is GIL?", "what is  GIL?", "What is a GIL?"]:
+            conn.exec_driver_sql(
+                "INSERT INTO question (text, category_id, language_id, is_diagnostic)"
+                " VALUES (?, 1, 1, 0)",
+                (text,),
+            )
+        conn.execute(
+            insert(plan_item).values(
+                user_progress_id=1, question_id=2, order_index=0, status="pending"
+            )
+        )
+
+    assert run_migrations(file_engine) == [1, 2]
+    assert run_migrations(file_engine) == []  # recorded, not re-applied
+
+    with file_engine.connect() as conn:
+        rows = conn.execute(select(question.c.id, question.c.text_hash)).all()
+        item_question = conn.execute(select(plan_item.c.question_id)).scalar_one()
+        question_indexes = {i["name"] for i in inspect(conn).get_indexes("question")}
+        plan_indexes = {
+            i["name"] for i in inspect(conn).get_indexes("userlearningplanitem")
+        }
+
+    assert sorted(row.id for row in rows) == [1, 3]
+    assert all(row.text_hash for row in rows)
+    assert item_question == 1  # repointed from the merged duplicate
+    assert DEDUPE_INDEX.name in question_indexes
+    assert plan_indexes == {index.name for index in plan_item.indexes}
+
+
+def test_migrations_on_fresh_database_are_noops(file_engine):
+    from src.db.migrations import MIGRATIONS, applied_versions, run_migrations
+
+    assert run_migrations(file_engine) == [m.VERSION for m in MIGRATIONS]
+    assert applied_versions(file_engine) == {m.VERSION for m in MIGRATIONS}
+
+
+def test_postgres_index_ddl_is_concurrent():
+    from sqlalchemy.dialects import postgresql, sqlite
+
+    from src.db.migrations import operations
+    from src.db.models import UserLearningPlanItem
+
+    index = next(
+        i
+        for i in UserLearningPlanItem.__table__.indexes
+        if i.name == "ix_plan_item_current"
+    )
+    pg_sql = operations.create_index_sql(index, postgresql.dialect())
+    assert pg_sql.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+    assert "WHERE status = 'current'" in pg_sql
+    assert "CONCURRENTLY" not in operations.create_index_sql(index, sqlite.dialect())
+    assert operations.drop_index_sql("ix_old", postgresql.dialect()) == (
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_old"
+    )
+
+
+def test_learning_plan_queries_use_indexes(file_engine):
+    from sqlalchemy import event
+
+    def query_plan(service, *args):
+        statements = []
+
+        def _capture(conn, cursor, statement, params, context, executemany):
+            statements.append((statement, params))
+
+        event.listen(file_engine, "before_cursor_execute", _capture)
+        with db_module.Session(file_engine) as s:
+            service(s, *args)
+        event.remove(file_engine, "before_cursor_execute", _capture)
+        statement, params = statements[0]
+        with file_engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params)
+            return " | ".join(row[-1] for row in rows)
+
+    # Row lookups: an index search, no table scan and no sort step
+    for service, args in [
+        (services.get_current_learning_item, (1,)),
+        (services.get_next_pending_learning_item, (1, 3)),
+    ]:
+        plan = query_plan(service, *args)
+        assert plan.startswith("SEARCH userlearningplanitem USING INDEX ix_plan_item_")
+        assert "TEMP B-TREE" not in plan
+
+    # Id / order_index lookups are answered from the index alone
+    for service in (
+        services.get_max_learning_plan_order_index,
+        services.user_has_practice_plan,
+    ):
+        plan = query_plan(service, 1)
+        assert "USING COVERING INDEX ix_plan_item_progress_order" in plan
+        assert "TEMP B-TREE" not in plan
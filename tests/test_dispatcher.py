@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from telegram_rest_mvc.dispatcher import BacklogFull, UserDispatcher
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_results_and_propagates_errors():
+    dispatcher = UserDispatcher(2)
+
+    async def double(x):
+        return x * 2
+
+    async def fail():
+        raise ValueError("boom")
+
+    assert await dispatcher.submit(1, double(21)) == 42
+    with pytest.raises(ValueError):
+        await dispatcher.submit(1, fail())
+    assert await dispatcher.submit(1, double(1)) == 2  # worker survives errors
+    assert dispatcher.active_keys == 0
+
+
+@pytest.mark.asyncio
+async def test_backlog_limit_is_per_user():
+    dispatcher = UserDispatcher(4, max_backlog=1)
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+
+    first = asyncio.create_task(dispatcher.submit(1, blocked()))
+    await asyncio.sleep(0)  # user 1's worker picks up the first item
+    second = asyncio.create_task(dispatcher.submit(1, blocked()))
+    await asyncio.sleep(0)
+    assert dispatcher.backlog(1) == 1
+
+    with pytest.raises(BacklogFull):
+        await dispatcher.submit(1, blocked())
+    other = asyncio.create_task(dispatcher.submit(2, blocked()))
+
+    release.set()
+    await asyncio.gather(first, second, other)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_waiting_work():
+    dispatcher = UserDispatcher(1)
+    started = asyncio.Event()
+
+    async def forever():
+        started.set()
+        await asyncio.Event().wait()
+
+    running = asyncio.create_task(dispatcher.submit(1, forever()))
+    queued = asyncio.create_task(dispatcher.submit(1, forever()))
+    await started.wait()
+
+    await dispatcher.shutdown()
+    results = await asyncio.gather(running, queued, return_exceptions=True)
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+    assert dispatcher.active_keys == 0
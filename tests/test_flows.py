@@ -298,3 +298,38 @@ async def test_diagnostics_process_no_active_question(monkeypatch):
 
     res = await diag_flow.process_diagnostic_score(ctx, question_id=1, score=3)
     assert res.status == FlowStatus.NO_ACTIVE_QUESTION
+
+
+@pytest.mark.asyncio
+async def test_practice_flow_with_offloaded_queries(
+    sqlite_file_engine, test_context, monkeypatch
+):
+    """Flow DB work in worker threads joins the update's unit of work."""
+    from sqlmodel import Session, select
+
+    from src.db import db as db_module
+    from src.db.models import UserAnswer
+
+    monkeypatch.setattr(db_module, "offloads_queries", lambda: True)
+    with Session(sqlite_file_engine) as s:
+        lang = services.get_or_create_language(s, name="Go", slug="go")
+        cat = services.get_or_create_category(s, name="Basics")
+        user = services.get_or_create_user(s, telegram_id=9100)
+        services.set_user_active_language(s, user.id, lang.id)
+        progress = services.get_or_create_user_progress(s, user.id, lang.id)
+        question = services.create_question(
+            s, text="What is a goroutine?", category_id=cat.id, language_id=lang.id
+        )
+        item = services.add_question_to_learning_plan(s, progress.id, question.id, 0)
+        services.set_current_learning_item(s, progress.id, item.id)
+        s.commit()
+    test_context.user_data["telegram_id"] = 9100
+
+    with db_module.unit_of_work():
+        qres = await prac_flow.get_current_practice_question(test_context)
+        ans = await prac_flow.process_user_practice_answer(test_context, "Threads")
+
+    assert qres.data["text"] == "What is a goroutine?"
+    assert ans.status == FlowStatus.FINISHED
+    with Session(sqlite_file_engine) as s:
+        assert s.exec(select(UserAnswer.answer_text)).all() == ["Threads"]
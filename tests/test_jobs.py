@@ -0,0 +1,153 @@
+import types
+
+import pytest
+from sqlmodel import delete
+
+from src import metrics
+from src.bot.jobs import PlanJobQueue
+from src.bot.views import practice as practice_view
+from src.db import plan_templates, services
+from src.db.models import PlanTemplate
+
+
+PLAN_JSON = '[{"category_name": "Basics", "question_text": "What is a generator?"}]'
+
+
+class PlanLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return types.SimpleNamespace(content=PLAN_JSON)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def diagnosed_progress(session, sample_questions):
+    data = sample_questions
+    progress = services.get_or_create_user_progress(session, data.user.id, data.lang.id)
+    services.save_diagnostic_answer(session, progress.id, data.diag_q.id, 2)
+    return progress
+
+
+@pytest.mark.asyncio
+async def test_enqueue_generates_plan_and_notifies(session, diagnosed_progress):
+    bot = FakeBot()
+    queue = PlanJobQueue(bot, {"chat_model": PlanLLM()}, workers=2)
+    await queue.start()
+
+    job_id = await queue.enqueue(
+        user_progress_id=diagnosed_progress.id, telegram_id=123, chat_id=777
+    )
+    await queue.join()
+    await queue.stop()
+
+    session.expire_all()
+    assert services.get_plan_job(session, job_id).status == "done"
+    assert services.user_has_practice_plan(session, diagnosed_progress.id)
+    assert [chat_id for chat_id, _ in bot.sent] == [777, 777]
+    assert "What is a generator?" in bot.sent[-1][1]
+
+
+class BrokenBot(FakeBot):
+    async def send_message(self, chat_id, text, reply_markup=None):
+        raise RuntimeError("chat not found")
+
+
+@pytest.mark.asyncio
+async def test_job_is_marked_failed_when_notification_raises(
+    session, diagnosed_progress
+):
+    queue = PlanJobQueue(BrokenBot(), {"chat_model": PlanLLM()})
+    job = services.create_plan_job(
+        session, user_progress_id=diagnosed_progress.id, telegram_id=123, chat_id=777
+    )
+
+    with pytest.raises(RuntimeError):
+        await queue.run_job(job.id)
+
+    session.expire_all()
+    job = services.get_plan_job(session, job.id)
+    assert job.status == "failed"
+    assert job.error == "RuntimeError: chat not found"
+
+
+@pytest.mark.asyncio
+async def test_start_requeues_persisted_jobs(session, diagnosed_progress):
+    # A template from another test would serve the plan without an LLM
+    session.exec(delete(PlanTemplate))
+    job = services.create_plan_job(
+        session, user_progress_id=diagnosed_progress.id, telegram_id=123, chat_id=5
+    )
+    bot = FakeBot()
+    queue = PlanJobQueue(bot, {}, workers=1)  # no LLM: generation fails
+    await queue.start()
+    await queue.join()
+    await queue.stop()
+
+    session.expire_all()
+    finished = services.get_plan_job(session, job.id)
+    assert finished.status == "failed" and finished.error == "NO_QUESTIONS"
+    assert bot.sent and bot.sent[0][0] == 5
+
+
+@pytest.mark.asyncio
+async def test_enqueue_waits_for_unit_of_work_commit(session, diagnosed_progress):
+    from src.db.db import unit_of_work
+
+    queue = PlanJobQueue(FakeBot(), {}, workers=1)
+    with unit_of_work():
+        job_id = await queue.enqueue(
+            user_progress_id=diagnosed_progress.id, telegram_id=123, chat_id=5
+        )
+        assert queue.qsize() == 0
+
+    assert queue.qsize() == 1
+    assert services.get_plan_job(session, job_id).status == "pending"
+
+
+def test_score_key_quantizes_scores_into_bands():
+    assert plan_templates.score_key({"7": 5, "3": 1, "12": 3}) == (
+        "12:mid,3:low,7:high"
+    )
+    assert plan_templates.score_key({"3": 2, "7": 4}) == plan_templates.score_key(
+        {"7": 5, "3": 1}
+    )
+
+
+@pytest.mark.asyncio
+async def test_plans_are_reused_for_the_same_score_bands(session, sample_questions):
+    data = sample_questions
+    session.exec(delete(PlanTemplate))
+    llm = PlanLLM()
+    context = types.SimpleNamespace(bot_data={"chat_model": llm}, user_data={})
+    hits = metrics.PLAN_TEMPLATE_LOOKUPS.value(result="hit")
+
+    plans = []
+    for telegram_id, score in ((4101, 1), (4102, 2)):  # both in the "low" band
+        user = services.get_or_create_user(session, telegram_id=telegram_id)
+        services.set_user_active_language(session, user.id, data.lang.id)
+        progress = services.get_or_create_user_progress(session, user.id, data.lang.id)
+        services.save_diagnostic_answer(session, progress.id, data.diag_q.id, score)
+        success, _ = await practice_view.generate_practice_plan(
+            context, session, user, progress
+        )
+        assert success
+        plans.append(
+            [
+                i.question_id
+                for i in services.get_learning_plan_items(session, progress.id)
+            ]
+        )
+
+    assert llm.calls == 1
+    assert plans[0] == plans[1]
+    assert metrics.PLAN_TEMPLATE_LOOKUPS.value(result="hit") == hits + 1
@@ -0,0 +1,278 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+from src import metrics
+from src.bot.streaming import MAX_MESSAGE_LENGTH, ProgressiveEdit
+from src.llm import gateway as llm_gateway
+from src.llm import limiter
+
+
+LLM_DELAY = 0.2
+CONCURRENCY = 20
+
+
+class DelayedSyncLLM:
+    """Fake model exposing only the blocking ``invoke`` API."""
+
+    def invoke(self, messages):
+        time.sleep(LLM_DELAY)
+        return types.SimpleNamespace(content="sync")
+
+
+class DelayedAsyncLLM:
+    """Fake model with a native ``ainvoke``."""
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(LLM_DELAY)
+        return types.SimpleNamespace(content="async")
+
+
+@pytest.mark.asyncio
+async def test_ainvoke_prefers_native_async():
+    res = await llm_gateway.ainvoke(DelayedAsyncLLM(), [])
+    assert res.content == "async"
+
+
+@pytest.mark.asyncio
+async def test_ainvoke_sync_model_does_not_block_loop():
+    """While a sync model is in flight the event loop keeps serving other tasks."""
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    res = await llm_gateway.ainvoke(DelayedSyncLLM(), [])
+    task.cancel()
+
+    assert res.content == "sync"
+    assert ticks > 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("llm", [DelayedSyncLLM(), DelayedAsyncLLM()])
+async def test_concurrent_evaluations_overlap(llm):
+    """Throughput scales with concurrency instead of one call at a time."""
+    llm_gateway.configure(CONCURRENCY)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(llm_gateway.ainvoke(llm, []) for _ in range(CONCURRENCY))
+    )
+    elapsed = time.perf_counter() - started
+
+    assert len(results) == CONCURRENCY
+    # Serialized calls would take CONCURRENCY * LLM_DELAY (4s)
+    assert elapsed < LLM_DELAY * 4
+
+
+class StreamingLLM:
+    """Fake model streaming its reply in chunks."""
+
+    async def astream(self, messages):
+        for text in ("Хороший ", "ответ", "."):
+            await asyncio.sleep(0)
+            yield types.SimpleNamespace(content=text, usage_metadata=None)
+
+
+@pytest.mark.asyncio
+async def test_astream_yields_chunks_and_falls_back_to_ainvoke():
+    chunks = [chunk async for chunk in llm_gateway.astream(StreamingLLM(), [])]
+    assert chunks == ["Хороший ", "ответ", "."]
+
+    chunks = [chunk async for chunk in llm_gateway.astream(DelayedAsyncLLM(), [])]
+    assert chunks == ["async"]
+
+
+@pytest.mark.asyncio
+async def test_first_partial_edit_is_immediate():
+    clock = FakeClock()
+    message = EditedMessage()
+    progress = ProgressiveEdit(message, interval=1.0, min_new_chars=5, clock=clock)
+
+    await progress.update("Хорошо")
+
+    assert message.edits == [("Хорошо …", None)]
+
+
+@pytest.mark.asyncio
+async def test_long_final_text_is_split_across_messages():
+    message = EditedMessage()
+    progress = ProgressiveEdit(message)
+    paragraph = "слово " * 500  # 3000 characters
+    text = f"{paragraph}\n{paragraph}\nИтог."
+
+    await progress.finish(text, reply_markup="keyboard")
+
+    parts = [message.edits[0][0]] + [part for part, _ in message.sent]
+    assert all(len(part) <= MAX_MESSAGE_LENGTH for part in parts)
+    assert " ".join(" ".join(parts).split()) == " ".join(text.split())
+    assert message.edits[0][1] is None
+    assert message.sent[-1] == (parts[-1], "keyboard")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class EditedMessage:
+    def __init__(self):
+        self.edits = []
+        self.sent = []
+        self.chat = types.SimpleNamespace(send_message=self.send_message)
+
+    async def edit_text(self, text, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+    async def send_message(self, text, reply_markup=None):
+        self.sent.append((text, reply_markup))
+
+
+@pytest.mark.asyncio
+async def test_progressive_edits_are_coalesced():
+    clock = FakeClock()
+    message = EditedMessage()
+    progress = ProgressiveEdit(message, interval=1.0, min_new_chars=5, clock=clock)
+
+    clock.now = 1.0
+    await progress.update("Хорошо")  # first edit
+    await progress.update("Хорошо, но")  # too soon
+    clock.now = 2.5
+    await progress.update("Хорошо, н")  # too little new text
+    await progress.update("Хорошо, но есть ошибки")
+    await progress.finish("Хорошо, но есть ошибки.", reply_markup="keyboard")
+
+    assert message.edits == [
+        ("Хорошо …", None),
+        ("Хорошо, но есть ошибки …", None),
+        ("Хорошо, но есть ошибки.", "keyboard"),
+    ]
+
+
+def test_token_bucket_refills_per_minute():
+    clock = FakeClock()
+    bucket = limiter.TokenBucket(60, clock)
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1.0)
+    clock.now = 30
+    assert bucket.delay(30) == 0
+    assert bucket.delay(1000) == pytest.approx(30.0)  # capped at a full bucket
+
+
+@pytest.mark.asyncio
+async def test_limiter_serves_interactive_first_then_users_in_turn():
+    llm_limiter = limiter.LLMLimiter(max_in_flight=1)
+    served = []
+    gate = asyncio.Event()
+
+    async def call(name, user, priority=limiter.INTERACTIVE):
+        with limiter.requester(user=user, priority=priority):
+            async with llm_limiter.slot():
+                served.append(name)
+                if name == "first":
+                    await gate.wait()
+
+    first = asyncio.create_task(call("first", 1))
+    await asyncio.sleep(0)
+    calls = [
+        ("bg", 3, limiter.BACKGROUND),
+        ("a1", 1),
+        ("a2", 1),
+        ("a3", 1),
+        ("b1", 2),
+    ]
+    tasks = []
+    for args in calls:
+        tasks.append(asyncio.create_task(call(*args)))
+        await asyncio.sleep(0)  # enqueue in this order
+    assert llm_limiter.qsize() == 5
+    gate.set()
+    await asyncio.gather(first, *tasks)
+
+    assert served == ["first", "a1", "b1", "a2", "a3", "bg"]
+    assert llm_limiter.in_flight == 0
+    assert metrics.LLM_QUEUE_SECONDS.count(priority="background") >= 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_waits_for_the_token_budget():
+    llm_limiter = limiter.LLMLimiter(max_in_flight=4, tokens_per_minute=600)
+    async with llm_limiter.slot(600) as lease:
+        lease.tokens = 594  # settles to 6 tokens left, 0.6s to refill 6 more
+
+    started = time.perf_counter()
+    async with llm_limiter.slot(12):
+        pass
+    assert 0.3 < time.perf_counter() - started < 1.5
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    llm_limiter = limiter.LLMLimiter(max_in_flight=1)
+    async with llm_limiter.slot():
+        waiting = asyncio.create_task(llm_limiter.slot().__aenter__())
+        await asyncio.sleep(0)
+        assert llm_limiter.qsize() == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert llm_limiter.qsize() == 0
+    assert llm_limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_gateway_calls_take_limiter_slots():
+    llm_limiter = limiter.LLMLimiter(max_in_flight=2)
+    llm_gateway.configure_limiter(llm_limiter)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(llm_gateway.ainvoke(DelayedAsyncLLM(), []) for _ in range(4))
+        )
+        chunks = [chunk async for chunk in llm_gateway.astream(StreamingLLM(), [])]
+    finally:
+        llm_gateway.configure_limiter(None)
+
+    # Two at a time: two rounds of LLM_DELAY
+    assert time.perf_counter() - started >= LLM_DELAY * 2
+    assert "".join(chunks) == "Хороший ответ."
+    assert llm_limiter.in_flight == 0
+
+
+class UsageStreamingLLM:
+    """Streams two chunks, the last one carrying the call's token usage."""
+
+    async def astream(self, messages):
+        yield types.SimpleNamespace(content="Да", usage_metadata=None)
+        yield types.SimpleNamespace(content=".", usage_metadata={"total_tokens": 42})
+
+
+@pytest.mark.asyncio
+async def test_astream_releases_slot_while_caller_lags_and_settles_usage():
+    clock = FakeClock()
+    llm_limiter = limiter.LLMLimiter(
+        max_in_flight=1, tokens_per_minute=1000, clock=clock
+    )
+    llm_gateway.configure_limiter(llm_limiter, expected_completion_tokens=100)
+    try:
+        stream = llm_gateway.astream(UsageStreamingLLM(), [])
+        assert await stream.__anext__() == "Да"
+        await asyncio.sleep(0.01)  # the caller edits a Telegram message
+        assert llm_limiter.in_flight == 0
+        assert [chunk async for chunk in stream] == ["."]
+    finally:
+        llm_gateway.configure_limiter(None)
+
+    # the 100-token estimate was settled to the reported 42
+    assert llm_limiter._tokens.level == 1000 - 42
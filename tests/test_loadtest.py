@@ -0,0 +1,49 @@
+import pytest
+from sqlmodel import Session
+
+from scripts import loadtest
+from src.db import services
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert loadtest.percentile(values, 50) == 50
+    assert loadtest.percentile(values, 99) == 99
+    assert loadtest.percentile([3.0], 95) == 3.0
+    assert loadtest.percentile([], 50) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_simulated_users_walk_the_whole_flow(session):
+    services.populate_initial_data(session)
+    session.commit()
+
+    report = await loadtest.LoadTest(users=3, answers=2, write_queue=False).run()
+
+    routes = report["routes"]
+    assert routes["start"]["count"] == 3
+    assert routes["diagnostic_score"]["count"] >= 3
+    assert routes["user_text"]["count"] == 6
+    assert report["total"]["errors"] == 0
+    assert report["updates"] == sum(row["count"] for row in routes.values())
+    assert "p95 ms" in loadtest.format_report(report)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("write_queue", [False, True])
+async def test_concurrent_users_do_not_wait_on_the_sqlite_lock(
+    sqlite_file_engine, write_queue
+):
+    """Updates must not keep the write lock across Bot API or LLM awaits."""
+    with Session(sqlite_file_engine) as session:
+        services.populate_initial_data(session)
+        session.commit()
+
+    report = await loadtest.LoadTest(
+        users=8, answers=1, llm_latency=0.05, api_latency=0.01, write_queue=write_queue
+    ).run()
+
+    assert report["total"]["errors"] == 0
+    assert report["routes"]["start"]["count"] == 8
+    # A lock wait shows up as an update stalled for busy_timeout (2s)
+    assert report["total"]["p99_ms"] < 1500
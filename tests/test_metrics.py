@@ -0,0 +1,97 @@
+import types
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from src import metrics
+from src.db.db import instrument_engine
+from src.llm import gateway as llm_gateway
+
+
+def test_registry_renders_prometheus_text():
+    registry = metrics.Registry()
+    requests = registry.counter("demo_requests_total", "Requests", ["route"])
+    latency = registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1))
+    requests.inc(route='say "hi"')
+    requests.inc(2, route='say "hi"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP demo_requests_total Requests",
+        "# TYPE demo_requests_total counter",
+        'demo_requests_total{route="say \\"hi\\""} 3',
+        "# HELP demo_seconds Latency",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1"} 2',
+        'demo_seconds_bucket{le="+Inf"} 2',
+        "demo_seconds_sum 0.55",
+        "demo_seconds_count 2",
+    ]
+
+
+def test_db_queries_are_counted_per_update():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    with metrics.track_update("demo") as stats:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM missing_table"))
+            conn.execute(text("SELECT 3"))
+
+    assert stats.db_queries == 3
+    assert stats.db_seconds > 0
+    assert metrics.current_stats() is None
+
+
+@pytest.mark.asyncio
+async def test_llm_time_tokens_and_errors_are_recorded():
+    class TokenLLM:
+        async def ainvoke(self, messages):
+            return types.SimpleNamespace(
+                content="ok", usage_metadata={"total_tokens": 42}
+            )
+
+    class BrokenLLM:
+        async def ainvoke(self, messages):
+            raise RuntimeError("rate limited")
+
+    errors_before = metrics.LLM_CALLS.value(outcome="error")
+    with metrics.track_update("demo") as stats:
+        await llm_gateway.ainvoke(TokenLLM(), [])
+        with pytest.raises(RuntimeError):
+            await llm_gateway.ainvoke(BrokenLLM(), [])
+
+    assert (stats.llm_calls, stats.llm_tokens) == (2, 42)
+    assert metrics.LLM_CALLS.value(outcome="error") == errors_before + 1
+
+
+def test_gauges_sample_callbacks_at_render_time():
+    registry = metrics.Registry()
+    depth = registry.gauge("demo_depth", "Depth", ["queue"])
+    items = []
+    depth.set_function(lambda: len(items), queue="jobs")
+    depth.set(3, queue="static")
+    items.extend([1, 2])
+
+    assert 'demo_depth{queue="jobs"} 2' in registry.render()
+    assert depth.value(queue="static") == 3
+
+
+def test_pool_checkout_time_is_recorded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    instrument_engine(engine)
+    before = metrics.DB_POOL_CHECKOUT_SECONDS.count()
+
+    with engine.connect():
+        pass
+    engine.dispose()  # the replacement pool is instrumented too
+    with engine.connect():
+        pass
+
+    assert metrics.DB_POOL_CHECKOUT_SECONDS.count() == before + 2
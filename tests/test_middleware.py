@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlmodel import Session
+
+from constants import messages
+from src import metrics
+from src.bot import middleware
+from src.db import services
+from src.db.db import get_session
+from telegram_rest_mvc.router import Router, message
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _routed_update(telegram_id):
+    update = SimpleNamespace(
+        effective_user=SimpleNamespace(id=telegram_id), effective_message=FakeMessage()
+    )
+    return update, SimpleNamespace(user_data={})
+
+
+@pytest.mark.asyncio
+async def test_user_is_loaded_once_per_update(monkeypatch):
+    loads = []
+    real_get_or_create_user = services.get_or_create_user
+
+    def counting_get_or_create_user(session, telegram_id):
+        loads.append(telegram_id)
+        return real_get_or_create_user(session, telegram_id=telegram_id)
+
+    monkeypatch.setattr(services, "get_or_create_user", counting_get_or_create_user)
+    seen = []
+
+    async def handler(update, context):
+        with get_session() as session:
+            assert session is context.request.session  # joined the unit of work
+            for _ in range(2):
+                seen.append(middleware.current_user(context, session, 9017001))
+
+    router = Router(middleware=middleware.MIDDLEWARE)
+    message(router, handler)
+    update, context = _routed_update(9017001)
+    await router.bind(router.routes("message")[0])(update, context)
+
+    assert loads == [9017001]
+    assert seen[0] is seen[1] is context.request.user
+    assert context.user_data["telegram_id"] == 9017001
+    stats = context.request.extra["stats"]
+    assert stats.route == "__message__" and stats.seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_update_is_rolled_back_and_reported(engine):
+    async def handler(update, context):
+        services.get_or_create_language(
+            context.request.session, name="Middleware", slug="mw-lang"
+        )
+        raise RuntimeError("view failed")
+
+    router = Router(middleware=middleware.MIDDLEWARE)
+    message(router, handler, name="failing")
+    update, context = _routed_update(9017002)
+    await router.bind(router.routes("message")[0])(update, context)
+
+    assert update.effective_message.replies == [messages.MSG_GENERAL_ERROR]
+    assert metrics.UPDATES.value(route="failing", outcome="error") == 1
+    with Session(engine) as session:
+        slugs = [language.slug for language in services.list_languages(session)]
+    assert "mw-lang" not in slugs
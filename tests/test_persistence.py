@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from src.bot.persistence import (
+    RedisUserDataStore,
+    SQLUserDataStore,
+    UserDataPersistence,
+)
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio hash commands we use."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.hset_calls = 0
+
+    async def hgetall(self, key):
+        return {k.encode(): v.encode() for k, v in self.hashes.get(key, {}).items()}
+
+    async def hget(self, key, field):
+        value = self.hashes.get(key, {}).get(field)
+        return value.encode() if value is not None else None
+
+    async def hset(self, key, mapping):
+        self.hset_calls += 1
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+
+@pytest.mark.asyncio
+async def test_user_data_survives_restart_and_is_batched():
+    redis = FakeRedis()
+    worker = UserDataPersistence(RedisUserDataStore(redis))
+    assert await worker.get_user_data() == {}
+
+    await worker.update_user_data(
+        1, {"diagnostic_current_index": 2, "message": object()}
+    )
+    await worker.update_user_data(2, {"active_progress_id": 7})
+    await worker.flush()
+    assert redis.hset_calls == 1  # both users in one write
+
+    await worker.update_user_data(2, {"active_progress_id": 7})  # unchanged
+    await worker.flush()
+    assert redis.hset_calls == 1
+
+    restarted = UserDataPersistence(RedisUserDataStore(redis))
+    assert await restarted.get_user_data() == {
+        1: {"diagnostic_current_index": 2},
+        2: {"active_progress_id": 7},
+    }
+
+    await restarted.drop_user_data(1)
+    assert 1 not in await restarted.store.load()
+
+
+class FlakyStore(RedisUserDataStore):
+    """Fails the first ``failures`` saves, as a briefly unreachable backend would."""
+
+    def __init__(self, failures):
+        super().__init__(FakeRedis())
+        self.failures = failures
+        self.saves = 0
+
+    async def save(self, entries):
+        self.saves += 1
+        if self.saves <= self.failures:
+            raise ConnectionError("store is down")
+        await super().save(entries)
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried_with_backoff():
+    store = FlakyStore(failures=2)
+    worker = UserDataPersistence(store, update_interval=0.05)
+    await worker.get_user_data()
+
+    await worker.update_user_data(3, {"active_progress_id": 9})
+    await asyncio.sleep(0.01)
+    assert store.saves == 1
+    # updates arriving while a retry is pending wait for it
+    await worker.update_user_data(4, {"active_progress_id": 10})
+    await asyncio.sleep(0)
+    assert store.saves == 1
+
+    await asyncio.sleep(0.06)  # retried after update_interval, fails again
+    assert store.saves == 2
+    await asyncio.sleep(0.03)  # the second retry waits twice as long
+    assert store.saves == 2
+    await asyncio.sleep(0.1)
+    assert store.saves == 3
+    assert await store.load() == {
+        3: '{"active_progress_id": 9}',
+        4: '{"active_progress_id": 10}',
+    }
+
+
+@pytest.mark.asyncio
+async def test_refresh_picks_up_other_workers_writes():
+    redis = FakeRedis()
+    first = UserDataPersistence(RedisUserDataStore(redis), refresh_on_update=True)
+    second = UserDataPersistence(RedisUserDataStore(redis), refresh_on_update=True)
+    await first.get_user_data()
+    await second.get_user_data()
+
+    await second.update_user_data(5, {"diagnostic_current_index": 3})
+    await second.flush()
+
+    local = {"diagnostic_current_index": 1, "message": "kept"}
+    await first.refresh_user_data(5, local)
+    assert local == {"diagnostic_current_index": 3, "message": "kept"}
+
+    # Nothing changed remotely: newer local data is left alone
+    local["diagnostic_current_index"] = 4
+    await first.refresh_user_data(5, local)
+    assert local["diagnostic_current_index"] == 4
+
+
+@pytest.mark.asyncio
+async def test_sql_store_upserts(sqlite_file_engine):
+    store = SQLUserDataStore()
+    await store.save({11: '{"a": 1}', 12: '{"b": 2}'})
+    await store.save({11: '{"a": 3}'})
+
+    assert (await store.load())[11] == '{"a": 3}'
+    assert await store.load_one(12) == '{"b": 2}'
+    await store.delete(12)
+    assert await store.load_one(12) is None
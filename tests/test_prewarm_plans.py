@@ -0,0 +1,55 @@
+import json
+import types
+
+import pytest
+from sqlmodel import delete
+
+from scripts import prewarm_plans
+from src.db import plan_templates, services
+from src.db.models import PlanTemplate
+
+
+PLAN_JSON = '[{"category_name": "Basics", "question_text": "What is a decorator?"}]'
+
+
+class PlanLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        return types.SimpleNamespace(content=PLAN_JSON)
+
+
+def test_common_score_vectors_groups_by_score_bands():
+    rows = [
+        (1, json.dumps({"3": 1, "4": 5})),
+        (1, json.dumps({"3": 2, "4": 4})),  # same bands as the first
+        (1, json.dumps({"3": 5, "4": 5})),
+        (2, json.dumps({"3": 1, "4": 5})),  # another language
+        (1, "not json"),
+    ]
+
+    vectors = prewarm_plans.common_score_vectors(rows, top=2)
+
+    assert vectors[0] == (1, {"3": 1, "4": 5}, 2)
+    assert len(vectors) == 2
+    assert prewarm_plans.common_score_vectors(rows, min_users=2) == vectors[:1]
+
+
+@pytest.mark.asyncio
+async def test_prewarm_generates_missing_templates_once(session, sample_questions):
+    session.exec(delete(PlanTemplate))
+    session.commit()
+    scores = {str(sample_questions.cat.id): 2}
+    vectors = [(sample_questions.lang.id, scores, 5)]
+    llm = PlanLLM()
+
+    first = await prewarm_plans.prewarm(llm, vectors, concurrency=2)
+    second = await prewarm_plans.prewarm(llm, vectors, concurrency=2)
+
+    assert first == {"generated": 1} and second == {"fresh": 1}
+    assert llm.calls == 1
+    question_ids = plan_templates.lookup(session, sample_questions.lang.id, scores)
+    question = services.get_question_by_id(session, question_ids[0])
+    assert question.text == "What is a decorator?"
@@ -0,0 +1,186 @@
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler
+
+from telegram_rest_mvc.codec import CallbackDataError, CallbackSchema
+from telegram_rest_mvc.registrar import register_routes
+from telegram_rest_mvc.router import Router, callback, message, path
+from telegram_rest_mvc.views import View
+
+
+def _handler(name, calls):
+    async def handle(update, context):
+        calls.append(name)
+
+    return handle
+
+
+@pytest.fixture
+def routed():
+    calls = []
+    router = Router()
+    path(router, "/start", _handler("start", calls))
+    callback(router, "^lang_", _handler("lang", calls))
+    callback(router, "^lang_select_", _handler("lang_select", calls))
+    callback(router, "^next$", _handler("next", calls))
+    callback(router, r"^q(\d+)$", _handler("question", calls))
+    message(router, _handler("text", calls))
+    return router, calls
+
+
+def test_callbacks_resolve_exact_then_longest_prefix_then_regex(routed):
+    router, _ = routed
+
+    def resolve(data):
+        return getattr(router.resolve_callback(data), "pattern", None)
+
+    assert resolve("lang_select_3") == "^lang_select_"
+    assert resolve("lang_x") == "^lang_"
+    assert resolve("next") == "^next$"
+    assert resolve("next_page") is None
+    assert resolve("q12") == r"^q(\d+)$"
+    assert resolve("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_dispatch_routes_commands_and_callbacks(routed):
+    router, calls = routed
+    command = SimpleNamespace(
+        effective_message=SimpleNamespace(text="/START@RecallBot now")
+    )
+    await router.dispatch_command(command, SimpleNamespace())
+    query = SimpleNamespace(callback_query=SimpleNamespace(data="lang_select_1"))
+    await router.dispatch_callback(query, SimpleNamespace())
+    unmatched = AnsweredQuery("nope")
+    await router.dispatch_callback(
+        SimpleNamespace(callback_query=unmatched), SimpleNamespace()
+    )
+
+    assert calls == ["start", "lang_select"]
+    assert unmatched.answers == [(None, False)]  # the spinner stops
+
+
+class AnsweredQuery:
+    def __init__(self, data):
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answers.append((text, show_alert))
+
+
+@pytest.mark.asyncio
+async def test_unmatched_callbacks_get_the_expired_alert():
+    router = Router(expired_callback_text="Button expired, run /start")
+    query = AnsweredQuery("old_button_1")
+
+    await router.dispatch_callback(
+        SimpleNamespace(callback_query=query), SimpleNamespace()
+    )
+
+    assert query.answers == [("Button expired, run /start", True)]
+
+
+@pytest.mark.asyncio
+async def test_middleware_wraps_every_route_in_order(routed):
+    router, calls = routed
+
+    def layer(name):
+        async def middleware(request, call_next):
+            calls.append(f"{name}>")
+            request.extra.setdefault("seen", []).append(name)
+            result = await call_next(request)
+            calls.append(f"<{name}")
+            return result
+
+        return middleware
+
+    router.use(layer("outer"))
+    router.use(layer("inner"))
+    context = SimpleNamespace()
+    text = router.routes("message")[0]
+    await router.bind(text)(SimpleNamespace(), context)
+
+    assert calls == ["outer>", "inner>", "text", "<inner", "<outer"]
+    assert context.request.route is text
+    assert context.request.extra["seen"] == ["outer", "inner"]
+
+
+def test_register_routes_adds_one_handler_per_kind(routed):
+    router, _ = routed
+    app = Application.builder().token("123:abc").build()
+    register_routes(app, router)
+
+    handlers = app.handlers[0]
+    assert len(handlers) == 3
+    assert sum(isinstance(h, CallbackQueryHandler) for h in handlers) == 1
+    assert sum(isinstance(h, CommandHandler) for h in handlers) == 1
+
+
+def test_codec_round_trips_typed_fields_compactly():
+    schema = CallbackSchema("x", count=int, flag=bool, name=str)
+    data = schema.encode(count=-70000, flag=True, name="привет")
+    assert schema.decode(data) == {"count": -70000, "flag": True, "name": "привет"}
+
+    score = CallbackSchema("ds", question_id=int, score=int)
+    assert score.encode(question_id=1234, score=5) == "ds:pBMK"
+
+
+def test_codec_rejects_oversized_and_malformed_data():
+    schema = CallbackSchema("t", text=str)
+    with pytest.raises(CallbackDataError):
+        schema.encode(text="x" * 62)
+    with pytest.raises(TypeError):
+        schema.encode(text=1)
+    for bad in ("t:", "t:!!", "other:AA", schema.encode(text="ok") + "AA"):
+        with pytest.raises(CallbackDataError):
+            schema.decode(bad)
+
+
+@pytest.mark.asyncio
+async def test_schema_routes_pass_decoded_params_to_views():
+    schema = CallbackSchema("ls", language_id=int)
+    seen = []
+
+    class PickView(View):
+        async def command(self):
+            seen.append(self.params)
+
+    router = Router()
+    callback(router, schema, PickView.as_handler())
+
+    for data in (schema.encode(language_id=7), "ls:@@"):
+        update = SimpleNamespace(callback_query=SimpleNamespace(data=data))
+        await router.dispatch_callback(update, SimpleNamespace())
+
+    assert seen == [{"language_id": 7}, None]
+
+
+@pytest.mark.asyncio
+async def test_legacy_callback_data_still_routes_to_schema_views():
+    schema = CallbackSchema(
+        "ds", legacy_prefix="diag_score_", question_id=int, score=int
+    )
+    seen = []
+
+    class ScoreView(View):
+        async def command(self):
+            seen.append(self.params)
+
+    router = Router()
+    callback(router, schema, ScoreView.as_handler())
+
+    for data in (
+        "diag_score_12_4",
+        schema.encode(question_id=12, score=4),
+        "diag_score_x",
+    ):
+        update = SimpleNamespace(callback_query=SimpleNamespace(data=data))
+        await router.dispatch_callback(update, SimpleNamespace())
+
+    assert seen == [
+        {"question_id": 12, "score": 4},
+        {"question_id": 12, "score": 4},
+        None,
+    ]
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from pydantic import ValidationError
+from telegram import Update
+from telegram.ext import Application
+
+from src.bot.server import (
+    SECRET_HEADER,
+    build_webhook_app,
+    serve_metrics,
+    watch_runtime,
+)
+from telegram_rest_mvc.processor import PerUserUpdateProcessor
+from telegram_rest_mvc.settings.config import Telegram
+
+
+def _update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+            "text": "hi",
+        },
+    }
+
+
+def _application():
+    return Application.builder().token("123:abc").build()
+
+
+@pytest.mark.asyncio
+async def test_processor_orders_per_user_and_runs_users_in_parallel():
+    processor = PerUserUpdateProcessor(4)
+    bot = _application().bot
+    running, peak, order = set(), [0], []
+
+    async def handle(name, user_id):
+        assert user_id not in running  # never two updates of one user at once
+        running.add(user_id)
+        peak[0] = max(peak[0], len(running))
+        await asyncio.sleep(0.01)
+        order.append(name)
+        running.discard(user_id)
+
+    jobs = [
+        processor.process_update(
+            Update.de_json(_update(i, user_id), bot), handle((user_id, i), user_id)
+        )
+        for i, user_id in enumerate([1, 1, 2, 1, 2, 3])
+    ]
+    await asyncio.gather(*jobs)
+
+    assert [i for user_id, i in order if user_id == 1] == [0, 1, 3]
+    assert [i for user_id, i in order if user_id == 2] == [2, 4]
+    assert peak[0] == 3
+    assert processor.pending == 0
+    assert processor.dispatcher.active_keys == 0
+
+
+@pytest.mark.asyncio
+async def test_processor_respects_concurrency_limit():
+    processor = PerUserUpdateProcessor(1)
+    running, peak = [0], [0]
+
+    async def handle():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    await asyncio.gather(*(processor.process_update(None, handle()) for _ in range(3)))
+    assert peak[0] == 1
+
+
+def test_unknown_mode_is_a_config_error():
+    with pytest.raises(ValidationError, match="polling"):
+        Telegram(token="123:abc", mode="webhooks")
+
+
+@pytest.mark.asyncio
+async def test_webhook_checks_secret_and_enqueues_update():
+    application = _application()
+    config = Telegram(token="123:abc", webhook_secret="s3cret")
+    async with TestClient(TestServer(build_webhook_app(application, config))) as client:
+        response = await client.post("/telegram", json=_update(1, 42))
+        assert response.status == 403
+
+        response = await client.post(
+            "/telegram", json=_update(1, 42), headers={SECRET_HEADER: "s3cret"}
+        )
+        assert response.status == 200
+        update = application.update_queue.get_nowait()
+        assert update.effective_user.id == 42
+
+        response = await client.get("/healthz")
+        assert (await response.json())["pending_updates"] == 0
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_updates_when_backlogged():
+    application = _application()
+    config = Telegram(token="123:abc", max_pending_updates=2)
+    async with TestClient(TestServer(build_webhook_app(application, config))) as client:
+        statuses = [
+            (await client.post("/telegram", json=_update(i, 42))).status
+            for i in range(3)
+        ]
+        assert statuses == [200, 200, 503]
+
+        application.update_queue.get_nowait()
+        response = await client.post("/telegram", data=b"not json")
+        assert response.status == 400
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_runtime_gauges():
+    application = _application()
+    watch_runtime(application)
+    await application.update_queue.put(object())
+    metrics_app = web.Application()
+    metrics_app.router.add_get("/metrics", serve_metrics)
+
+    async with TestClient(TestServer(metrics_app)) as client:
+        response = await client.get("/metrics")
+        body = await response.text()
+
+    assert response.status == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert 'recalldev_queue_depth{queue="updates"} 1' in body
+    assert 'recalldev_cache_hit_ratio{cache="user"} 0' in body
+    assert "# TYPE recalldev_update_duration_seconds histogram" in body
@@ -34,6 +34,63 @@ class TestLearningPlanCore:
         assert services.get_current_learning_item(session, progress.id) == item
 
 
+class TestBulkCreatePlan:
+    def test_creates_categories_questions_and_items(self, session):
+        from sqlalchemy import event
+
+        lang = services.get_or_create_language(session, name="Kotlin", slug="kotlin")
+        cat = services.get_or_create_category(session, name="Coroutines")
+        existing = services.create_question(
+            session,
+            text="What is a suspend fun?",
+            category_id=cat.id,
+            language_id=lang.id,
+        )
+        user = services.get_or_create_user(session, telegram_id=4200)
+        progress = services.get_or_create_user_progress(session, user.id, lang.id)
+        plan = [
+            ("Coroutines", "What is a suspend fun?"),
+            ("Flows", "Cold vs hot flows?"),
+            ("Flows", "What is StateFlow?"),
+            ("Generics", "Explain reified"),
+            ("Generics", ""),  # skipped
+        ]
+
+        lang_id, progress_id = lang.id, progress.id
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(session.get_bind(), "before_cursor_execute", listener)
+        try:
+            first_id = services.bulk_create_plan(
+                session, progress_id, lang_id, plan, start_order_index=3
+            )
+        finally:
+            event.remove(session.get_bind(), "before_cursor_execute", listener)
+        assert len(statements) == 7
+
+        items = sorted(
+            services.get_learning_plan_items(session, progress.id),
+            key=lambda i: i.order_index,
+        )
+        assert items[0].id == first_id and items[0].question_id == existing.id
+        assert [i.order_index for i in items] == [3, 4, 5, 6]
+        assert services.get_category_by_name(session, "Flows") is not None
+        assert services.get_question_by_id(session, items[3].question_id).text == (
+            "Explain reified"
+        )
+
+        # Re-adding a question moves it instead of duplicating the plan item
+        services.bulk_create_plan(
+            session, progress.id, lang.id, plan[:1], start_order_index=7
+        )
+        items = services.get_learning_plan_items(session, progress.id)
+        assert len(items) == 4
+        assert {i.order_index for i in items if i.question_id == existing.id} == {7}
+
+    def test_empty_plan(self, session):
+        assert services.bulk_create_plan(session, 1, 1, [("Cat", "")], 0) is None
+
+
 class TestServiceGetters:
     def test_getters_by_id(self, session):
         lang = services.get_or_create_language(session, name="Swift", slug="swift")
@@ -1,14 +1,17 @@
 import contextlib
+import functools
 import json
 import types
 from types import SimpleNamespace
 
 import pytest
 
-from constants import callback_data, messages
+from constants import messages
+from constants.callback_data import DIAGNOSTIC_SCORE, LANG_SELECT
 from src.bot.flow_result import FlowResult, FlowStatus
 from src.bot.flows import diagnostics as diagnostics_flow
 from src.bot.flows import practice as practice_flow
+from src.bot.streaming import ProgressiveEdit
 from src.bot.views import diagnostics as diagnostics_view
 from src.bot.views import language as lang_view_mod
 from src.bot.views import practice as practice_view
@@ -22,7 +25,7 @@ from src.bot.views.practice import (
     _generate_and_save_practice_questions,
 )
 from src.bot.views.technology import TechnologyView
-from src.db import services
+from src.db import plan_templates, services
 
 
 class DummyMessage:
@@ -245,7 +248,7 @@ class TestLanguageSelection:
         # Build fake callback query
         class DummyQuery:
             def __init__(self):
-                self.data = f"{callback_data.LANG_SELECT_PREFIX}1"
+                self.data = LANG_SELECT.encode(language_id=1)
                 self.from_user = type("U", (), {"id": 1})()
 
             async def answer(self):
@@ -262,6 +265,7 @@ class TestLanguageSelection:
         upd.callback_query = DummyQuery()
         upd.effective_user = upd.callback_query.from_user
         ctx = DummyContext()
+        ctx.route_params = LANG_SELECT.decode(upd.callback_query.data)
 
         await LanguageSelectionView(upd, ctx).command()
         assert diag_called[
@@ -334,7 +338,7 @@ class TestDiagnosticScoreView:
 
         class DQ:
             def __init__(self):
-                self.data = callback_data.DIAGNOSTIC_SCORE_PREFIX + "bad"
+                self.data = DIAGNOSTIC_SCORE.prefix + "bad"
                 self.from_user = type("U", (), {"id": 1})()
                 self.message = DummyMessage()
 
@@ -348,6 +352,7 @@ class TestDiagnosticScoreView:
         upd.callback_query = DQ()
         upd.message = upd.callback_query.message
         ctx = DummyContext()
+        ctx.route_params = None  # what the router sets for malformed data
         await DiagnosticScoreView(upd, ctx).command()
         assert any(
             "parse err" in t.lower() for t, _ in upd.callback_query.message.replies
@@ -373,7 +378,7 @@ class TestDiagnosticScoreView:
 
         class DQ:
             def __init__(self):
-                self.data = f"{callback_data.DIAGNOSTIC_SCORE_PREFIX}1_4"
+                self.data = DIAGNOSTIC_SCORE.encode(question_id=1, score=4)
                 self.from_user = type("U", (), {"id": 1})()
                 self.message = DummyMessage()
 
@@ -387,6 +392,7 @@ class TestDiagnosticScoreView:
         upd.callback_query = DQ()
         upd.message = upd.callback_query.message
         ctx = DummyContext()
+        ctx.route_params = DIAGNOSTIC_SCORE.decode(upd.callback_query.data)
 
         await DiagnosticScoreView(upd, ctx).command()
         assert any("q?" in t.lower() for t, _ in upd.callback_query.message.replies)
@@ -486,7 +492,6 @@ class TestPracticeHelpers:
         # Simplistic stubs
         lang_obj = type("Lang", (), {"id": 1, "name": "Python"})()
         cat_obj = type("Cat", (), {"id": 2, "name": "Basics"})()
-        q_obj = type("Q", (), {"id": 3})()
         plan_item_obj = type("Item", (), {"id": 4})()
         prog_obj = type("Prog", (), {"id": 5, "diagnostic_scores_json": ""})()
         user_obj = type("User", (), {"active_language_id": 1})()
@@ -511,19 +516,28 @@ class TestPracticeHelpers:
         monkeypatch.setattr(
             services, "get_categories_for_language", lambda s, language_id: [cat_obj]
         )
-        monkeypatch.setattr(services, "get_or_create_category", lambda s, name: cat_obj)
-        monkeypatch.setattr(services, "create_question", lambda *a, **k: q_obj)
         monkeypatch.setattr(
             services, "get_max_learning_plan_order_index", lambda *a, **k: -1
         )
+        monkeypatch.setattr(plan_templates, "lookup", lambda *a, **k: None)
+        monkeypatch.setattr(plan_templates, "store", lambda *a, **k: None)
+        bulk_calls = []
+
+        def fake_upsert(session, language_id, questions):
+            bulk_calls.append({"questions": questions})
+            return [11]
+
+        monkeypatch.setattr(services, "upsert_plan_questions", fake_upsert)
         monkeypatch.setattr(
-            services, "add_question_to_learning_plan", lambda *a, **k: plan_item_obj
+            services, "add_plan_items", lambda *a, **k: plan_item_obj.id
         )
         monkeypatch.setattr(services, "set_current_learning_item", lambda *a, **k: None)
 
         result = await _generate_and_save_practice_questions(
             ctx, None, user_obj, prog_obj
         )
+        assert result == 1
+        assert bulk_calls[0]["questions"] == [("Basics", "What is Python?")]
         # but pytest doesn't have run_async; instead we use pytest.mark.asyncio
 
 
@@ -591,7 +605,9 @@ class TestDiagnosticScoreViewCompleted:
         upd.callback_query = DQ()
         upd.message = upd.callback_query.message
         ctx = DummyContext()
-        upd.callback_query.data = f"{callback_data.DIAGNOSTIC_SCORE_PREFIX}1_3"
+        ctx.user_data["active_progress_id"] = 1
+        upd.callback_query.data = DIAGNOSTIC_SCORE.encode(question_id=1, score=3)
+        ctx.route_params = DIAGNOSTIC_SCORE.decode(upd.callback_query.data)
 
         await DiagnosticScoreView(upd, ctx).command()
         texts = " ".join(t for t, _ in upd.callback_query.message.replies)
@@ -635,12 +651,100 @@ class TestDiagnosticScoreViewCompleted:
         upd.callback_query = DQ()
         upd.message = upd.callback_query.message
         ctx = DummyContext()
-        upd.callback_query.data = f"{callback_data.DIAGNOSTIC_SCORE_PREFIX}1_3"
+        ctx.user_data["active_progress_id"] = 1
+        upd.callback_query.data = DIAGNOSTIC_SCORE.encode(question_id=1, score=3)
+        ctx.route_params = DIAGNOSTIC_SCORE.decode(upd.callback_query.data)
 
         await DiagnosticScoreView(upd, ctx).command()
         assert any("noq" in t for t, _ in upd.callback_query.message.replies)
 
 
+class TestDiagnosticScoreViewQueued:
+    @pytest.mark.asyncio
+    async def test_completed_enqueues_plan_job(self, monkeypatch):
+        """With a job queue in bot_data the plan is generated in the background."""
+
+        async def fake_proc(*a, **k):
+            return FlowResult(FlowStatus.COMPLETED)
+
+        monkeypatch.setattr(diagnostics_flow, "process_diagnostic_score", fake_proc)
+        monkeypatch.setattr(
+            messages, "MSG_GENERATING_PRACTICE_PLAN", "generating", raising=False
+        )
+
+        class FakeQueue:
+            def __init__(self):
+                self.jobs = []
+
+            async def enqueue(self, **kwargs):
+                self.jobs.append(kwargs)
+
+        class DQ:
+            def __init__(self):
+                self.data = DIAGNOSTIC_SCORE.encode(question_id=1, score=3)
+                self.from_user = type("U", (), {"id": 1})()
+                self.message = DummyMessage()
+                self.message.chat_id = 42
+
+            async def answer(self):
+                pass
+
+        upd = DummyUpdate()
+        upd.callback_query = DQ()
+        ctx = DummyContext()
+        ctx.route_params = DIAGNOSTIC_SCORE.decode(upd.callback_query.data)
+        ctx.user_data["active_progress_id"] = 7
+        ctx.bot_data["plan_jobs"] = FakeQueue()
+
+        await DiagnosticScoreView(upd, ctx).command()
+
+        assert ctx.bot_data["plan_jobs"].jobs == [
+            {"user_progress_id": 7, "telegram_id": 1, "chat_id": 42}
+        ]
+        assert upd.callback_query.message.replies[-1][0] == "generating"
+
+    @pytest.mark.asyncio
+    async def test_missing_progress_is_not_enqueued(self, monkeypatch):
+        """Without a progress in user_data or an active language nothing is queued."""
+
+        async def fake_proc(*a, **k):
+            return FlowResult(FlowStatus.COMPLETED)
+
+        monkeypatch.setattr(diagnostics_flow, "process_diagnostic_score", fake_proc)
+        monkeypatch.setattr(
+            messages, "MSG_NO_ACTIVE_LANGUAGE_START", "no language", raising=False
+        )
+
+        class FakeQueue:
+            def __init__(self):
+                self.jobs = []
+
+            async def enqueue(self, **kwargs):
+                self.jobs.append(kwargs)
+
+        class DQ:
+            def __init__(self):
+                self.data = DIAGNOSTIC_SCORE.encode(question_id=1, score=3)
+                self.from_user = type("U", (), {"id": 9300})()
+                self.message = DummyMessage()
+                self.message.chat_id = 42
+
+            async def answer(self):
+                pass
+
+        upd = DummyUpdate()
+        upd.callback_query = DQ()
+        upd.effective_user = upd.callback_query.from_user
+        ctx = DummyContext()
+        ctx.route_params = DIAGNOSTIC_SCORE.decode(upd.callback_query.data)
+        ctx.bot_data["plan_jobs"] = FakeQueue()
+
+        await DiagnosticScoreView(upd, ctx).command()
+
+        assert ctx.bot_data["plan_jobs"].jobs == []
+        assert upd.callback_query.message.replies[-1][0] == "no language"
+
+
 class TestPracticeHelpersEdge:
     @pytest.mark.asyncio
     async def test_generate_practice_plan_error(self, monkeypatch):
@@ -705,6 +809,46 @@ class TestUserTextMessageView:
         texts = [t for t, _ in upd.message.replies]
         assert "thanks" in texts[0].lower() and "ai reply" in texts[-1].lower()
 
+    @pytest.mark.asyncio
+    async def test_feedback_streams_into_the_placeholder(self, monkeypatch):
+        monkeypatch.setattr(
+            "src.bot.views.message.get_user_state", lambda s, tid: "practice"
+        )
+        placeholder = types.SimpleNamespace(edits=[])
+
+        async def edit_text(text, reply_markup=None):
+            placeholder.edits.append(text)
+
+        placeholder.edit_text = edit_text
+
+        class PlaceholderMessage(DummyMessage):
+            async def reply_text(self, text, reply_markup=None):
+                await super().reply_text(text, reply_markup)
+                return placeholder
+
+        async def fake_proc(ctx, answer, on_progress=None):
+            for partial in ("Partial feedback " * 3, "Partial feedback " * 9):
+                await on_progress(partial)
+            return FlowResult(FlowStatus.OK, {"text": "Final feedback"})
+
+        monkeypatch.setattr(practice_flow, "process_user_practice_answer", fake_proc)
+        monkeypatch.setattr(
+            "src.bot.views.message.ProgressiveEdit",
+            functools.partial(ProgressiveEdit, interval=0),
+        )
+
+        upd = DummyUpdate()
+        upd.message = PlaceholderMessage()
+        upd.message.text = "my ans"
+        await UserTextMessageView(upd, DummyContext()).command()
+
+        assert [t for t, _ in upd.message.replies] == [
+            messages.MSG_THANKS_FOR_ANSWER_ANALYZING
+        ]
+        assert len(placeholder.edits) == 3
+        assert placeholder.edits[0].startswith("Partial feedback")
+        assert placeholder.edits[-1] == "Final feedback"
+
     @pytest.mark.asyncio
     async def test_unknown_state(self, monkeypatch):
         if not hasattr(messages, "MSG_UNKNOWN_STATE"):
@@ -910,6 +1054,7 @@ async def test_generate_questions_no_llm(monkeypatch):
         "get_language_by_id",
         lambda *a, **k: types.SimpleNamespace(id=2, name="JS"),
     )
+    monkeypatch.setattr(practice_view.plan_templates, "lookup", lambda *a, **k: None)
     monkeypatch.setattr(
         practice_view.services, "get_categories_for_language", lambda *a, **k: []
     )
@@ -933,6 +1078,7 @@ async def test_generate_questions_bad_json(monkeypatch):
         "get_language_by_id",
         lambda *a, **k: types.SimpleNamespace(id=3, name="Rust"),
     )
+    monkeypatch.setattr(practice_view.plan_templates, "lookup", lambda *a, **k: None)
     monkeypatch.setattr(
         practice_view.services, "get_categories_for_language", lambda *a, **k: []
     )
@@ -992,3 +1138,24 @@ async def test_message_unknown_state(monkeypatch):
 
     await UserTextMessageView(upd, ctx).command()
     assert any("unknown state" in t for t, _ in upd.message.replies)
+
+
+@pytest.mark.asyncio
+async def test_atomic_runs_command_inside_scope():
+    from telegram_rest_mvc.views import View, atomic
+
+    calls = []
+
+    @contextlib.contextmanager
+    def scope():
+        calls.append("enter")
+        yield
+        calls.append("exit")
+
+    @atomic(scope)
+    class EchoView(View):
+        async def command(self):
+            calls.append("command")
+
+    await EchoView.as_handler()(DummyUpdate(), DummyContext())
+    assert calls == ["enter", "command", "exit"]